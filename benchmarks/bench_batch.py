@@ -0,0 +1,112 @@
+"""
+Benchmark of batch resolution of module sets against resolving each set
+independently, and of the scaling of batch resolution with the number of
+processes.
+
+Usage: python -m benchmarks.bench_batch [MAX_PROCS]
+"""
+import sys
+import random
+import time
+import multiprocessing
+from benchmarks.synthetic import make_catalogue
+from pmod.batch import BatchResolver
+
+
+def make_mod_sets(mod_manager, num_sets, set_size=2, num_choices=8, seed=0):
+    """
+    Generate module sets as a parameter sweep would do, i.e. combinations of
+    a few versions of a few packages.
+
+    :param mod_manager: instance of ModManager
+    :param num_sets: integer, number of module sets
+    :param set_size: integer, number of packages in each set
+    :param num_choices: integer, number of packages to choose from
+    :param seed: integer, seed of the random number generator
+    :return: list of lists of module names
+    """
+    rng = random.Random(seed)
+    packages = sorted(set([mod_name.split("/")[0] for mod_name
+                           in mod_manager.get_mod_names()]),
+                      key=lambda x: int(x[3:]))
+    # Packages in the top layer are not required by others, so that any
+    # version of them can be loaded together.
+    choices = packages[-num_choices:]
+    mod_sets = []
+    for i in range(num_sets):
+        mod_sets.append(["%s/%d.0" % (package, rng.randrange(2))
+                         for package in rng.sample(choices, set_size)])
+    return mod_sets
+
+
+def bench_memo():
+    """
+    Time the resolution of module sets with and without memoization.
+    """
+    print("%8s %8s %8s %14s %14s" % ("modules", "sets", "distinct",
+          "single (ms)", "batch (ms)"))
+    environ = {"PATH": "/usr/bin:/bin", "PM_LOADED_MODULES": ""}
+    for num_mods in (1000, 10000):
+        mod_manager = make_catalogue(num_mods, depth=6, width=3)
+        mod_manager.get_graph()
+        mod_sets = make_mod_sets(mod_manager, 2000)
+
+        time_0 = time.time()
+        for mod_list in mod_sets:
+            mod_manager.resolve_load(mod_list, environ=environ).get_changes()
+        time_1 = time.time()
+        resolver = BatchResolver(mod_manager, environ)
+        for result in resolver.resolve_all(mod_sets):
+            pass
+        time_2 = time.time()
+        print("%8d %8d %8d %14.3f %14.3f" % (num_mods, len(mod_sets),
+              len(resolver.results), (time_1 - time_0) * 1000,
+              (time_2 - time_1) * 1000))
+
+
+def bench_scaling(max_procs):
+    """
+    Time the resolution of distinct module sets with 1 to max_procs
+    processes.
+
+    :param max_procs: integer, maximum number of processes
+    :return: None
+    """
+    print("%8s %8s %14s %10s" % ("procs", "sets", "time (ms)", "speedup"))
+    environ = {"PATH": "/usr/bin:/bin", "PM_LOADED_MODULES": ""}
+    mod_manager = make_catalogue(10000, depth=6, width=3)
+    mod_sets = make_mod_sets(mod_manager, 5000, set_size=3, num_choices=30)
+    mod_manager.get_graph()
+    mod_manager.get_status_index()
+    mod_manager.get_name_index()
+    num_procs_list = [1]
+    while num_procs_list[-1] * 2 <= max_procs:
+        num_procs_list.append(num_procs_list[-1] * 2)
+    if num_procs_list[-1] != max_procs:
+        num_procs_list.append(max_procs)
+    time_serial = None
+    for num_procs in num_procs_list:
+        # A new resolver for each run so that no results are memoized
+        resolver = BatchResolver(mod_manager, environ)
+        time_0 = time.time()
+        for result in resolver.resolve_all(mod_sets, num_procs):
+            pass
+        time_1 = time.time() - time_0
+        if time_serial is None:
+            time_serial = time_1
+        print("%8d %8d %14.3f %10.2f" % (num_procs, len(mod_sets),
+              time_1 * 1000, time_serial / time_1))
+
+
+def main():
+    if len(sys.argv) > 1:
+        max_procs = int(sys.argv[1])
+    else:
+        max_procs = multiprocessing.cpu_count()
+    bench_memo()
+    print("")
+    bench_scaling(max_procs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark of the dependency index against the list-based traversal of the
+dependency tree.
+
+Usage: python -m benchmarks.bench_graph
+"""
+import time
+from benchmarks.synthetic import make_catalogue
+
+
+def build_dependencies_bfs(mod_manager, root_mods):
+    """
+    The list-based implementation of ModManager.build_dependencies before the
+    dependency index was introduced, kept for comparison.
+    """
+    dependencies = [mod_name for mod_name in root_mods]
+    for mod_name in dependencies:
+        module = mod_manager.available_mods[mod_name]
+        for depend_item in module.depend:
+            if depend_item not in dependencies:
+                dependencies.append(depend_item)
+    return set(dependencies)
+
+
+def adjust_bfs(mod_manager, mods_loaded):
+    """
+    Query the dependencies and conflicts of each loaded module in the way
+    auto_adjust_load used to do.
+    """
+    for loaded_mod in mods_loaded:
+        dependencies = build_dependencies_bfs(mod_manager, [loaded_mod])
+        mod_manager.build_conflicts(dependencies)
+
+
+def adjust_index(mod_manager, mods_loaded):
+    """
+    Query the dependencies and conflicts of each loaded module with the
+    dependency index.
+    """
+    graph = mod_manager.get_graph()
+    for loaded_mod in mods_loaded:
+        graph.get_mod_closure(loaded_mod)
+        graph.get_mod_conflicts(loaded_mod)
+
+
+def main():
+    print("%8s %8s %12s %12s %12s %12s" % ("modules", "loaded", "bfs (ms)",
+          "build (ms)", "cold (ms)", "warm (ms)"))
+    for num_mods in (100, 1000, 10000):
+        mod_manager = make_catalogue(num_mods, depth=6, width=3)
+        mod_names = list(mod_manager.available_mods.keys())
+        # Load the default versions of packages in the top layer, as a long
+        # session would do
+        num_packages = len(mod_names) // 3
+        mods_loaded = ["pkg%d/0.0" % i
+                       for i in range(max(num_packages - 50, 0), num_packages)]
+
+        # auto_adjust_load and auto_adjust_unload query each loaded module
+        # twice, i.e. in the check for unusable modules and modules to reload
+        time_0 = time.time()
+        adjust_bfs(mod_manager, mods_loaded)
+        adjust_bfs(mod_manager, mods_loaded)
+        time_1 = time.time()
+        mod_manager.get_graph()
+        time_2 = time.time()
+        adjust_index(mod_manager, mods_loaded)
+        adjust_index(mod_manager, mods_loaded)
+        time_3 = time.time()
+        adjust_index(mod_manager, mods_loaded)
+        adjust_index(mod_manager, mods_loaded)
+        time_4 = time.time()
+        print("%8d %8d %12.3f %12.3f %12.3f %12.3f" % (len(mod_names),
+              len(mods_loaded), (time_1 - time_0) * 1000,
+              (time_2 - time_1) * 1000, (time_3 - time_2) * 1000,
+              (time_4 - time_3) * 1000))
+
+
+if __name__ == "__main__":
+    main()
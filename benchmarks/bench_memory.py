@@ -0,0 +1,84 @@
+"""
+Benchmark of the memory used by the modules with the compact Module class
+against the dictionary-based one, which keeps its settings in lists.
+
+Usage: python -m benchmarks.bench_memory
+
+tracemalloc is required, which is available since Python 3.4.
+"""
+import gc
+import pickle
+import tracemalloc
+from benchmarks.synthetic import make_catalogue
+from pmod.module import Module
+
+
+class DictModule(object):
+    """
+    The dictionary-based implementation of Module before slots and freezing
+    were introduced, kept for comparison. Only the "mod" preset used by the
+    synthetic catalogue is supported.
+    """
+    def __init__(self, mod_name, preset="void", destination=None,
+                 environ=None, depend=None, conflict=None):
+        self.mod_name = mod_name
+        self.environ = [("prepend", "PM_LOADED_MODULES", self.mod_name)]
+        self.depend = []
+        self.conflict = []
+        self.command = []
+        self.alias = []
+        if preset == "mod":
+            self.environ.append(("prepend", "PATH", destination + "/bin"))
+            self.environ.append(("prepend", "LIBRARY_PATH",
+                                 destination + "/lib"))
+            self.environ.append(("prepend", "LD_LIBRARY_PATH",
+                                 destination + "/lib"))
+            self.environ.append(("prepend", "C_INCLUDE_PATH",
+                                 destination + "/include"))
+            self.environ.append(("prepend", "CPLUS_INCLUDE_PATH",
+                                 destination + "/include"))
+        self.environ.extend(environ)
+        self.depend.extend(depend)
+        self.conflict.extend(conflict)
+
+    def freeze(self):
+        pass
+
+
+def measure(build, *args, **kwargs):
+    """
+    Measure the memory allocated by a function and kept by its result.
+
+    :param build: function to call
+    :param args: positional arguments of the function
+    :param kwargs: keyword arguments of the function
+    :return: tuple of (result, size in bytes)
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build(*args, **kwargs)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    print("%8s %8s %12s %12s %12s %12s" % ("modules", "class", "built (kB)",
+          "B/module", "pickle (kB)", "loaded (kB)"))
+    for num_mods in (1000, 10000, 50000):
+        for mod_class in (DictModule, Module):
+            mod_manager, size = measure(make_catalogue, num_mods, depth=6,
+                                        width=3, mod_class=mod_class)
+            num_built = len(mod_manager.available_mods)
+            data = pickle.dumps(mod_manager, protocol=2)
+            del mod_manager
+            mod_manager, size_loaded = measure(pickle.loads, data)
+            print("%8d %8s %12.1f %12.1f %12.1f %12.1f" % (num_built,
+                  mod_class.__name__, size / 1024.0, size / float(num_built),
+                  len(data) / 1024.0, size_loaded / 1024.0))
+            del mod_manager, data
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmark of the EnvPath-based SandBox against the list-based one, which
+splits the whole environment on construction.
+
+Usage: python -m benchmarks.bench_sandbox
+"""
+import os
+import random
+import time
+from pmod.sandbox import SandBox
+
+
+class ListSandBox(SandBox):
+    """
+    The list-based implementation of SandBox before EnvPath was introduced,
+    kept for comparison.
+    """
+    def __init__(self):
+        self.environ = dict()
+        for env_name, env_value in os.environ.items():
+            self.environ[env_name] = env_value.split(":")
+        self.env_name_changed = []
+        self.command = []
+        self.alias = []
+        self.unalias = []
+
+    def has_pattern(self, env_name, pattern):
+        if env_name not in self.environ.keys():
+            return False
+        else:
+            return pattern in self.environ[env_name]
+
+    def reset_env(self, env_name, pattern):
+        self.environ[env_name] = [pattern]
+        if env_name not in self.env_name_changed:
+            self.env_name_changed.append(env_name)
+
+    def append_env(self, env_name, pattern):
+        if not self.has_pattern(env_name, pattern):
+            if env_name not in self.environ.keys():
+                self.environ[env_name] = [pattern]
+            else:
+                self.environ[env_name].append(pattern)
+            if env_name not in self.env_name_changed:
+                self.env_name_changed.append(env_name)
+
+    def prepend_env(self, env_name, pattern):
+        if not self.has_pattern(env_name, pattern):
+            if env_name not in self.environ.keys():
+                self.environ[env_name] = [pattern]
+            else:
+                self.environ[env_name].insert(0, pattern)
+            if env_name not in self.env_name_changed:
+                self.env_name_changed.append(env_name)
+
+    def remove_env(self, env_name, pattern):
+        if self.has_pattern(env_name, pattern):
+            while pattern in self.environ[env_name]:
+                self.environ[env_name].remove(pattern)
+            if env_name not in self.env_name_changed:
+                self.env_name_changed.append(env_name)
+
+
+def make_operations(num_ops, num_vars, seed=0):
+    """
+    Generate random operations on path-like variables, as loading and
+    unloading many modules would do.
+
+    :param num_ops: integer, number of operations
+    :param num_vars: integer, number of variables to modify
+    :param seed: integer, seed of the random number generator
+    :return: list of (method_name, env_name, pattern) tuples
+    """
+    rng = random.Random(seed)
+    methods = ("prepend_env", "prepend_env", "append_env", "remove_env")
+    operations = []
+    for i in range(num_ops):
+        env_name = "PM_BENCH_%d" % rng.randrange(num_vars)
+        pattern = "/opt/pkg%d/bin" % rng.randrange(num_ops // 2 + 1)
+        operations.append((rng.choice(methods), env_name, pattern))
+    return operations
+
+
+def run_operations(sandbox, operations):
+    """
+    Apply the operations to a sandbox and get the final values of modified
+    variables.
+
+    :param sandbox: instance of SandBox or ListSandBox
+    :param operations: list returned by make_operations
+    :return: list of (env_name, env_value) tuples
+    """
+    for method_name, env_name, pattern in operations:
+        getattr(sandbox, method_name)(env_name, pattern)
+    return [(env_name, ":".join(sandbox.environ[env_name]))
+            for env_name in sandbox.env_name_changed]
+
+
+def bench_construction():
+    """
+    Time the construction of sandboxes with environments of growing size.
+    """
+    print("%8s %12s %12s" % ("vars", "list (ms)", "envpath (ms)"))
+    environ = os.environ.copy()
+    for num_vars in (100, 1000, 10000):
+        for i in range(num_vars):
+            os.environ["PM_UNRELATED_%d" % i] = ":".join(["/usr/lib"] * 100)
+        time_0 = time.time()
+        for i in range(10):
+            ListSandBox()
+        time_1 = time.time()
+        for i in range(10):
+            SandBox()
+        time_2 = time.time()
+        print("%8d %12.3f %12.3f" % (len(os.environ), (time_1 - time_0) * 100,
+              (time_2 - time_1) * 100))
+    os.environ.clear()
+    os.environ.update(environ)
+
+
+def bench_operations():
+    """
+    Time the operations on long path-like variables.
+    """
+    print("%8s %8s %12s %12s" % ("length", "ops", "list (ms)",
+          "envpath (ms)"))
+    for length in (100, 1000, 10000):
+        # Initial values with duplicates and empty patterns, as found in
+        # real environments
+        for i in range(4):
+            patterns = ["/usr/pkg%d/bin" % (j % (length // 2 + 1))
+                        for j in range(length)]
+            os.environ["PM_BENCH_%d" % i] = ":".join(patterns + [""])
+        operations = make_operations(length, 4)
+
+        time_0 = time.time()
+        result_list = run_operations(ListSandBox(), operations)
+        time_1 = time.time()
+        result_envpath = run_operations(SandBox(), operations)
+        time_2 = time.time()
+        if result_list != result_envpath:
+            raise RuntimeError("inconsistent results for length %d" % length)
+        print("%8d %8d %12.3f %12.3f" % (length, len(operations),
+              (time_1 - time_0) * 1000, (time_2 - time_1) * 1000))
+
+
+def main():
+    bench_construction()
+    print("")
+    bench_operations()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Benchmark suite of ModManager operations on synthetic catalogues, with the
+results saved as JSON for comparison between runs.
+
+Usage: python -m benchmarks.suite run [-o FILE] [-n NUM_MODS ...] [options]
+       python -m benchmarks.suite compare BASE_FILE NEW_FILE [-t THRESHOLD]
+
+Each scenario is run against a synthetic catalogue and a synthetic
+os.environ, in which the default versions of the packages in the top layer
+are loaded as a long session would do. Outputs of the operations are sent to
+os.devnull. 'compare' exits with status 1 if any scenario is slower than the
+threshold.
+"""
+import os
+import sys
+import gc
+import json
+import platform
+import argparse
+from benchmarks.synthetic import make_catalogue, make_environ
+from pmod.module import FINGERPRINT_VAR
+from pmod.profiler import wall_clock
+
+
+# Bump this number whenever the layout of the results changes.
+RESULTS_VERSION = 1
+
+
+def scenario_check_sanity(context):
+    """
+    Check the sanity of the catalogue from scratch, including the dependency
+    index.
+    """
+    mod_manager = context["mod_manager"]
+
+    def run():
+        mod_manager.invalidate()
+        mod_manager.check_sanity()
+    return run
+
+
+def scenario_verify_mod_names(context):
+    """
+    Resolve the names of the loaded modules, with and without versions, as
+    typed by the user, including the name index.
+    """
+    mod_manager = context["mod_manager"]
+    mod_names = []
+    for mod_name in context["session"]:
+        mod_names.append(mod_name)
+        mod_names.append(mod_name.split("/")[0].upper())
+
+    def run():
+        mod_manager.name_index = None
+        mod_manager.verify_mod_names(mod_names)
+    return run
+
+
+def scenario_load_mods(context):
+    """
+    Load a package that is not loaded yet into the session.
+    """
+    mod_manager = context["mod_manager"]
+    mod_name = context["spare"]
+
+    def run():
+        mod_manager.load_mods([mod_name])
+    return run
+
+
+def scenario_unload_mods(context):
+    """
+    Unload a dependency of the session, together with the modules depending
+    on it.
+    """
+    mod_manager = context["mod_manager"]
+    module = mod_manager.available_mods[context["session"][0]]
+    if len(module.depend) != 0:
+        mod_name = module.depend[0]
+    else:
+        mod_name = module.mod_name
+
+    def run():
+        mod_manager.unload_mods([mod_name])
+    return run
+
+
+def scenario_reload(context):
+    """
+    Reload the session after the definition of one module has changed, so
+    that only the module and the modules depending on it are reloaded.
+    """
+    mod_manager = context["mod_manager"]
+    environ = dict(context["environ"])
+    fingerprints = environ[FINGERPRINT_VAR].split(":")
+    fingerprints[0] = fingerprints[0].rpartition("=")[0] + "=outdated"
+    environ[FINGERPRINT_VAR] = ":".join(fingerprints)
+
+    def run():
+        mod_manager.resolve_reload(environ).echo_commands()
+    return run
+
+
+def scenario_reload_full(context):
+    """
+    Reload all the modules of the session.
+    """
+    mod_manager = context["mod_manager"]
+
+    def run():
+        mod_manager.reload(full=True)
+    return run
+
+
+def scenario_print_mods_status(context):
+    """
+    Print the tables of loaded and unloaded modules.
+    """
+    mod_manager = context["mod_manager"]
+
+    def run():
+        mod_manager.print_mods_status()
+    return run
+
+
+def scenario_echo_commands(context):
+    """
+    Print the commands for loading the whole session into a fresh shell.
+    """
+    mod_manager = context["mod_manager"]
+    sandbox = mod_manager.resolve_load(context["session"],
+                                       environ=context["base_environ"])
+
+    def run():
+        sandbox.echo_commands("bash")
+    return run
+
+
+# Scenarios in the order they are run
+SCENARIOS = (
+    ("check_sanity", scenario_check_sanity),
+    ("verify_mod_names", scenario_verify_mod_names),
+    ("load_mods", scenario_load_mods),
+    ("unload_mods", scenario_unload_mods),
+    ("reload", scenario_reload),
+    ("reload_full", scenario_reload_full),
+    ("print_mods_status", scenario_print_mods_status),
+    ("echo_commands", scenario_echo_commands),
+)
+
+
+class Redirect(object):
+    """
+    Context manager that replaces os.environ with a synthetic environment,
+    and sends stdout and stderr to os.devnull.
+    """
+    def __init__(self, environ):
+        """
+        :param environ: dict of environmental variables
+        """
+        self.environ = environ
+        self.saved_environ = None
+        self.saved_streams = None
+        self.null_file = None
+
+    def __enter__(self):
+        self.saved_environ = dict(os.environ)
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.null_file = open(os.devnull, "w")
+        self.saved_streams = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = self.null_file
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        sys.stdout, sys.stderr = self.saved_streams
+        self.null_file.close()
+        os.environ.clear()
+        os.environ.update(self.saved_environ)
+        return False
+
+
+def time_scenario(run, environ, repeat):
+    """
+    Time a scenario.
+
+    :param run: callable returned by the scenario
+    :param environ: dict of environmental variables to run it in
+    :param repeat: integer, number of runs
+    :return: list of wall times in milliseconds
+    """
+    times = []
+    with Redirect(environ):
+        for i in range(repeat):
+            gc.collect()
+            time_0 = wall_clock()
+            try:
+                run()
+            except SystemExit:
+                raise RuntimeError("the scenario exited on errors")
+            times.append((wall_clock() - time_0) * 1000)
+    return times
+
+
+def run_suite(args):
+    """
+    Run the scenarios for each size of catalogue.
+
+    :param args: argparse.Namespace object of the 'run' command
+    :return: dict, the results
+    """
+    params = dict([(key, getattr(args, key)) for key in
+                   ("num_versions", "depth", "width", "conflict_density",
+                    "env_length", "presets", "loaded", "num_vars",
+                    "path_length", "repeat", "seed")])
+    results = {"version": RESULTS_VERSION, "label": args.label,
+               "python": platform.python_version(),
+               "platform": platform.platform(), "params": params,
+               "results": []}
+    names = args.scenario or [name for name, scenario in SCENARIOS]
+    for num_mods in args.num_mods:
+        mod_manager = make_catalogue(num_mods, args.num_versions, args.depth,
+                                     args.width, args.conflict_density,
+                                     args.seed, env_length=args.env_length,
+                                     presets=tuple(args.presets))
+        mod_manager.check_sanity()
+        num_packages = len(mod_manager.available_mods) // args.num_versions
+        first = max(num_packages - args.loaded, 1)
+        session = ["pkg%d/0.0" % i for i in range(first, num_packages)]
+        base_environ = make_environ(num_vars=args.num_vars,
+                                    path_length=args.path_length)
+        context = {"mod_manager": mod_manager, "session": session,
+                   "spare": "pkg%d/0.0" % (first - 1),
+                   "base_environ": base_environ,
+                   "environ": make_environ(mod_manager, session,
+                                           args.num_vars, args.path_length)}
+        for name, scenario in SCENARIOS:
+            if name not in names:
+                continue
+            times = time_scenario(scenario(context), context["environ"],
+                                  args.repeat)
+            sorted_times = sorted(times)
+            result = {"scenario": name, "num_mods": num_mods,
+                      "loaded": len(session), "min": sorted_times[0],
+                      "median": sorted_times[len(times) // 2],
+                      "mean": sum(times) / len(times)}
+            results["results"].append(result)
+            print("%-18s %8d %8d %12.3f %12.3f" % (name, num_mods,
+                  len(session), result["min"], result["median"]))
+    return results
+
+
+def compare_results(base, new, threshold):
+    """
+    Print the changes of the minimal times between two runs.
+
+    :param base: dict, results of the baseline run
+    :param new: dict, results of the new run
+    :param threshold: float, relative change above which a scenario is
+                      reported as slower or faster
+    :return: integer, number of scenarios slower than the threshold
+    """
+    if base["params"] != new["params"]:
+        print("WARNING: the runs have different parameters")
+    base_times = dict([((result["scenario"], result["num_mods"]),
+                        result["min"]) for result in base["results"]])
+    num_slower = 0
+    print("%-18s %8s %12s %12s %8s" % ("scenario", "modules", "base (ms)",
+          "new (ms)", "change"))
+    for result in new["results"]:
+        key = (result["scenario"], result["num_mods"])
+        if key not in base_times:
+            continue
+        base_time, new_time = base_times[key], result["min"]
+        change = (new_time - base_time) / max(base_time, 1.0e-6)
+        if change > threshold:
+            verdict = "slower"
+            num_slower += 1
+        elif change < -threshold:
+            verdict = "faster"
+        else:
+            verdict = ""
+        print("%-18s %8d %12.3f %12.3f %+7.1f%% %s" % (key[0], key[1],
+              base_time, new_time, change * 100, verdict))
+    return num_slower
+
+
+def parse_args(argv=None):
+    """
+    Parse the command-line parameters.
+
+    :param argv: list of strings, command-line parameters without the program
+                 name, defaults to sys.argv[1:]
+    :return: argparse.Namespace object
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("-o", "--output", default=None)
+    run_parser.add_argument("-l", "--label", default="")
+    run_parser.add_argument("-n", "--num_mods", default=[1000, 10000],
+                            type=int, nargs="+")
+    run_parser.add_argument("-s", "--scenario", default=None, nargs="+",
+                            choices=[name for name, scenario in SCENARIOS])
+    run_parser.add_argument("--num_versions", default=3, type=int)
+    run_parser.add_argument("--depth", default=6, type=int)
+    run_parser.add_argument("--width", default=3, type=int)
+    run_parser.add_argument("--conflict_density", default=0.1, type=float)
+    run_parser.add_argument("--env_length", default=2, type=int)
+    run_parser.add_argument("--presets", default=["mod", "lib"], nargs="+",
+                            choices=["mod", "path", "lib", "inc", "py",
+                                     "void"])
+    run_parser.add_argument("--loaded", default=50, type=int)
+    run_parser.add_argument("--num_vars", default=100, type=int)
+    run_parser.add_argument("--path_length", default=20, type=int)
+    run_parser.add_argument("-r", "--repeat", default=10, type=int)
+    run_parser.add_argument("--seed", default=0, type=int)
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("base_file")
+    compare_parser.add_argument("new_file")
+    compare_parser.add_argument("-t", "--threshold", default=0.1, type=float)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "run":
+        print("%-18s %8s %8s %12s %12s" % ("scenario", "modules", "loaded",
+              "min (ms)", "median (ms)"))
+        results = run_suite(args)
+        if args.output is not None:
+            with open(args.output, "w") as out_file:
+                json.dump(results, out_file, indent=1, sort_keys=True)
+    else:
+        with open(args.base_file, "r") as in_file:
+            base = json.load(in_file)
+        with open(args.new_file, "r") as in_file:
+            new = json.load(in_file)
+        if compare_results(base, new, args.threshold) != 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
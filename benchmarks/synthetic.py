@@ -0,0 +1,103 @@
+import random
+from pmod.module import Module
+from pmod.modmanager import ModManager
+
+
+# Sub-directories of the installation destination passed to each preset
+PRESET_DIRS = {"mod": "", "path": "/bin", "lib": "/lib", "inc": "/include",
+               "py": "/python", "void": ""}
+
+# Number of variables shared by the extra environ items of modules
+NUM_EXTRA_VARS = 8
+
+
+def make_catalogue(num_mods=1000, num_versions=3, depth=4, width=3,
+                   conflict_density=0.0, seed=0, mod_class=Module,
+                   env_length=0, presets=("mod",)):
+    """
+    Generate a synthetic catalogue of modules.
+
+    The packages are arranged in layers. Packages in layer 0 have no
+    dependencies, while each package in a higher layer depends on 'width'
+    randomly chosen packages in lower layers. Each package has 'num_versions'
+    versions that conflict with each other mutually, and only the first
+    version of each package is used as a dependency, so that the catalogue is
+    free of paradoxes.
+
+    Packages are created with the presets in 'presets' in turn. Each module
+    may prepend 'env_length' more directories to variables shared with other
+    modules, as long modulefiles do.
+
+    :param num_mods: integer, approximate number of modules
+    :param num_versions: integer, number of versions of each package
+    :param depth: integer, number of layers
+    :param width: integer, number of direct dependencies of each package
+    :param conflict_density: float, probability that a module conflicts with
+                             a non-default version of another package in the
+                             same layer
+    :param seed: integer, seed of the random number generator
+    :param mod_class: class of the modules
+    :param env_length: integer, number of extra environ items of each module
+    :param presets: tuple of presets of the Module class, see PRESET_DIRS
+    :return: instance of ModManager
+    """
+    rng = random.Random(seed)
+    num_packages = max(num_mods // num_versions, depth)
+    layers = [[] for i in range(depth)]
+    for i in range(num_packages):
+        layers[i * depth // num_packages].append("pkg%d" % i)
+
+    mod_manager = ModManager()
+    for layer_id, layer in enumerate(layers):
+        lower = [package for lower_layer in layers[:layer_id]
+                 for package in lower_layer]
+        for package in layer:
+            preset = presets[int(package[3:]) % len(presets)]
+            versions = ["%s/%d.0" % (package, k) for k in range(num_versions)]
+            if len(lower) != 0:
+                depend = ["%s/0.0" % name for name in
+                          rng.sample(lower, min(width, len(lower)))]
+            else:
+                depend = []
+            for version in versions:
+                conflict = [name for name in versions if name != version]
+                if rng.random() < conflict_density:
+                    other = rng.choice(layer)
+                    if other != package and num_versions > 1:
+                        conflict.append("%s/%d.0" % (other, num_versions - 1))
+                destination = "/opt/%s" % version
+                environ = [("prepend", "PM_BENCH_PATH%d" % (k % NUM_EXTRA_VARS),
+                            "%s/extra%d" % (destination, k))
+                           for k in range(env_length)]
+                mod_manager.create_mod(version, mod_class=mod_class,
+                                       preset=preset,
+                                       destination=destination +
+                                       PRESET_DIRS[preset],
+                                       environ=environ, depend=depend,
+                                       conflict=conflict)
+    return mod_manager
+
+
+def make_environ(mod_manager=None, mod_list=(), num_vars=0, path_length=0):
+    """
+    Generate a synthetic environment, optionally with modules loaded.
+
+    :param mod_manager: instance of ModManager to load the modules with
+    :param mod_list: list of names of modules to load
+    :param num_vars: integer, number of unrelated variables, as set by the
+                     shell and other tools
+    :param path_length: integer, number of directories already in PATH,
+                        LD_LIBRARY_PATH and each unrelated variable
+    :return: dict of environmental variables
+    """
+    padding = ["/usr/pad%d/bin" % i for i in range(path_length)]
+    environ = {"HOME": "/home/bench", "USER": "bench", "LINES": "50",
+               "COLUMNS": "160",
+               "PATH": ":".join(padding + ["/usr/local/bin", "/usr/bin",
+                                           "/bin"]),
+               "LD_LIBRARY_PATH": ":".join(padding + ["/usr/lib"])}
+    for i in range(num_vars):
+        environ["PM_UNRELATED_%d" % i] = ":".join(padding + ["/usr/lib"])
+    if mod_manager is not None and len(mod_list) != 0:
+        mod_manager.load_environ(list(mod_list), environ)
+    return environ
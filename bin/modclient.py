@@ -0,0 +1,13 @@
+#! /bin/env python
+import sys
+from pmod.daemon import run_client
+
+
+# Delegate the command to the module server, fall back to in-process execution
+# if the server is not available.
+status = run_client(sys.argv[1:])
+if status is None:
+    from pmod.cli import main
+    main(sys.argv[1:])
+else:
+    sys.exit(status)
@@ -0,0 +1,35 @@
+#! /bin/env python
+import sys
+import argparse
+from pmod.utilities import print_stderr
+from pmod.daemon import ModServer, request_server, daemonize
+
+
+# Parse cli-parameters
+parser = argparse.ArgumentParser()
+parser.add_argument("--foreground", default=False, action="store_true")
+parser.add_argument("-t", "--timeout", type=float, default=None,
+                    help="exit after being idle for given seconds")
+parser.add_argument("operation", type=str, action="store",
+                    choices=("start", "stop", "status"))
+args = parser.parse_args()
+
+# Perform the required operation
+if args.operation == "start":
+    if request_server({"operation": "ping"}, timeout=1.0) is not None:
+        sys.exit(0)
+    server = ModServer(timeout=args.timeout)
+    if not args.foreground:
+        daemonize()
+    server.serve_forever()
+elif args.operation == "stop":
+    reply = request_server({"operation": "shutdown"}, timeout=5.0)
+    if reply is None:
+        print_stderr("Module server not running")
+elif args.operation == "status":
+    reply = request_server({"operation": "ping"}, timeout=1.0)
+    if reply is None:
+        print_stderr("Module server not running")
+        sys.exit(1)
+    else:
+        print_stderr("Module server running with pid %d" % reply["pid"])
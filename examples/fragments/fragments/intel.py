@@ -0,0 +1,17 @@
+openmpi_versions = ['openmpi/%s' % version for version in
+                    ['3.1.3-intel', '2.0.2-gcc', '1.6.5-gcc']]
+
+
+def setup(m):
+    # Intel_Parallel_Studio_XE 2018 update1
+    m.create_mod('IntelCC/2018.1.163', preset='void',
+                 environ=[('reset', 'FC', 'ifort'), ('reset', 'F90', 'ifort'),
+                          ('reset', 'CC', 'icc'), ('reset', 'CXX', 'icpc')],
+                 command=['source /opt/intel/bin/compilervars.sh intel64'])
+
+    m.create_mod('MKL/2018.1.163', preset='void',
+                 command=['source /opt/intel/mkl/bin/mklvars.sh intel64'])
+
+    m.create_mod('IntelMPI/2018.1.163', preset='void',
+                 depend=['IntelCC/2018.1.163'], conflict=openmpi_versions,
+                 command=['source /opt/intel/impi/2018.1.163/bin64/mpivars.sh intel64'])
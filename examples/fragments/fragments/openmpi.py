@@ -0,0 +1,18 @@
+openmpi_versions = ['openmpi/%s' % version for version in
+                    ['3.1.3-intel', '2.0.2-gcc', '1.6.5-gcc']]
+
+
+def exclude(items, item_excluded):
+    items_remain = [item for item in items if item != item_excluded]
+    return items_remain
+
+
+def setup(m):
+    for version in openmpi_versions:
+        if version == 'openmpi/3.1.3-intel':
+            depend = ['IntelCC/2018.1.163']
+        else:
+            depend = []
+        m.create_mod(version, preset='mod', destination='/opt/%s' % version,
+                     depend=depend, conflict=exclude(openmpi_versions, version))
+        m.create_mod(version, preset='void', conflict=['IntelMPI/2018.1.163'])
@@ -0,0 +1,9 @@
+def setup(m):
+    m.create_mod('orca/3.0.3', preset='void',
+                 depend=['openmpi/1.6.5-gcc'],
+                 alias=[('orca3',
+                      'nohup /opt/orca/3.0.3/bin/orca ../INCAR > ../OUTCAR &')])
+    m.create_mod('orca/4.0.1', preset='void',
+                 depend=['openmpi/2.0.2-gcc'],
+                 alias=[('orca4',
+                      'nohup /opt/orca/4.0.1/bin/orca ../INCAR > ../OUTCAR &')])
@@ -0,0 +1,3 @@
+def setup(m):
+    m.create_mod('usrlocal', preset='lib', destination='/usr/local/lib')
+    m.create_mod('usrlocal', preset='lib', destination='/usr/local/lib64')
@@ -0,0 +1,6 @@
+def setup(m):
+    for version in ['vasp/5.4.1', 'vasp/5.4.4']:
+        m.create_mod(version, preset='path', destination='/opt/%s/bin' % version,
+                     depend=['IntelMPI/2018.1.163', 'MKL/2018.1.163'])
+    m.create_mod('vtstscripts', preset='path',
+                 destination='/opt/vasp/vtstscripts-935')
@@ -0,0 +1,7 @@
+from pmod.fragments import load_fragments
+
+
+# The modules are defined in the fragments sub-package, one file per package
+# family. Put this example in place of the modulefiles package to enable lazy
+# loading of the fragments.
+mod_manager = load_fragments(__name__.rpartition(".")[0] + ".fragments")
@@ -6,15 +6,55 @@ export PATH=$PM_ROOT/bin:$PATH
 export PYTHONPATH=$PM_ROOT:$PYTHONPATH
 export PM_LOADED_MODULES=""
 
+# Set to 1 to delegate the 'module' command to a resident server process,
+# which avoids reloading python and the modulefiles on each call
+PM_USE_SERVER=0
+
 # Setup the 'module' command
-if [ ! -x "$PM_ROOT/bin/modcmd.py" ]; then
-    chmod +x $PM_ROOT/bin/modcmd.py
+for script in modcmd.py modclient.py modserver.py; do
+    if [ ! -x "$PM_ROOT/bin/$script" ]; then
+        chmod +x $PM_ROOT/bin/$script
+    fi
+done
+if [ "$PM_USE_SERVER" = "1" ]; then
+    modserver.py start
+    function module ()
+    {
+        eval `PM_EVAL=1 modclient.py $*`
+    }
+else
+    function module ()
+    {
+        eval `PM_EVAL=1 modcmd.py $*`
+    }
 fi
-function module ()
-{
-    eval `modcmd.py $*`
-}
 
+# Setup completion of subcommands and module names
 commands="avail av status stat list ls info show display diagnose probe search \
 load add unload remove rm delete del clean purge reload update"
-complete -W "$commands" module
+function _pm_complete ()
+{
+    local cur=${COMP_WORDS[COMP_CWORD]}
+    # Skip the options before the subcommand, e.g. 'module -f load'
+    local i=1
+    while [ $i -lt $COMP_CWORD ]; do
+        case ${COMP_WORDS[i]} in
+            -s|--shell|-j|--jobs) i=$((i + 2)) ;;
+            -*) i=$((i + 1)) ;;
+            *) break ;;
+        esac
+    done
+    if [ $COMP_CWORD -eq $i ]; then
+        COMPREPLY=($(compgen -W "$commands" -- "$cur"))
+        return
+    fi
+    case ${COMP_WORDS[i]} in
+        info|show|display|diagnose|probe|load|add|unload|remove|rm|delete|del)
+            COMPREPLY=($(modcmd.py complete "$cur" 2>/dev/null))
+            ;;
+        *)
+            COMPREPLY=()
+            ;;
+    esac
+}
+complete -F _pm_complete module
@@ -0,0 +1,43 @@
+# Installation destination of pmod
+set -g PM_ROOT $HOME/proj/pmod
+
+# Setup environment variables
+set -gx PATH $PM_ROOT/bin $PATH
+if set -q PYTHONPATH
+    set -gx PYTHONPATH $PM_ROOT:$PYTHONPATH
+else
+    set -gx PYTHONPATH $PM_ROOT
+end
+set -gx PM_LOADED_MODULES ""
+
+# Set to 1 to delegate the 'module' command to a resident server process,
+# which avoids reloading python and the modulefiles on each call
+set -g PM_USE_SERVER 0
+
+# Setup the 'module' command
+for script in modcmd.py modclient.py modserver.py
+    if not test -x "$PM_ROOT/bin/$script"
+        chmod +x $PM_ROOT/bin/$script
+    end
+end
+if test "$PM_USE_SERVER" = "1"
+    modserver.py start
+    function module
+        env PM_EVAL=1 modclient.py --shell fish $argv | source
+    end
+else
+    function module
+        env PM_EVAL=1 modcmd.py --shell fish $argv | source
+    end
+end
+
+# Setup completion of subcommands and module names
+set -l commands avail av status stat list ls info show display diagnose \
+    probe search load add unload remove rm delete del clean purge reload \
+    update
+set -l mod_commands info show display diagnose probe load add unload remove \
+    rm delete del
+complete -c module -f -n "not __fish_seen_subcommand_from $commands" \
+    -a "$commands"
+complete -c module -f -n "__fish_seen_subcommand_from $mod_commands" \
+    -a "(modcmd.py complete (commandline -ct))"
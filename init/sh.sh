@@ -0,0 +1,30 @@
+# Installation destination of pmod
+PM_ROOT=$HOME/proj/pmod
+
+# Setup environment variables
+PATH=$PM_ROOT/bin:$PATH; export PATH
+PYTHONPATH=$PM_ROOT:$PYTHONPATH; export PYTHONPATH
+PM_LOADED_MODULES=""; export PM_LOADED_MODULES
+
+# Set to 1 to delegate the 'module' command to a resident server process,
+# which avoids reloading python and the modulefiles on each call
+PM_USE_SERVER=0
+
+# Setup the 'module' command
+for script in modcmd.py modclient.py modserver.py; do
+    if [ ! -x "$PM_ROOT/bin/$script" ]; then
+        chmod +x $PM_ROOT/bin/$script
+    fi
+done
+if [ "$PM_USE_SERVER" = "1" ]; then
+    modserver.py start
+    module ()
+    {
+        eval "$(PM_EVAL=1 modclient.py --shell sh "$@")"
+    }
+else
+    module ()
+    {
+        eval "$(PM_EVAL=1 modcmd.py --shell sh "$@")"
+    }
+fi
@@ -0,0 +1,60 @@
+# Installation destination of pmod
+PM_ROOT=$HOME/proj/pmod
+
+# Setup environment variables
+export PATH=$PM_ROOT/bin:$PATH
+export PYTHONPATH=$PM_ROOT:$PYTHONPATH
+export PM_LOADED_MODULES=""
+
+# Set to 1 to delegate the 'module' command to a resident server process,
+# which avoids reloading python and the modulefiles on each call
+PM_USE_SERVER=0
+
+# Setup the 'module' command
+for script in modcmd.py modclient.py modserver.py; do
+    if [ ! -x "$PM_ROOT/bin/$script" ]; then
+        chmod +x $PM_ROOT/bin/$script
+    fi
+done
+if [ "$PM_USE_SERVER" = "1" ]; then
+    modserver.py start
+    function module ()
+    {
+        eval "$(PM_EVAL=1 modclient.py --shell zsh "$@")"
+    }
+else
+    function module ()
+    {
+        eval "$(PM_EVAL=1 modcmd.py --shell zsh "$@")"
+    }
+fi
+
+# Setup completion of subcommands and module names
+function _pm_complete ()
+{
+    local commands
+    commands=(avail av status stat list ls info show display diagnose probe
+              search load add unload remove rm delete del clean purge reload
+              update)
+    # Skip the options before the subcommand, e.g. 'module -f load'
+    local i=2
+    while (( i < CURRENT )); do
+        case ${words[i]} in
+            -s|--shell|-j|--jobs) (( i += 2 )) ;;
+            -*) (( i += 1 )) ;;
+            *) break ;;
+        esac
+    done
+    if (( CURRENT == i )); then
+        compadd -a commands
+        return
+    fi
+    case ${words[i]} in
+        info|show|display|diagnose|probe|load|add|unload|remove|rm|delete|del)
+            compadd -- ${(f)"$(modcmd.py complete "$PREFIX" 2>/dev/null)"}
+            ;;
+    esac
+}
+if (( $+functions[compdef] )); then
+    compdef _pm_complete module
+fi
@@ -0,0 +1,204 @@
+import sys
+import os
+import json
+import multiprocessing
+from pmod.shells import JsonEmitter
+from pmod.modmanager import ModuleError
+
+
+# The resolver used by worker processes. It is set before the workers are
+# forked, so that they inherit the module database from the parent process
+# instead of receiving a pickled copy.
+worker_resolver = None
+
+
+def resolve_in_worker(mod_list):
+    """
+    Resolve a module set in a worker process.
+
+    :param mod_list: list of the names of modules
+    :return: dict, see BatchResolver.resolve
+    """
+    return worker_resolver.resolve(mod_list)
+
+
+def create_pool(num_procs):
+    """
+    Create a pool of worker processes by forking current process.
+
+    :param num_procs: integer, number of worker processes
+    :return: instance of multiprocessing.pool.Pool, or None if forking is
+             not supported on current platform
+    """
+    if not hasattr(os, "fork"):
+        return None
+    if hasattr(multiprocessing, "get_context"):
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing
+    return context.Pool(num_procs)
+
+
+def read_mod_sets(in_file):
+    """
+    Read module sets from a file in JSON-lines format.
+
+    Each non-empty line is either a list of module names, e.g.
+    ["vasp/5.4.1", "openmpi"], or an object with the list in key "modules".
+
+    :param in_file: file object to read from
+    :return: generator of lists of module names
+    """
+    for line in in_file:
+        line = line.strip()
+        if line == "":
+            continue
+        mod_set = json.loads(line)
+        if isinstance(mod_set, dict):
+            mod_set = mod_set["modules"]
+        yield mod_set
+
+
+class BatchResolver(object):
+    """
+    Class that resolves the environments of many module sets loaded from the
+    same base environment, e.g. for the jobs of a parameter sweep.
+
+    The dependency closures, conflicting modules and sorted orders of modules
+    are memoized in the dependency graph of the module manager, and shared by
+    all the module sets. Module sets that are identical after resolving the
+    names are resolved only once.
+
+    self.mod_manager is the instance of ModManager.
+
+    self.environ is a copy of the base environment.
+
+    self.force_no_auto indicates whether to disable auto mode.
+
+    self.results maps frozensets of module names to the results of resolve.
+
+    self.emitter converts the changes of each module set into a dictionary.
+    """
+    def __init__(self, mod_manager, environ=None, force_no_auto=False):
+        """
+        :param mod_manager: instance of ModManager
+        :param environ: mapping of environmental variables to start from,
+                        defaults to os.environ
+        :param force_no_auto: boolean, whether to force to disable auto mode
+        """
+        if environ is None:
+            environ = os.environ
+        self.mod_manager = mod_manager
+        self.environ = dict(environ)
+        self.force_no_auto = force_no_auto
+        self.results = dict()
+        self.emitter = JsonEmitter()
+
+    def resolve(self, mod_list):
+        """
+        Resolve the changes to the base environment for loading a module set.
+
+        :param mod_list: list of the names of modules, which may omit version
+                         numbers as in the 'module' command
+        :return: dict with key "modules" for the resolved names of modules,
+                 and keys of JsonEmitter.get_dict for the changes, or key
+                 "error" if any of the modules is undefined or the module set
+                 cannot be loaded
+        """
+        mod_names = []
+        mods_undefined = []
+        for mod_name in mod_list:
+            mods_defined = self.mod_manager.verify_mod_names([mod_name])
+            if len(mods_defined) == 0:
+                mods_undefined.append(mod_name)
+            mod_names.extend(mods_defined)
+        key = frozenset(mod_names)
+        if len(mods_undefined) != 0:
+            # A partial environment would look valid, so nothing is resolved
+            return {"modules": sorted(key),
+                    "error": "undefined modules %s" % ", ".join(mods_undefined)}
+        result = self.results.get(key)
+        if result is None:
+            result = {"modules": sorted(key)}
+            try:
+                sandbox = self.mod_manager.resolve_load(mod_names,
+                                                        self.force_no_auto,
+                                                        self.environ)
+                result.update(self.emitter.get_dict(sandbox.get_changes()))
+            except ModuleError as error:
+                result["error"] = str(error)
+            self.results[key] = result
+        return result
+
+    def resolve_all(self, mod_sets, num_procs=1, chunk_size=64):
+        """
+        Resolve a sequence of module sets, optionally in parallel.
+
+        With more than one process, the module sets are distributed to worker
+        processes forked from current process in chunks, and the results are
+        yielded as soon as they arrive, in the same order as mod_sets. Each
+        worker keeps its own memo of results.
+
+        :param mod_sets: iterable of lists of module names
+        :param num_procs: integer, number of processes, None or 0 for the
+                          number of CPUs
+        :param chunk_size: integer, number of module sets sent to a worker
+                           at a time
+        :return: generator of results of resolve, in the same order as
+                 mod_sets
+        """
+        global worker_resolver
+        if not num_procs:
+            num_procs = multiprocessing.cpu_count()
+        pool = None
+        if num_procs > 1:
+            # Build the indices before forking so that they are shared by
+            # the workers.
+            self.mod_manager.get_graph()
+            self.mod_manager.get_status_index()
+            self.mod_manager.get_name_index()
+            worker_resolver = self
+            pool = create_pool(num_procs)
+        if pool is None:
+            for mod_list in mod_sets:
+                yield self.resolve(mod_list)
+            return
+        try:
+            for result in pool.imap(resolve_in_worker, mod_sets, chunk_size):
+                yield result
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+            worker_resolver = None
+
+
+def run_batch(mod_manager, file_names, force_no_auto=False, num_procs=1):
+    """
+    Resolve the module sets in JSON-lines files and write the results to
+    stdout, one JSON object per line in the same order.
+
+    :param mod_manager: instance of ModManager
+    :param file_names: list of names of input files, "-" or an empty list for
+                       stdin
+    :param force_no_auto: boolean, whether to force to disable auto mode
+    :param num_procs: integer, number of processes, None or 0 for the number
+                      of CPUs
+    :return: None
+    """
+    resolver = BatchResolver(mod_manager, force_no_auto=force_no_auto)
+    if len(file_names) == 0:
+        file_names = ["-"]
+    for file_name in file_names:
+        if file_name == "-":
+            in_file = sys.stdin
+        else:
+            in_file = open(file_name, "r")
+        try:
+            for result in resolver.resolve_all(read_mod_sets(in_file),
+                                               num_procs):
+                sys.stdout.write("%s\n" % json.dumps(result, sort_keys=True))
+        finally:
+            if in_file is not sys.stdin:
+                in_file.close()
+    sys.stdout.flush()
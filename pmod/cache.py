@@ -0,0 +1,412 @@
+import sys
+import os
+import hashlib
+import pickle
+import tempfile
+from pmod.capture import CommandCapture
+from pmod.profiler import profiler
+
+
+# Bump this number whenever the layout of pickled objects changes, so that
+# caches written by older versions of pmod are discarded automatically.
+CACHE_VERSION = 9
+
+
+def get_cache_dir():
+    """
+    Get the directory where the module database cache is stored.
+
+    The directory is taken from PM_CACHE_DIR if set. Otherwise it defaults to
+    $XDG_CACHE_HOME/pmod, or ~/.cache/pmod if XDG_CACHE_HOME is not set.
+
+    :return: string, path of the cache directory
+    """
+    cache_dir = os.environ.get("PM_CACHE_DIR")
+    if not cache_dir:
+        cache_home = os.environ.get("XDG_CACHE_HOME")
+        if not cache_home:
+            cache_home = os.path.join(os.path.expanduser("~"), ".cache")
+        cache_dir = os.path.join(cache_home, "pmod")
+    return cache_dir
+
+
+def find_module_file(module_name):
+    """
+    Locate the source file of a python module without importing it.
+
+    :param module_name: string, dotted name of the module, e.g.
+                        "modulefiles.setup"
+    :return: string, absolute path of the source file, or None if not found
+    """
+    rel_path = module_name.replace(".", os.sep)
+    for directory in sys.path:
+        if directory == "":
+            directory = os.getcwd()
+        for candidate in (rel_path + ".py",
+                          os.path.join(rel_path, "__init__.py")):
+            full_path = os.path.join(directory, candidate)
+            if os.path.isfile(full_path):
+                return os.path.abspath(full_path)
+    return None
+
+
+def get_source_file(module):
+    """
+    Get the source file of an imported python module.
+
+    :param module: python module object
+    :return: string, absolute path of the source file, or None for built-in
+             modules
+    """
+    file_name = getattr(module, "__file__", None)
+    if file_name is None:
+        return None
+    if file_name.endswith((".pyc", ".pyo")):
+        file_name = file_name[:-1]
+    if not os.path.isfile(file_name):
+        return None
+    return os.path.abspath(file_name)
+
+
+def hash_file(file_name):
+    """
+    Get the md5 checksum of a file.
+
+    :param file_name: string, name of the file
+    :return: string, hexadecimal checksum
+    """
+    with open(file_name, "rb") as in_file:
+        return hashlib.md5(in_file.read()).hexdigest()
+
+
+def stamp_file(file_name):
+    """
+    Get the stamp of a file for detecting modifications.
+
+    :param file_name: string, name of the file
+    :return: tuple of (file_name, mtime, size, checksum)
+    """
+    stat = os.stat(file_name)
+    return file_name, stat.st_mtime, stat.st_size, hash_file(file_name)
+
+
+def check_stamp(stamp):
+    """
+    Check if a file is unchanged since its stamp was taken.
+
+    Modification time and size are compared first. The checksum is compared
+    only if the modification time differs, so touching a file without editing
+    it does not invalidate the cache.
+
+    :param stamp: tuple returned by stamp_file
+    :return: True if the file is unchanged, False otherwise
+    """
+    file_name, mtime, size, checksum = stamp
+    try:
+        stat = os.stat(file_name)
+    except OSError:
+        return False
+    if stat.st_size != size:
+        return False
+    if stat.st_mtime == mtime:
+        return True
+    try:
+        return hash_file(file_name) == checksum
+    except IOError:
+        return False
+
+
+class ModCache(object):
+    """
+    Class that persists a validated snapshot of a ModManager instance.
+
+    The snapshot is a pickle of the ModManager instance defined in the setup
+    module, together with the stamps of all the files it was built from: the
+    setup module, other modules it imported from the same package, and the
+    modules defining the classes of the module manager and each module. The
+    snapshot is regarded as fresh only if none of these files has changed.
+
+    The cache file contains three pickles written by the same pickler: the
+    version and stamps, the prefix index of module names, and the module
+    manager. The prefix index comes before the module manager so that
+    completing module names needs not to restore the whole database. As the
+    memo is shared, the prefix index is stored only once.
+
+    If PM_CAPTURE_COMMANDS is set to a non-empty value, the commands of
+    modules sourcing scripts are replaced by the captured changes to
+    environmental variables before the sanity check, see pmod/capture.py.
+    The scripts are then stamped as the source files, and the snapshot is
+    stored in a separate file.
+
+    self.setup_name is the dotted name of the setup module.
+
+    self.setup_file is the source file of the setup module.
+
+    self.cache_file is the file where the snapshot is stored. It is None if
+    the snapshot is not to be persisted.
+
+    self.capture indicates whether to capture the commands of modules.
+
+    self.capture_file is the file where the captured commands are stored. It
+    is None if the captures are not to be persisted.
+
+    self.stamps contains the stamps of the source files of the last loaded or
+    dumped module manager.
+    """
+    def __init__(self, setup_name="modulefiles.setup", cache_dir=None,
+                 persistent=True, capture=None):
+        """
+        :param setup_name: string, dotted name of the setup module
+        :param cache_dir: string, directory to store the cache, see
+                          get_cache_dir for the default value
+        :param persistent: boolean, whether to write the snapshot to disk. If
+                           False, only the stamps are kept in memory for
+                           checking the freshness.
+        :param capture: boolean, whether to capture the commands of modules,
+                        defaults to True if PM_CAPTURE_COMMANDS is set to a
+                        non-empty value
+        """
+        self.setup_name = setup_name
+        self.setup_file = find_module_file(setup_name)
+        if cache_dir is None:
+            cache_dir = get_cache_dir()
+        if capture is None:
+            capture = bool(os.environ.get("PM_CAPTURE_COMMANDS"))
+        self.capture = capture
+        if self.capture and persistent:
+            self.capture_file = os.path.join(cache_dir, "captures.json")
+        else:
+            self.capture_file = None
+        if self.setup_file is None or not persistent:
+            self.cache_file = None
+        else:
+            # Different installations and python versions must not share the
+            # same cache file.
+            path_hash = hashlib.md5(self.setup_file.encode()).hexdigest()
+            file_name = "%s-%s-py%d%s.pkl" % (setup_name, path_hash[:12],
+                                               sys.version_info[0],
+                                               "-capture" if capture else "")
+            self.cache_file = os.path.join(cache_dir, file_name)
+        self.stamps = None
+
+    def is_fresh(self):
+        """
+        Check if the source files of the last loaded or dumped module manager
+        are unchanged.
+
+        :return: True if fresh, False otherwise
+        """
+        if self.stamps is None:
+            return False
+        for stamp in self.stamps:
+            if not check_stamp(stamp):
+                return False
+        return True
+
+    def load(self, prefixes_only=False):
+        """
+        Load the module manager from the cache file.
+
+        :param prefixes_only: boolean, whether to load the prefix index of
+                              module names only
+        :return: instance of ModManager, or PrefixIndex if prefixes_only is
+                 True, if the cache is fresh, None otherwise
+        """
+        if self.cache_file is None or not os.path.isfile(self.cache_file):
+            return None
+        try:
+            with open(self.cache_file, "rb") as in_file:
+                unpickler = pickle.Unpickler(in_file)
+                version, stamps = unpickler.load()
+                if version != CACHE_VERSION:
+                    return None
+                for stamp in stamps:
+                    if not check_stamp(stamp):
+                        return None
+                prefixes = unpickler.load()
+                if prefixes_only:
+                    return prefixes
+                mod_manager = unpickler.load()
+        except Exception:
+            # Corrupted or incompatible cache, e.g. a class has been renamed.
+            return None
+        self.stamps = stamps
+        return mod_manager
+
+    def get_mod_classes(self, mod_manager):
+        """
+        Get the classes of the module manager and all the modules, including
+        their base classes.
+
+        :param mod_manager: instance of ModManager
+        :return: set of class objects
+        """
+        classes = set()
+        mod_classes = set([type(mod_manager)])
+        for module in mod_manager.available_mods.values():
+            mod_classes.add(type(module))
+        for mod_class in mod_classes:
+            classes.update([base for base in mod_class.__mro__
+                            if base is not object])
+        return classes
+
+    def get_source_files(self, mod_manager, new_modules):
+        """
+        Get the files from which the module manager is built.
+
+        :param mod_manager: instance of ModManager
+        :param new_modules: list of names of python modules imported while
+                            importing the setup module
+        :return: list of file names
+        """
+        source_files = set([self.setup_file])
+        setup_package = self.setup_name.rpartition(".")[0]
+        for module_name in new_modules:
+            if setup_package != "" and (module_name == setup_package or
+                    module_name.startswith(setup_package + ".")):
+                source_file = get_source_file(sys.modules[module_name])
+                if source_file is not None:
+                    source_files.add(source_file)
+        for mod_class in self.get_mod_classes(mod_manager):
+            source_file = get_source_file(sys.modules.get(mod_class.__module__))
+            if source_file is not None:
+                source_files.add(source_file)
+        return sorted(source_files)
+
+    def is_restorable(self, mod_manager):
+        """
+        Check if the module manager can be restored without importing the
+        setup module. Classes defined in the setup module itself would trigger
+        the import of the setup module during unpickling.
+
+        :param mod_manager: instance of ModManager
+        :return: True if restorable, False otherwise
+        """
+        for mod_class in self.get_mod_classes(mod_manager):
+            if mod_class.__module__ in (self.setup_name, "__main__"):
+                return False
+        return True
+
+    def dump(self, mod_manager, new_modules=(), extra_files=()):
+        """
+        Record the stamps of the source files and save the module manager to
+        the cache file.
+
+        Failures, e.g. read-only file systems or modules holding unpicklable
+        attributes, are silently ignored as the cache is merely an
+        optimization. The temporary file is removed if the snapshot is not
+        written completely.
+
+        :param mod_manager: instance of ModManager
+        :param new_modules: list of names of python modules imported while
+                            importing the setup module
+        :param extra_files: list of other files whose modification should
+                            invalidate the cache, e.g. captured scripts
+        :return: None
+        """
+        if self.setup_file is None:
+            return
+        source_files = self.get_source_files(mod_manager, new_modules)
+        source_files.extend(extra_files)
+        try:
+            self.stamps = [stamp_file(file_name) for file_name in source_files]
+        except (IOError, OSError):
+            self.stamps = None
+            return
+        if self.cache_file is None or not self.is_restorable(mod_manager):
+            return
+        cache_dir = os.path.dirname(self.cache_file)
+        temp_file = None
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            fd, temp_file = tempfile.mkstemp(dir=cache_dir)
+            with os.fdopen(fd, "wb") as out_file:
+                pickler = pickle.Pickler(out_file, protocol=2)
+                pickler.dump((CACHE_VERSION, self.stamps))
+                pickler.dump(mod_manager.get_name_index().prefixes)
+                pickler.dump(mod_manager)
+            os.rename(temp_file, self.cache_file)
+            temp_file = None
+        except Exception:
+            # Pickling raises TypeError or AttributeError, rather than
+            # PicklingError, for some unpicklable objects.
+            pass
+        finally:
+            if temp_file is not None:
+                try:
+                    os.remove(temp_file)
+                except OSError:
+                    pass
+
+    def clear(self):
+        """
+        Remove the cache file.
+
+        :return: None
+        """
+        if self.cache_file is not None and os.path.isfile(self.cache_file):
+            os.remove(self.cache_file)
+
+
+def load_mod_manager(setup_name="modulefiles.setup", cache=None):
+    """
+    Get the module manager defined in the setup module.
+
+    If the cache is fresh, the module manager is restored from the cache
+    directly without importing the setup module or checking the sanity.
+    Otherwise the setup module is (re-)imported, the sanity of the module
+    manager is checked and the cache is updated. Set PM_NO_CACHE to disable
+    the cache, and PM_CAPTURE_COMMANDS to capture the commands of modules.
+
+    :param setup_name: string, dotted name of the setup module
+    :param cache: instance of ModCache, created from setup_name if not given
+    :return: instance of ModManager
+    """
+    if cache is None:
+        cache = ModCache(setup_name,
+                         persistent=not os.environ.get("PM_NO_CACHE"))
+    mod_manager = cache.load()
+    if mod_manager is not None:
+        return mod_manager
+
+    # Remove previously imported configurations so that modifications are
+    # picked up by long-running processes.
+    setup_package = setup_name.rpartition(".")[0]
+    for module_name in list(sys.modules.keys()):
+        if module_name == setup_name or (setup_package != "" and
+                module_name.startswith(setup_package + ".")):
+            del sys.modules[module_name]
+
+    modules_before = set(sys.modules.keys())
+    with profiler.phase("import_setup"):
+        setup_module = __import__(setup_name, fromlist=["mod_manager"])
+    new_modules = set(sys.modules.keys()).difference(modules_before)
+    mod_manager = setup_module.mod_manager
+    scripts = []
+    if cache.capture:
+        scripts = CommandCapture(cache.capture_file).apply(mod_manager)
+    mod_manager.check_sanity()
+    cache.dump(mod_manager, sorted(new_modules), scripts)
+    return mod_manager
+
+
+def load_prefix_index(setup_name="modulefiles.setup", cache=None):
+    """
+    Get the prefix index of module names for completion.
+
+    The index is read from the cache without restoring the module manager if
+    the cache is fresh. Otherwise the module manager is loaded with
+    load_mod_manager.
+
+    :param setup_name: string, dotted name of the setup module
+    :param cache: instance of ModCache, created from setup_name if not given
+    :return: instance of PrefixIndex
+    """
+    if cache is None:
+        cache = ModCache(setup_name,
+                         persistent=not os.environ.get("PM_NO_CACHE"))
+    prefixes = cache.load(prefixes_only=True)
+    if prefixes is not None:
+        return prefixes
+    return load_mod_manager(setup_name, cache).get_name_index().prefixes
@@ -0,0 +1,298 @@
+import os
+import re
+import json
+import shlex
+import subprocess
+import sys
+import tempfile
+from pmod.shells import quote_posix
+
+
+# Commands containing these characters are not simple invocations of a script
+# and are never captured.
+SPECIAL_PATTERN = re.compile(r"[;&|<>`$(){}*?~\n]")
+
+# Variables maintained by the shell itself, which are not part of the effects
+# of a script.
+IGNORED_VARS = frozenset(["_", "SHLVL", "PWD", "OLDPWD"])
+
+# Variables holding lists of directories separated by ":", besides those
+# whose names end with "PATH", e.g. LD_LIBRARY_PATH. Changes to them are never
+# captured as "reset" items, which would wipe the values set by the user.
+PATH_VARS = frozenset(["MANPATH", "INFOPATH", "PKG_CONFIG_PATH", "CLASSPATH",
+                       "FPATH", "NLSPATH", "XDG_DATA_DIRS",
+                       "XDG_CONFIG_DIRS"])
+
+# Variables passed to the scripts from os.environ. Scripts are run in a clean
+# environment with only these variables and BASE_PATH, so that the captures
+# do not depend on the modules loaded when they are taken.
+PASSED_VARS = ("HOME", "USER", "LOGNAME", "LANG", "SHELL", "TMPDIR")
+BASE_PATH = "/usr/local/bin:/usr/bin:/bin"
+
+# Bump this number whenever the translation of captures changes.
+CAPTURE_VERSION = 2
+
+# Python code run after the script to print the resulting environment
+DUMP_ENVIRON = "import os, sys, json; json.dump(dict(os.environ), sys.stdout)"
+
+
+def parse_command(command):
+    """
+    Check if a command sources a script, e.g.
+    "source /opt/intel/bin/compilervars.sh intel64".
+
+    :param command: string, the command
+    :return: tuple of (script, args), where script is the absolute path of
+             the script and args is the list of arguments, or None if the
+             command does not source an existing script or does anything else
+    """
+    if SPECIAL_PATTERN.search(command) is not None:
+        return None
+    try:
+        words = shlex.split(command)
+    except ValueError:
+        return None
+    if len(words) < 2 or words[0] not in ("source", "."):
+        return None
+    script = words[1]
+    if not os.path.isabs(script) or not os.path.isfile(script):
+        return None
+    return script, words[2:]
+
+
+def is_path_list(env_name, old_value, new_value):
+    """
+    Check if a variable holds a list of directories separated by ":".
+
+    :param env_name: string, name of the variable
+    :param old_value: string, value before running the script
+    :param new_value: string, value after running the script
+    :return: True if the variable is a list, False if it is a scalar
+    """
+    return (env_name.endswith("PATH") or env_name in PATH_VARS or
+            ":" in old_value or ":" in new_value)
+
+
+def get_environ_items(before, after):
+    """
+    Translate the difference between two environments into environ items of
+    the 'Module' class.
+
+    Elements added to the head or tail of a list of directories, see
+    is_path_list, are translated into "prepend" or "append" items, so that
+    they can be removed when unloading. Since the scripts are run in a clean
+    environment, lists unset before are usually set to a single element,
+    which is translated into a "prepend" item as well. Changes to scalar
+    variables are translated into "reset" items. Removed variables are
+    ignored.
+
+    :param before: dict of environmental variables before running the script
+    :param after: dict of environmental variables after running the script
+    :return: list of (operation, env_name, pattern) tuples
+    """
+    environ = []
+    for env_name in sorted(after.keys()):
+        new_value = after[env_name]
+        old_value = before.get(env_name, "")
+        if env_name in IGNORED_VARS or new_value == old_value:
+            continue
+        if not is_path_list(env_name, old_value, new_value):
+            environ.append(("reset", env_name, new_value))
+            continue
+        new_patterns = [pattern for pattern in new_value.split(":")
+                        if pattern != ""]
+        old_patterns = [pattern for pattern in old_value.split(":")
+                        if pattern != ""]
+        num_old = len(old_patterns)
+        head, tail = None, None
+        if num_old == 0:
+            # Lists unset before are prepended to the values of the user
+            head, tail = new_patterns, []
+        else:
+            for i in range(len(new_patterns) - num_old + 1):
+                if new_patterns[i:i+num_old] == old_patterns:
+                    head, tail = new_patterns[:i], new_patterns[i+num_old:]
+                    break
+        if head is None:
+            # The old elements have been reordered or removed, so only the
+            # new elements are prepended.
+            old_set = set(old_patterns)
+            head = [pattern for pattern in new_patterns
+                    if pattern not in old_set]
+            tail = []
+        # Prepended one by one, so the last one goes first
+        for pattern in reversed(head):
+            environ.append(("prepend", env_name, pattern))
+        for pattern in tail:
+            environ.append(("append", env_name, pattern))
+    return environ
+
+
+class CommandCapture(object):
+    """
+    Class that runs scripts sourced by the commands of modules in a
+    subprocess, and captures their effects on environmental variables as
+    environ items.
+
+    Captured modules export the variables directly instead of asking the
+    shell to source the scripts on every load, and can be unloaded and
+    checked for status like other modules. Captures are stored in a JSON
+    file, keyed by the path, arguments and modification time of the script,
+    so that each script is run only once until it is modified.
+
+    Only the effects on environmental variables are captured. Shell
+    functions and aliases defined by the scripts are lost, so capturing is
+    enabled only if PM_CAPTURE_COMMANDS is set to a non-empty value.
+
+    self.cache_file is the file where the captures are stored, or None if
+    they are kept in memory only.
+
+    self.captures maps the keys of scripts to their environ items.
+
+    self.modified indicates whether self.captures has new items to be saved.
+    """
+    def __init__(self, cache_file=None):
+        """
+        :param cache_file: string, the file where the captures are stored
+        """
+        self.cache_file = cache_file
+        self.captures = dict()
+        self.modified = False
+        if cache_file is not None and os.path.isfile(cache_file):
+            try:
+                with open(cache_file, "r") as in_file:
+                    content = json.load(in_file)
+                if content.get("version") == CAPTURE_VERSION:
+                    self.captures = content["captures"]
+            except (IOError, OSError, ValueError, AttributeError, KeyError):
+                self.captures = dict()
+
+    def save(self):
+        """
+        Write the captures to self.cache_file if modified. Failures are
+        silently ignored, and the temporary file is removed.
+
+        :return: None
+        """
+        if self.cache_file is None or not self.modified:
+            return
+        cache_dir = os.path.dirname(self.cache_file)
+        temp_file = None
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            fd, temp_file = tempfile.mkstemp(dir=cache_dir)
+            with os.fdopen(fd, "w") as out_file:
+                json.dump({"version": CAPTURE_VERSION,
+                           "captures": self.captures}, out_file,
+                          sort_keys=True)
+            os.rename(temp_file, self.cache_file)
+            temp_file = None
+            self.modified = False
+        except (IOError, OSError):
+            pass
+        finally:
+            if temp_file is not None:
+                try:
+                    os.remove(temp_file)
+                except OSError:
+                    pass
+
+    def get_base_environ(self):
+        """
+        Get the clean environment to run the scripts in.
+
+        :return: dict of environmental variables
+        """
+        environ = dict([(env_name, os.environ[env_name])
+                        for env_name in PASSED_VARS if env_name in os.environ])
+        environ["PATH"] = BASE_PATH
+        # Otherwise python 3 may add LC_CTYPE when dumping the environment
+        environ["PYTHONCOERCECLOCALE"] = "0"
+        return environ
+
+    def run_script(self, script, args, environ):
+        """
+        Source a script in a bash subprocess and get the environment
+        afterwards.
+
+        :param script: string, absolute path of the script
+        :param args: list of arguments of the script
+        :param environ: dict of environmental variables to run the script in
+        :return: dict of environmental variables, or None if failed
+        """
+        code = "source %s >/dev/null 2>&1 </dev/null; exec %s -c %s" % (
+            " ".join([quote_posix(word) for word in [script] + args]),
+            quote_posix(sys.executable), quote_posix(DUMP_ENVIRON))
+        # Bash reads ~/.bashrc if stdin is a socket, e.g. under sshd, unless
+        # told not to do so.
+        try:
+            with open(os.devnull, "r") as null_file:
+                process = subprocess.Popen(["bash", "--norc", "--noprofile",
+                                            "-c", code], env=environ,
+                                           stdin=null_file,
+                                           stdout=subprocess.PIPE)
+                output = process.communicate()[0]
+        except (IOError, OSError):
+            return None
+        if process.returncode != 0:
+            return None
+        try:
+            return json.loads(output.decode())
+        except ValueError:
+            return None
+
+    def capture(self, script, args):
+        """
+        Get the environ items for sourcing a script, running it if not
+        captured before.
+
+        :param script: string, absolute path of the script
+        :param args: list of arguments of the script
+        :return: list of environ items, or None if the script failed
+        """
+        stat = os.stat(script)
+        key = json.dumps([script, args, stat.st_mtime, stat.st_size])
+        if key not in self.captures:
+            before = self.get_base_environ()
+            after = self.run_script(script, args, before)
+            if after is None:
+                return None
+            self.captures[key] = get_environ_items(before, after)
+            self.modified = True
+        return [tuple(item) for item in self.captures[key]]
+
+    def apply(self, mod_manager):
+        """
+        Replace the commands sourcing scripts in all the modules of a module
+        manager by the captured environ items.
+
+        Commands that are not captured, e.g. those doing anything other than
+        sourcing a script, are kept as is.
+
+        :param mod_manager: instance of ModManager
+        :return: sorted list of the scripts captured, whose modification
+                 should invalidate the module manager
+        """
+        scripts = set()
+        for module in mod_manager.available_mods.values():
+            if len(module.command) == 0:
+                continue
+            environ = list(module.environ)
+            command = []
+            for command_item in module.command:
+                parsed = parse_command(command_item)
+                items = None
+                if parsed is not None:
+                    items = self.capture(parsed[0], parsed[1])
+                if items is None:
+                    command.append(command_item)
+                else:
+                    environ.extend(items)
+                    scripts.add(parsed[0])
+            if len(command) != len(module.command):
+                module.environ = type(module.environ)(environ)
+                module.command = type(module.command)(command)
+        mod_manager.invalidate()
+        self.save()
+        return sorted(scripts)
@@ -0,0 +1,141 @@
+import sys
+import os
+import argparse
+from pmod.profiler import profiler
+from pmod.utilities import print_stderr
+from pmod.cache import load_mod_manager, load_prefix_index
+from pmod.shells import EMITTERS
+from pmod.batch import run_batch
+from pmod.modmanager import ModuleError
+from pmod.fragments import load_mods_lazily
+
+
+# Operations that need only the given modules, their dependencies and the
+# loaded modules, for which the fragments of modulefiles are imported lazily.
+LAZY_OPERATIONS = ("info", "show", "display", "diagnose", "probe", "load",
+                   "add", "unload", "remove", "rm", "delete", "del")
+
+
+def parse_args(argv=None):
+    """
+    Parse the command-line parameters.
+
+    :param argv: list of strings, command-line parameters without the program
+                 name, defaults to sys.argv[1:]
+    :return: argparse.Namespace object
+    """
+    parser = argparse.ArgumentParser(prog="modcmd.py")
+    parser.add_argument("-f", "--force_no_auto", default=False,
+                        action="store_true")
+    parser.add_argument("-s", "--shell", default="bash",
+                        choices=sorted(EMITTERS.keys()))
+    parser.add_argument("-j", "--jobs", default=1, type=int)
+    parser.add_argument("--profile", default=None, nargs="?",
+                        const="stderr", metavar="FILE")
+    parser.add_argument("operation", type=str,  action="store")
+    parser.add_argument("mod_name", type=str, action="store", nargs="*")
+    return parser.parse_args(argv)
+
+
+def run_command(mod_manager, args):
+    """
+    Perform the operation specified in the command-line parameters.
+
+    :param mod_manager: instance of ModManager
+    :param args: argparse.Namespace object returned by parse_args
+    :return: None
+    """
+    mod_manager.shell = args.shell
+    if args.operation in ("info", "show", "display", "diagnose", "probe",
+                          "load", "add", "unload", "remove", "rm", "delete",
+                          "del"):
+        mod_name = mod_manager.verify_mod_names(args.mod_name)
+    else:
+        mod_name = args.mod_name
+
+    if args.operation in ("avail", "av"):
+        mod_manager.print_available_mods()
+    elif args.operation in ("status", "stat"):
+        mod_manager.print_mods_status()
+    elif args.operation in ("list", "ls"):
+        mod_manager.print_mods_status(loaded_only=True)
+    elif args.operation in ("info", "show", "display"):
+        mod_manager.print_mods_info(mod_name)
+    elif args.operation in ("diagnose", "probe"):
+        mod_manager.diagnose_mods(mod_name)
+    elif args.operation in ("search",):
+        mod_manager.search_mods(mod_name)
+    elif args.operation in ("load", "add"):
+        mod_manager.load_mods(mod_name, force_no_auto=args.force_no_auto)
+    elif args.operation in ("unload", "remove", "rm", "delete", "del"):
+        mod_manager.unload_mods(mod_name, force_no_auto=args.force_no_auto)
+    elif args.operation in ("clean", "purge"):
+        mod_manager.unload_mods(mod_manager.get_mod_names(),
+                                force_no_auto=True)
+    elif args.operation in ("reload", "update"):
+        # -f reloads all the modules, e.g. to restore aliases in a subshell
+        mod_manager.reload(full=args.force_no_auto or None)
+    elif args.operation in ("batch",):
+        # PM_EVAL is set by the 'module' command of the init scripts and by
+        # the module server, whose output is evaluated by the shell, and the
+        # server cannot read the stdin of the client.
+        if os.environ.get("PM_EVAL"):
+            raise ModuleError(["batch is not supported by the 'module' "
+                               "command, run 'modcmd.py batch' instead"])
+        run_batch(mod_manager, mod_name, force_no_auto=args.force_no_auto,
+                  num_procs=args.jobs)
+    else:
+        print_stderr("Undefined operation %s" % args.operation)
+
+
+def complete_mod_names(prefix_index, args):
+    """
+    Print the names of modules beginning with given prefix, one per line, for
+    completion in the shell. The output is not meant to be evaluated.
+
+    :param prefix_index: instance of PrefixIndex
+    :param args: argparse.Namespace object returned by parse_args
+    :return: None
+    """
+    prefix = args.mod_name[0] if len(args.mod_name) != 0 else ""
+    mods_found = prefix_index.complete(prefix)
+    if len(mods_found) != 0:
+        sys.stdout.write("\n".join(mods_found) + "\n")
+
+
+def main(argv=None, mod_manager=None):
+    """
+    Entry of the 'module' command.
+
+    :param argv: list of strings, command-line parameters without the program
+                 name, defaults to sys.argv[1:]
+    :param mod_manager: instance of ModManager, loaded with load_mod_manager
+                        if not given
+    :return: None
+    """
+    args = parse_args(argv)
+    if args.operation == "complete":
+        if mod_manager is None:
+            prefix_index = load_prefix_index()
+        else:
+            prefix_index = mod_manager.get_name_index().prefixes
+        complete_mod_names(prefix_index, args)
+        return
+    # The trace is written to stderr or a file, never to stdout, even if the
+    # command exits on errors.
+    profiler.start(args.profile)
+    try:
+        with profiler.phase("load_mod_manager"):
+            if mod_manager is None and args.operation in LAZY_OPERATIONS:
+                mod_manager = load_mods_lazily(args.mod_name)
+            if mod_manager is None:
+                # The sanity is checked when the cache is rebuilt
+                mod_manager = load_mod_manager()
+        with profiler.phase("run_command"):
+            run_command(mod_manager, args)
+    except ModuleError as error:
+        for message in error.messages:
+            print_stderr("ERROR: %s" % message)
+        sys.exit(-1)
+    finally:
+        profiler.stop()
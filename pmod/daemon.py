@@ -0,0 +1,327 @@
+import sys
+import os
+import socket
+import json
+import stat
+from pmod.utilities import get_terminal_size
+
+
+# Maximum size of the data received in one call of socket.recv
+BUFFER_SIZE = 65536
+
+# Time in seconds the client waits for the server before giving up and
+# running the command in-process, e.g. if the server hangs
+CLIENT_TIMEOUT = 10.0
+
+
+def get_socket_file():
+    """
+    Get the UNIX socket file of the module server of current user.
+
+    The file is taken from PM_SOCKET if set. Otherwise it is located in a
+    directory named pmod-<uid> under $TMPDIR, or /tmp if TMPDIR is not set.
+
+    :return: string, path of the socket file
+    """
+    socket_file = os.environ.get("PM_SOCKET")
+    if not socket_file:
+        temp_dir = os.environ.get("TMPDIR", "/tmp")
+        socket_file = os.path.join(temp_dir, "pmod-%d" % os.getuid(),
+                                   "server.sock")
+    return socket_file
+
+
+def check_socket_dir(socket_file):
+    """
+    Check if the directory containing the socket file is owned by current
+    user and not writable by others. The output of the server is evaluated by
+    the shell, so sockets created by other users must never be trusted.
+
+    :param socket_file: string, path of the socket file
+    :return: True if the directory is safe, False otherwise
+    """
+    try:
+        dir_stat = os.stat(os.path.dirname(os.path.abspath(socket_file)))
+    except OSError:
+        return False
+    return (dir_stat.st_uid == os.getuid() and
+            not dir_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+
+def recv_all(conn):
+    """
+    Receive data from a connection until the peer shuts down writing.
+
+    :param conn: socket object
+    :return: bytes, the received data
+    """
+    chunks = []
+    while True:
+        chunk = conn.recv(BUFFER_SIZE)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def send_message(conn, message):
+    """
+    Send a message to the peer and shut down writing.
+
+    :param conn: socket object
+    :param message: dict, message to send, must be serializable by json
+    :return: None
+    """
+    conn.sendall(json.dumps(message).encode("utf-8"))
+    conn.shutdown(socket.SHUT_WR)
+
+
+def recv_message(conn):
+    """
+    Receive a message sent by send_message.
+
+    :param conn: socket object
+    :return: dict, the received message
+    """
+    return json.loads(recv_all(conn).decode("utf-8"))
+
+
+def request_server(message, socket_file=None, timeout=None):
+    """
+    Send a message to the module server and wait for the reply.
+
+    :param message: dict, message to send
+    :param socket_file: string, path of the socket file, see get_socket_file
+                        for the default value
+    :param timeout: float, timeout in seconds, None for blocking mode
+    :return: dict, reply from the server, or None if the server is not
+             available or the timeout expires
+    """
+    if socket_file is None:
+        socket_file = get_socket_file()
+    if not os.path.exists(socket_file) or not check_socket_dir(socket_file):
+        return None
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.settimeout(timeout)
+        conn.connect(socket_file)
+        send_message(conn, message)
+        return recv_message(conn)
+    except (socket.timeout, socket.error, ValueError):
+        return None
+    finally:
+        conn.close()
+
+
+def run_client(argv):
+    """
+    Delegate a 'module' command to the module server and write its output to
+    stdout and stderr.
+
+    :param argv: list of strings, command-line parameters of modcmd.py
+    :return: integer, exit status of the command, or None if the server is not
+             available or does not reply within CLIENT_TIMEOUT
+    """
+    # The server has no terminal, so the size of the terminal of the client
+    # is passed for rendering tables.
+    environ = dict(os.environ)
+    rows, columns = get_terminal_size()
+    environ.setdefault("LINES", str(rows))
+    environ.setdefault("COLUMNS", str(columns))
+    reply = request_server({"operation": "run", "argv": argv,
+                            "environ": environ}, timeout=CLIENT_TIMEOUT)
+    if reply is None:
+        return None
+    sys.stderr.write(reply["stderr"])
+    sys.stderr.flush()
+    sys.stdout.write(reply["stdout"])
+    sys.stdout.flush()
+    return reply["status"]
+
+
+class ModServer(object):
+    """
+    Class that keeps a ModManager instance in memory and answers the requests
+    from run_client over a UNIX socket.
+
+    Requests are handled one after another. Before each request the module
+    manager is reloaded if the modulefiles have been modified since it was
+    loaded. The environment of the client is installed to os.environ during
+    the request and the environment of the server is restored afterwards, and
+    the output written to stdout and stderr is sent back to the client.
+
+    self.setup_name is the dotted name of the setup module.
+
+    self.socket_file is the path of the socket file.
+
+    self.timeout is the idle time in seconds after which the server exits,
+    None for never.
+    """
+    def __init__(self, setup_name="modulefiles.setup", socket_file=None,
+                 timeout=None):
+        """
+        :param setup_name: string, dotted name of the setup module
+        :param socket_file: string, path of the socket file, see
+                            get_socket_file for the default value
+        :param timeout: float, idle time in seconds after which the server
+                        exits, None for never
+        """
+        from pmod.cache import ModCache
+        self.setup_name = setup_name
+        if socket_file is None:
+            socket_file = get_socket_file()
+        self.socket_file = socket_file
+        self.timeout = timeout
+        self.cache = ModCache(setup_name,
+                              persistent=not os.environ.get("PM_NO_CACHE"))
+        self.mod_manager = None
+        self.running = False
+
+    def get_mod_manager(self):
+        """
+        Get the module manager, reloading it if the modulefiles have been
+        modified.
+
+        :return: instance of ModManager
+        """
+        from pmod.cache import load_mod_manager
+        if self.mod_manager is None or not self.cache.is_fresh():
+            self.mod_manager = None
+            self.mod_manager = load_mod_manager(self.setup_name, self.cache)
+        return self.mod_manager
+
+    def run_command(self, argv, environ):
+        """
+        Run a 'module' command with given environment and capture its output.
+
+        :param argv: list of strings, command-line parameters of modcmd.py
+        :param environ: dict, environment of the client
+        :return: dict with keys "stdout", "stderr" and "status"
+        """
+        try:
+            from StringIO import StringIO
+        except ImportError:
+            from io import StringIO
+        import traceback
+        from pmod.cli import main
+
+        saved_environ = dict(os.environ)
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = StringIO(), StringIO()
+        status = 0
+        try:
+            # The module manager is loaded, and rebuilt if necessary, in the
+            # environment of the server rather than that of the client.
+            mod_manager = self.get_mod_manager()
+            os.environ.clear()
+            os.environ.update(environ)
+            # The output is sent back to be evaluated, see pmod.cli
+            os.environ["PM_EVAL"] = "1"
+            main(argv, mod_manager)
+        except SystemExit as exit_info:
+            if exit_info.code is None:
+                status = 0
+            elif isinstance(exit_info.code, int):
+                status = exit_info.code
+            else:
+                sys.stderr.write("%s\n" % exit_info.code)
+                status = 1
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+            status = 1
+        finally:
+            reply = {"stdout": sys.stdout.getvalue(),
+                     "stderr": sys.stderr.getvalue(),
+                     "status": status}
+            sys.stdout, sys.stderr = stdout, stderr
+            os.environ.clear()
+            os.environ.update(saved_environ)
+        return reply
+
+    def handle(self, conn):
+        """
+        Handle a request from the client.
+
+        :param conn: socket object, connection to the client
+        :return: None
+        """
+        message = recv_message(conn)
+        operation = message.get("operation")
+        if operation == "run":
+            reply = self.run_command(message["argv"], message["environ"])
+        elif operation == "ping":
+            reply = {"pid": os.getpid()}
+        elif operation == "shutdown":
+            reply = {"pid": os.getpid()}
+            self.running = False
+        else:
+            reply = {"error": "undefined operation %s" % operation}
+        send_message(conn, reply)
+
+    def bind(self):
+        """
+        Create the listening socket, removing stale socket files.
+
+        :return: socket object, or None if another server is running
+        """
+        socket_dir = os.path.dirname(os.path.abspath(self.socket_file))
+        if not os.path.isdir(socket_dir):
+            os.makedirs(socket_dir, 0o700)
+        if not check_socket_dir(self.socket_file):
+            raise OSError("unsafe directory for socket file %s" % socket_dir)
+        if os.path.exists(self.socket_file):
+            if request_server({"operation": "ping"}, self.socket_file,
+                              timeout=1.0) is not None:
+                return None
+            os.remove(self.socket_file)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_file)
+        server.listen(16)
+        return server
+
+    def serve_forever(self):
+        """
+        Answer requests until shut down or idle for longer than self.timeout.
+
+        :return: None
+        """
+        server = self.bind()
+        if server is None:
+            return
+        server.settimeout(self.timeout)
+        self.get_mod_manager()
+        self.running = True
+        try:
+            while self.running:
+                try:
+                    conn, address = server.accept()
+                except socket.timeout:
+                    break
+                try:
+                    conn.settimeout(None)
+                    self.handle(conn)
+                except (socket.error, ValueError):
+                    pass
+                finally:
+                    conn.close()
+        finally:
+            server.close()
+            if os.path.exists(self.socket_file):
+                os.remove(self.socket_file)
+
+
+def daemonize():
+    """
+    Detach current process from the terminal with the double-fork technique.
+
+    :return: None
+    """
+    if os.fork() > 0:
+        os._exit(0)
+    os.setsid()
+    if os.fork() > 0:
+        os._exit(0)
+    os.chdir("/")
+    null_fd = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(null_fd, fd)
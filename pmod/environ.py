@@ -0,0 +1,117 @@
+import os
+
+
+class EnvSnapshot(object):
+    """
+    Class that holds a read-only snapshot of environmental variables for
+    checking the status of modules.
+
+    self.environ is a copy of the environmental variables.
+
+    self.patterns caches the sets of patterns of environmental variables, i.e.
+    their values split by ":". Each variable is split only once, when it is
+    queried for the first time.
+    """
+    def __init__(self, environ=None):
+        """
+        :param environ: mapping of environmental variables, defaults to
+                        os.environ
+        """
+        if environ is None:
+            environ = os.environ
+        self.environ = dict(environ)
+        self.patterns = dict()
+
+    def get(self, env_name, default=None):
+        """
+        Get the value of an environmental variable.
+
+        :param env_name: string, name of the environmental variable
+        :param default: value to return if the variable is not set
+        :return: string, value of the environmental variable
+        """
+        return self.environ.get(env_name, default)
+
+    def get_patterns(self, env_name):
+        """
+        Get the set of patterns of an environmental variable.
+
+        :param env_name: string, name of the environmental variable
+        :return: frozenset of strings, empty if the variable is not set
+        """
+        patterns = self.patterns.get(env_name)
+        if patterns is None:
+            if env_name in self.environ:
+                patterns = frozenset(self.environ[env_name].split(":"))
+            else:
+                patterns = frozenset()
+            self.patterns[env_name] = patterns
+        return patterns
+
+    def has_pattern(self, env_name, pattern):
+        """
+        Check if pattern is included in an environmental variable.
+
+        :param env_name: string, name of the environmental variable
+        :param pattern: string, pattern to check
+        :return: True if pattern included, False otherwise
+        """
+        return pattern in self.get_patterns(env_name)
+
+
+class StatusIndex(object):
+    """
+    Class that maps the patterns of environmental variables to the modules
+    setting them, for finding the modules that are not unloaded without
+    checking the status of every available module.
+
+    A module is loaded or broken only if at least one of its environ items,
+    e.g. its entry in PM_LOADED_MODULES, is present in the environment. So the
+    candidates are found by looking up the patterns present in the
+    environment, and all the other modules are unloaded.
+
+    self.patterns maps the name of each environmental variable to a dict of
+    patterns and lists of names of modules.
+
+    self.custom_mods is the list of names of modules whose classes override
+    the check_status method. They are always checked.
+    """
+    def __init__(self, available_mods, base_class):
+        """
+        :param available_mods: dict of module names and instances of the
+                               'Module' class
+        :param base_class: the 'Module' class, for detecting overridden
+                           check_status methods
+        """
+        base_method = getattr(base_class.check_status, "__func__",
+                              base_class.check_status)
+        self.patterns = dict()
+        self.custom_mods = []
+        for mod_name, module in available_mods.items():
+            method = type(module).check_status
+            if getattr(method, "__func__", method) is not base_method:
+                self.custom_mods.append(mod_name)
+                continue
+            for environ_item in module.environ:
+                env_name, pattern = environ_item[1], environ_item[2]
+                env_patterns = self.patterns.setdefault(env_name, dict())
+                env_patterns.setdefault(pattern, []).append(mod_name)
+
+    def find_candidates(self, env_snapshot):
+        """
+        Find the modules that may be loaded or broken.
+
+        :param env_snapshot: instance of the EnvSnapshot class
+        :return: set of module names
+        """
+        candidates = set(self.custom_mods)
+        for env_name, env_patterns in self.patterns.items():
+            patterns = env_snapshot.get_patterns(env_name)
+            if len(patterns) < len(env_patterns):
+                for pattern in patterns:
+                    candidates.update(env_patterns.get(pattern, ()))
+            else:
+                for pattern, mod_names in env_patterns.items():
+                    if pattern in patterns:
+                        candidates.update(mod_names)
+        return candidates
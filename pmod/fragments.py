@@ -0,0 +1,352 @@
+import os
+import json
+import tempfile
+from pmod.modmanager import ModManager
+from pmod.module import Module
+from pmod.environ import EnvSnapshot, StatusIndex
+from pmod.names import NameIndex
+from pmod.cache import (find_module_file, check_stamp, load_mod_manager,
+                        ModCache)
+from pmod.capture import CommandCapture
+from pmod.utilities import get_class_path, import_class
+from pmod.profiler import profiler
+
+
+# Bump this number whenever the layout of the manifest changes.
+MANIFEST_VERSION = 3
+
+
+class FragmentSet(object):
+    """
+    Class that loads modules from a package of modulefile fragments.
+
+    Instead of defining all the modules in one setup module, the modules can
+    be split into fragments, e.g. one python module per package family, in
+    the "fragments" sub-package of the setup package. Each fragment defines a
+    function setup(mod_manager) that creates its modules with
+    mod_manager.create_mod. The setup module then loads all the fragments
+    with load_fragments.
+
+    A manifest, written to the cache directory next to the snapshot, maps
+    the names of modules and their names without versions to the fragments
+    defining them, each fragment to the fragments defining its dependencies
+    and conflicts, and the patterns of environmental variables to the fragments setting
+    them. With the manifest, only the fragments needed by given modules, the
+    modules that may be loaded or broken, and their dependency closure are
+    imported, see load_partial. The manifest records the stamps of the same
+    source files as the snapshot, i.e. the setup module, the modules it
+    imports from the setup package including the fragments, and the modules
+    defining the classes of the module manager and each module, and is
+    rebuilt automatically when any of them is modified.
+
+    self.package_name is the dotted name of the package of the fragments.
+
+    self.directory is the directory of the package.
+
+    self.manifest_file is the file where the manifest is stored. It is None
+    if the manifest is not to be persisted.
+    """
+    def __init__(self, package_name, directory, manifest_file=None):
+        """
+        :param package_name: string, dotted name of the package
+        :param directory: string, directory of the package
+        :param manifest_file: string, file where the manifest is stored
+        """
+        self.package_name = package_name
+        self.directory = directory
+        self.manifest_file = manifest_file
+
+    def get_fragment_names(self):
+        """
+        Get the names of all the fragments.
+
+        :return: sorted list of names of the python modules in the package
+        """
+        return sorted([file_name[:-3] for file_name
+                       in os.listdir(self.directory)
+                       if file_name.endswith(".py") and
+                       file_name != "__init__.py"])
+
+    def get_fragment_file(self, fragment):
+        """
+        Get the source file of a fragment.
+
+        :param fragment: string, name of the fragment
+        :return: string, absolute path of the source file
+        """
+        return os.path.join(self.directory, fragment + ".py")
+
+    def setup_fragments(self, mod_manager, fragments):
+        """
+        Import fragments and create their modules in a module manager.
+
+        :param mod_manager: instance of ModManager
+        :param fragments: list of names of fragments
+        :return: None
+        """
+        for fragment in fragments:
+            with profiler.phase("import_fragments"):
+                module = __import__("%s.%s" % (self.package_name, fragment),
+                                    fromlist=["setup"])
+            module.setup(mod_manager)
+
+    def read_manifest(self):
+        """
+        Read the manifest and check if it is up to date.
+
+        :return: dict, the manifest, or None if the manifest does not exist
+                 or is outdated
+        """
+        if self.manifest_file is None:
+            return None
+        try:
+            with open(self.manifest_file, "r") as in_file:
+                manifest = json.load(in_file)
+        except (IOError, OSError, ValueError):
+            return None
+        if manifest.get("version") != MANIFEST_VERSION:
+            return None
+        if sorted(manifest["fragments"].keys()) != self.get_fragment_names():
+            return None
+        for stamp in manifest["stamps"]:
+            if not check_stamp(tuple(stamp)):
+                return None
+        return manifest
+
+    def write_manifest(self, stamps, manager_class=ModManager):
+        """
+        Build the manifest by creating the modules of each fragment in a
+        separate module manager, and write it to self.manifest_file.
+
+        The sanity of the modules is not checked here, so the manifest should
+        be written only after the full module manager has passed
+        check_sanity. Failures in writing the manifest are silently ignored,
+        and the temporary file is removed.
+
+        :param stamps: list of stamps of the source files of the full module
+                       manager, i.e. ModCache.stamps
+        :param manager_class: class of the module manager
+        :return: dict, the manifest
+        """
+        fragments = dict()
+        names = dict()
+        depend = dict()
+        conflict = dict()
+        patterns = dict()
+        custom = []
+        for fragment in self.get_fragment_names():
+            mod_manager = manager_class()
+            self.setup_fragments(mod_manager, [fragment])
+            mod_names = sorted(mod_manager.get_mod_names())
+            name_index = NameIndex(mod_names)
+            for name in set(name_index.exact).union(name_index.versions):
+                names.setdefault(name, []).append(fragment)
+            depend[fragment] = set()
+            conflict[fragment] = set()
+            for module in mod_manager.available_mods.values():
+                depend[fragment].update(module.depend)
+                conflict[fragment].update(module.conflict)
+            status_index = StatusIndex(mod_manager.available_mods, Module)
+            for env_name, env_patterns in status_index.patterns.items():
+                fragment_patterns = patterns.setdefault(env_name, dict())
+                for pattern in env_patterns:
+                    fragment_patterns.setdefault(pattern, []).append(fragment)
+            if len(status_index.custom_mods) != 0:
+                custom.append(fragment)
+            fragments[fragment] = {"modules": mod_names}
+        # Translate the names of dependencies and conflicts into the fragments
+        # defining them
+        for fragment, entry in fragments.items():
+            for key, mod_names in (("depend", depend[fragment]),
+                                   ("conflict", conflict[fragment])):
+                key_fragments = set()
+                for mod_name in mod_names:
+                    key_fragments.update(names.get(mod_name.lower(), []))
+                key_fragments.discard(fragment)
+                entry[key] = sorted(key_fragments)
+        manifest = {"version": MANIFEST_VERSION,
+                    "manager_class": get_class_path(manager_class),
+                    "stamps": [list(stamp) for stamp in stamps],
+                    "fragments": fragments, "names": names,
+                    "patterns": patterns, "custom": custom}
+        if self.manifest_file is None:
+            return manifest
+        manifest_dir = os.path.dirname(self.manifest_file)
+        temp_file = None
+        try:
+            if not os.path.isdir(manifest_dir):
+                os.makedirs(manifest_dir)
+            fd, temp_file = tempfile.mkstemp(dir=manifest_dir)
+            with os.fdopen(fd, "w") as out_file:
+                json.dump(manifest, out_file, sort_keys=True)
+            os.rename(temp_file, self.manifest_file)
+            temp_file = None
+        except (IOError, OSError):
+            pass
+        finally:
+            if temp_file is not None:
+                try:
+                    os.remove(temp_file)
+                except OSError:
+                    pass
+        return manifest
+
+    def get_active_fragments(self, manifest, environ):
+        """
+        Get the fragments defining the modules that may be loaded or broken,
+        i.e. the fragments setting any pattern present in the environment, and
+        those with modules checking their status by themselves, as found by
+        StatusIndex for the full module manager.
+
+        :param manifest: dict returned by read_manifest
+        :param environ: mapping of environmental variables
+        :return: set of names of fragments
+        """
+        env_snapshot = EnvSnapshot(environ)
+        fragments = set(manifest["custom"])
+        for env_name, env_patterns in manifest["patterns"].items():
+            for pattern in env_snapshot.get_patterns(env_name):
+                fragments.update(env_patterns.get(pattern, ()))
+        return fragments
+
+    def get_closure(self, manifest, mod_names, fragments=()):
+        """
+        Get the fragments defining given modules and their dependencies.
+        The fragments defining their conflicts are included as well, for
+        checking the status of the conflicting modules.
+
+        :param manifest: dict returned by read_manifest
+        :param mod_names: list of names of modules, which may omit version
+                          numbers and are case-insensitive
+        :param fragments: names of fragments to include with their
+                          dependencies
+        :return: sorted list of names of fragments, or None if any of the
+                 modules is not found in the manifest
+        """
+        stack = list(fragments)
+        for mod_name in mod_names:
+            name_fragments = manifest["names"].get(mod_name.lower())
+            if name_fragments is None:
+                return None
+            stack.extend(name_fragments)
+            for fragment in name_fragments:
+                stack.extend(manifest["fragments"][fragment]["conflict"])
+        closure = set()
+        while len(stack) != 0:
+            fragment = stack.pop()
+            if fragment not in closure:
+                closure.add(fragment)
+                stack.extend(manifest["fragments"][fragment]["depend"])
+        return sorted(closure)
+
+    def load_partial(self, manifest, mod_names, environ=None,
+                     capture=None):
+        """
+        Create a module manager with only the fragments needed by given
+        modules.
+
+        :param manifest: dict returned by read_manifest
+        :param mod_names: list of names of modules given by the user
+        :param environ: mapping of environmental variables, defaults to
+                        os.environ. The fragments of the modules that may be
+                        loaded or broken in it are included, for detecting
+                        conflicts, dependent modules and broken modules.
+        :param capture: instance of CommandCapture to capture the commands of
+                        the modules, None for not capturing
+        :return: instance of ModManager, or None if any of mod_names is not
+                 found
+        """
+        if environ is None:
+            environ = os.environ
+        fragments = self.get_closure(
+            manifest, mod_names, self.get_active_fragments(manifest, environ))
+        if fragments is None:
+            return None
+        mod_manager = import_class(manifest["manager_class"])()
+        self.setup_fragments(mod_manager, fragments)
+        if capture is not None:
+            capture.apply(mod_manager)
+        # The sanity has been checked for all the fragments before the
+        # manifest was written.
+        mod_manager.sanity_checked = True
+        return mod_manager
+
+
+def find_fragments(setup_name="modulefiles.setup", manifest_file=None):
+    """
+    Find the package of fragments next to the setup module.
+
+    :param setup_name: string, dotted name of the setup module
+    :param manifest_file: string, file where the manifest is stored
+    :return: instance of FragmentSet, or None if there is no package named
+             "fragments" in the setup package
+    """
+    setup_package = setup_name.rpartition(".")[0]
+    if setup_package == "":
+        package_name = "fragments"
+    else:
+        package_name = setup_package + ".fragments"
+    init_file = find_module_file(package_name)
+    if init_file is None or os.path.basename(init_file) != "__init__.py":
+        return None
+    return FragmentSet(package_name, os.path.dirname(init_file),
+                       manifest_file)
+
+
+def load_fragments(package_name, mod_manager=None):
+    """
+    Create the modules of all the fragments in a package. This function is
+    meant to be called in the setup module, e.g.
+
+        mod_manager = load_fragments("modulefiles.fragments")
+
+    :param package_name: string, dotted name of the package of fragments
+    :param mod_manager: instance of ModManager to create the modules in, a
+                        new one is created if not given
+    :return: instance of ModManager
+    """
+    if mod_manager is None:
+        mod_manager = ModManager()
+    init_file = find_module_file(package_name)
+    fragment_set = FragmentSet(package_name, os.path.dirname(init_file))
+    fragment_set.setup_fragments(mod_manager,
+                                 fragment_set.get_fragment_names())
+    return mod_manager
+
+
+def load_mods_lazily(mod_names, setup_name="modulefiles.setup",
+                     environ=None):
+    """
+    Get a module manager with the modules needed by given modules and the
+    modules that may be loaded or broken, importing only the fragments
+    defining them.
+
+    The manifest is stored in the cache directory next to the snapshot. If it
+    is outdated, the full module manager is loaded with load_mod_manager,
+    which checks the sanity, and the manifest is rebuilt.
+
+    :param mod_names: list of names of modules given by the user
+    :param setup_name: string, dotted name of the setup module
+    :param environ: mapping of environmental variables to check the status
+                    of modules in, defaults to os.environ
+    :return: instance of ModManager, or None if the setup package has no
+             fragments, the cache is disabled or some modules are not found
+             in the manifest
+    """
+    cache = ModCache(setup_name, persistent=not os.environ.get("PM_NO_CACHE"))
+    if cache.cache_file is None:
+        return None
+    fragment_set = find_fragments(setup_name,
+                                  cache.cache_file[:-4] + ".manifest.json")
+    if fragment_set is None:
+        return None
+    manifest = fragment_set.read_manifest()
+    if manifest is None:
+        mod_manager = load_mod_manager(setup_name, cache)
+        if cache.stamps is not None:
+            fragment_set.write_manifest(cache.stamps, type(mod_manager))
+        return mod_manager
+    capture = None
+    if cache.capture:
+        capture = CommandCapture(cache.capture_file)
+    return fragment_set.load_partial(manifest, mod_names, environ, capture)
@@ -0,0 +1,231 @@
+def find_cycle(nodes, successors):
+    """
+    Find a cycle in a directed graph in which every node has at least one
+    successor, e.g. the nodes left unsorted by Kahn's algorithm when following
+    the edges backwards.
+
+    :param nodes: set of nodes in the graph
+    :param successors: dict of nodes and lists of their successors, successors
+                       out of nodes are ignored
+    :return: list of nodes along the cycle, with the first node repeated at
+             the end
+    """
+    path = []
+    position = dict()
+    node = min(nodes)
+    while node not in position:
+        position[node] = len(path)
+        path.append(node)
+        node = min([succ for succ in successors[node] if succ in nodes])
+    return path[position[node]:] + [node]
+
+
+class DependGraph(object):
+    """
+    Class that indexes the transitive dependencies and conflicts of modules.
+
+    The index is built once from the available modules of a ModManager
+    instance, so that querying the dependencies and conflicting modules of a
+    module becomes a dictionary lookup instead of a traversal of the
+    dependency tree.
+
+    self.depend and self.conflict map the name of each module to the tuples of
+    its direct dependencies and conflicting modules, respectively.
+
+    self.components is the list of strongly connected components of the
+    dependency graph, each being a list of module names. The components are in
+    reverse topological order, i.e. each component comes after all the
+    components it depends on. self.component_id maps the name of each module
+    to the index of its component in self.components.
+
+    self.closure maps the name of a module to a frozenset of the names of this
+    module and all its dependencies, direct or indirect. self.conflicts maps
+    the name of a module to a frozenset of the names of the conflicting
+    modules of all the modules in its closure. Both of them are filled on
+    demand by get_mod_closure and are not pickled, as they may grow
+    quadratically with the number of modules. Cyclic dependencies are allowed,
+    in which case all the modules in the cycle share the same closure.
+
+    self.orders maps frozensets of module names to the tuples of the names
+    sorted by ModManager.sort_mods, so that the same set of modules is sorted
+    only once, e.g. when resolving many module sets in a batch. It is not
+    pickled either.
+
+    Undefined dependencies are treated as modules without dependencies or
+    conflicting modules.
+    """
+    def __init__(self, available_mods):
+        """
+        :param available_mods: dict of module names and instances of the
+                               'Module' class
+        """
+        self.depend = dict()
+        self.conflict = dict()
+        for mod_name, module in available_mods.items():
+            self.depend[mod_name] = tuple(module.depend)
+            self.conflict[mod_name] = tuple(module.conflict)
+        self.components = self.find_components()
+        self.component_id = dict()
+        for i, component in enumerate(self.components):
+            for mod_name in component:
+                self.component_id[mod_name] = i
+        self.closure = dict()
+        self.conflicts = dict()
+        self.orders = dict()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["closure"] = dict()
+        state["conflicts"] = dict()
+        state["orders"] = dict()
+        return state
+
+    def get_children(self, mod_name):
+        """
+        Get the direct dependencies of a module.
+
+        :param mod_name: string, name of the module
+        :return: tuple of the names of direct dependencies
+        """
+        return self.depend.get(mod_name, ())
+
+    def find_components(self):
+        """
+        Find the strongly connected components of the dependency graph with
+        an iterative version of Tarjan's algorithm, which takes O(V+E) time.
+
+        :return: list of components in reverse topological order
+        """
+        index = dict()
+        low_link = dict()
+        on_stack = set()
+        stack = []
+        components = []
+        counter = 0
+        for root in sorted(self.depend.keys()):
+            if root in index:
+                continue
+            index[root] = low_link[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self.get_children(root)))]
+            while work:
+                node, children = work[-1]
+                for child in children:
+                    if child not in index:
+                        index[child] = low_link[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(self.get_children(child))))
+                        break
+                    elif child in on_stack:
+                        low_link[node] = min(low_link[node], index[child])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low_link[parent] = min(low_link[parent],
+                                               low_link[node])
+                    if low_link[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.remove(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(component)
+        return components
+
+    def get_successors(self, component_id):
+        """
+        Get the components that a component depends on directly.
+
+        :param component_id: integer, index of the component
+        :return: set of indices of components
+        """
+        successors = set()
+        for mod_name in self.components[component_id]:
+            for child in self.get_children(mod_name):
+                successors.add(self.component_id[child])
+        successors.discard(component_id)
+        return successors
+
+    def get_mod_closure(self, mod_name):
+        """
+        Get the closure of a module, building the closures of all the
+        components it depends on if necessary.
+
+        :param mod_name: string, name of the module
+        :return: frozenset of module names
+        """
+        closure = self.closure.get(mod_name)
+        if closure is not None:
+            return closure
+
+        # Post-order traversal of the condensed graph
+        stack = [self.component_id[mod_name]]
+        while stack:
+            component_id = stack[-1]
+            component = self.components[component_id]
+            if component[0] in self.closure:
+                stack.pop()
+                continue
+            successors = self.get_successors(component_id)
+            pending = [i for i in successors
+                       if self.components[i][0] not in self.closure]
+            if len(pending) != 0:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            closure = set(component)
+            for i in successors:
+                closure.update(self.closure[self.components[i][0]])
+            closure = frozenset(closure)
+            conflicts = set()
+            for member in closure:
+                conflicts.update(self.conflict.get(member, ()))
+            conflicts = frozenset(conflicts)
+            for member in component:
+                self.closure[member] = closure
+                self.conflicts[member] = conflicts
+        return self.closure[mod_name]
+
+    def get_mod_conflicts(self, mod_name):
+        """
+        Get the conflicting modules of all the modules in the closure of a
+        module.
+
+        :param mod_name: string, name of the module
+        :return: frozenset of module names
+        """
+        if mod_name not in self.conflicts:
+            self.get_mod_closure(mod_name)
+        return self.conflicts[mod_name]
+
+    def get_closure(self, mod_list):
+        """
+        Get the union of the closures of given modules.
+
+        :param mod_list: list of module names
+        :return: set of module names
+        """
+        closure = set()
+        for mod_name in mod_list:
+            if mod_name not in closure:
+                closure.update(self.get_mod_closure(mod_name))
+        return closure
+
+    def get_conflicts(self, mod_list):
+        """
+        Get the union of the aggregated conflicts of given modules.
+
+        :param mod_list: list of module names
+        :return: set of module names
+        """
+        conflicts = set()
+        for mod_name in mod_list:
+            conflicts.update(self.get_mod_conflicts(mod_name))
+        return conflicts
@@ -1,19 +1,68 @@
 import sys
 import os
 import re
-from pmod.utilities import (print_stderr, print_banner, get_terminal_size,
-                            print_table, print_list, get_latest_version)
-from pmod.module import Module
+from pmod.utilities import (print_stderr, print_json, get_terminal_size,
+                            format_banner, format_table, print_table,
+                            print_list)
+from pmod.module import Module, FINGERPRINT_VAR
 from pmod.sandbox import SandBox
+from pmod.environ import EnvSnapshot, StatusIndex
+from pmod.graph import DependGraph, find_cycle
+from pmod.names import NameIndex
+
+
+class ModuleError(Exception):
+    """
+    Exception raised when a list of modules cannot be resolved, e.g. due to
+    paradoxes, so that callers of the API are not terminated. The 'module'
+    command prints the messages and exits.
+
+    self.messages is the list of error messages, one per problem.
+    """
+    def __init__(self, messages):
+        """
+        :param messages: list of strings, error messages
+        """
+        Exception.__init__(self, "; ".join(messages))
+        self.messages = messages
 
 
 class ModManager(object):
     """
     The Module Manager class that receives the user's commands and perform
     specified operations.
+
+    self.available_mods is a dictionary of module names and instances of the
+    'Module' class.
+
+    self.graph is the index of dependencies and conflicting modules built from
+    self.available_mods on demand, see get_graph. It is invalidated by
+    create_mod and add_mod.
+
+    self.status_index maps the patterns of environmental variables to the
+    modules setting them, built on demand by get_status_index. It is
+    invalidated by create_mod and add_mod.
+
+    self.name_index indexes the names of modules for resolving the names
+    given by the user, built on demand by get_name_index. It is invalidated by
+    create_mod and add_mod.
+
+    self.sanity_checked indicates whether self.available_mods has passed
+    check_sanity.
+
+    self.shell is the type of the shell that evaluates the output of
+    load_mods, unload_mods and reload, set by the command-line interface. See
+    pmod.shells.EMITTERS for supported shells. If it is "json", the reports
+    of print_available_mods, print_mods_status and print_mods_info are
+    printed to stdout in JSON format instead of tables to stderr.
     """
     def __init__(self):
         self.available_mods = dict()
+        self.graph = None
+        self.status_index = None
+        self.name_index = None
+        self.sanity_checked = False
+        self.shell = "bash"
 
     def create_mod(self, mod_name, mod_class=Module, **kwargs):
         """
@@ -27,9 +76,13 @@ class ModManager(object):
         :return: None
         """
         if mod_name not in self.available_mods.keys():
-            self.available_mods[mod_name] = mod_class(mod_name, **kwargs)
+            module = mod_class(mod_name, **kwargs)
+            self.available_mods[module.mod_name] = module
         else:
-            self.available_mods[mod_name].add_settings(**kwargs)
+            module = self.available_mods[mod_name]
+            module.add_settings(**kwargs)
+        module.freeze()
+        self.invalidate()
 
     def add_mod(self, module):
         """
@@ -38,38 +91,154 @@ class ModManager(object):
         :param module: instance of the 'Module' class and all derived classes
         :return: None
         """
+        module.freeze()
         self.available_mods[module.mod_name] = module
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Discard the indices and the result of check_sanity. This method is
+        called by create_mod and add_mod, and should be called if
+        self.available_mods or the modules are modified otherwise.
+
+        :return: None
+        """
+        self.graph = None
+        self.status_index = None
+        self.name_index = None
+        self.sanity_checked = False
+
+    def get_graph(self):
+        """
+        Get the index of dependencies and conflicting modules, building it if
+        necessary.
+
+        :return: instance of DependGraph
+        """
+        if self.graph is None:
+            self.graph = DependGraph(self.available_mods)
+        return self.graph
+
+    def get_status_index(self):
+        """
+        Get the index of patterns of environmental variables, building it if
+        necessary.
+
+        :return: instance of StatusIndex
+        """
+        if self.status_index is None:
+            self.status_index = StatusIndex(self.available_mods, Module)
+        return self.status_index
+
+    def get_name_index(self):
+        """
+        Get the index of module names, building it if necessary.
+
+        :return: instance of NameIndex
+        """
+        if self.name_index is None:
+            self.name_index = NameIndex(self.available_mods.keys())
+        return self.name_index
+
+    def get_mods_status(self, env_snapshot):
+        """
+        Get the loaded and broken modules.
+
+        Only the candidates found by the status index, i.e. modules with at
+        least one environ item present in the environment, are checked, so the
+        cost depends on the number of loaded modules rather than the number of
+        available modules. All the other modules are unloaded.
+
+        :param env_snapshot: instance of the EnvSnapshot class
+        :return: lists of the names of loaded and broken modules
+        """
+        mods_loaded = []
+        mods_broken = []
+        candidates = self.get_status_index().find_candidates(env_snapshot)
+        for mod_name in candidates:
+            status = self.available_mods[mod_name].check_status(env_snapshot)
+            if status == 1:
+                mods_loaded.append(mod_name)
+            elif status == 0:
+                mods_broken.append(mod_name)
+        return mods_loaded, mods_broken
 
     def check_sanity(self):
         """
         Check the sanity of modules defined in self.available_mods.
 
+        The following errors are detected in one pass over the dependency
+        graph and reported all at once, after which the program exits:
+
+        1. Undefined operations in environ settings.
+        2. Undefined dependencies and conflicting modules.
+        3. Cyclic dependencies, found as the strongly connected components of
+           the dependency graph.
+        4. Paradoxes, i.e. modules whose dependencies include conflicting
+           modules of themselves or of other dependencies. Only the modules
+           that introduce the paradoxes are reported, not the modules
+           inheriting them from their dependencies.
+
+        The result is remembered in self.sanity_checked, so the check is
+        skipped if nothing has changed since the last time. It is persisted
+        together with the module database by ModCache.
+
         :return: None
         """
-        for mod_name, module in self.available_mods.items():
+        if self.sanity_checked:
+            return
+        errors = []
+        for mod_name in sorted(self.available_mods.keys()):
+            module = self.available_mods[mod_name]
+
             # Check for illegal environ settings
-            module.check_environ()
+            for environ_item in module.environ:
+                if environ_item[0] not in ("append", "prepend", "reset"):
+                    errors.append("module %s has undefined operation %s"
+                                  % (mod_name, environ_item[0]))
 
             # Check for unresolved dependencies
             for depend_item in module.depend:
                 if depend_item not in self.available_mods.keys():
-                    print_stderr("ERROR: module %s has undefined dependency %s"
-                                 % (mod_name, depend_item))
-                    sys.exit(-1)
+                    errors.append("module %s has undefined dependency %s"
+                                  % (mod_name, depend_item))
 
             # Check for unresolved conflicting modules
             for conflict_item in module.conflict:
                 if conflict_item not in self.available_mods.keys():
-                    print_stderr("ERROR: module %s has undefined conflicting"
-                              " module %s" % (mod_name, conflict_item))
-                    sys.exit(-1)
+                    errors.append("module %s has undefined conflicting module"
+                                  " %s" % (mod_name, conflict_item))
+
+        # Check for cyclic dependencies
+        graph = self.get_graph()
+        for component in graph.components:
+            mod_name = component[0]
+            if len(component) > 1 or mod_name in graph.get_children(mod_name):
+                cycle = find_cycle(set(component), graph.depend)
+                errors.append("modules %s have cyclic dependencies"
+                              % " -> ".join(cycle))
+
+        # Check for paradoxes
+        paradoxes = dict()
+        for component in graph.components:
+            for mod_name in component:
+                closure = graph.get_mod_closure(mod_name)
+                paradoxes[mod_name] = closure.intersection(
+                    graph.get_mod_conflicts(mod_name))
+        for mod_name in sorted(self.available_mods.keys()):
+            mods_paradox = set(paradoxes[mod_name])
+            for depend_item in graph.get_children(mod_name):
+                mods_paradox.difference_update(paradoxes[depend_item])
+            if len(mods_paradox) != 0:
+                errors.append("module %s requires %s as both dependency and "
+                              "conflicting module" % (mod_name,
+                              ", ".join(sorted(mods_paradox))))
 
-            # Check for cyclic dependencies
-            if mod_name in self.build_dependencies([mod_name],
-                                                   include_roots=False):
-                print_stderr("ERROR: module %s has cyclic dependencies"
-                             % mod_name)
-                sys.exit(-1)
+        if len(errors) != 0:
+            for error in errors:
+                print_stderr("ERROR: %s" % error)
+            sys.exit(-1)
+        self.sanity_checked = True
 
     def verify_mod_names(self, mod_list):
         """
@@ -79,40 +248,29 @@ class ModManager(object):
         appended to it. If no matching module is found, then it is removed from
         mod_list and a warning message is casted.
 
+        Module names are case-insensitive and resolved with the name index.
+
         :param mod_list: list of the names of modules
         :return: list of the names of defined modules
         """
+        name_index = self.get_name_index()
         mods_defined = []
         for mod_name in mod_list:
-            # Search for all possible versions
-            mods_found = []
-            for mod_avail in self.available_mods.keys():
-                if re.search(r"%s[-/]+[0-9\.]+.?" % mod_name, mod_avail,
-                            re.IGNORECASE):
-                    mods_found.append(mod_avail)
-
             # Get the latest version. If no version is found, then search for
             # the module name directly.
-            if len(mods_found) != 0:
-                mods_defined.append(get_latest_version(mods_found))
+            latest_version = name_index.get_latest(mod_name)
+            if latest_version is not None:
+                mods_defined.append(latest_version)
             else:
-                # Get all possible candidates
-                for mod_avail in self.available_mods.keys():
-                    if re.search(r"%s" % mod_name, mod_avail, re.IGNORECASE):
-                        mods_found.append(mod_avail)
-
-                # Check if the candidates match the module name exactly
-                status_match = False
-                for mod_found in mods_found:
-                    if mod_name.lower() == mod_found.lower():
-                        mods_defined.append(mod_found)
-                        status_match = True
-
-                # If no matching items found, echo suggestions to the user
-                if not status_match:
+                mods_found = name_index.get_exact(mod_name)
+                if len(mods_found) != 0:
+                    mods_defined.extend(mods_found)
+                else:
+                    # If no matching items found, echo suggestions to the user
                     print_stderr("WARNING: undefined module %s skipped"
                                  % mod_name)
-                    print_list("Suggestions", mods_found, number_items=False)
+                    print_list("Suggestions", name_index.search(mod_name),
+                               number_items=False)
 
         return mods_defined
 
@@ -132,18 +290,15 @@ class ModManager(object):
         :param include_roots: boolean, whether to include root mods in results
         :return: set of the names of all the dependencies
         """
+        graph = self.get_graph()
         if include_roots:
-            dependencies = [mod_name for mod_name in root_mods]
+            return graph.get_closure(root_mods)
         else:
-            dependencies = []
+            dependencies = set()
             for mod_name in root_mods:
-                dependencies.extend(self.available_mods[mod_name].depend)
-        for mod_name in dependencies:
-            module = self.available_mods[mod_name]
-            for depend_item in module.depend:
-                if depend_item not in dependencies:
-                    dependencies.append(depend_item)
-        return set(dependencies)
+                dependencies.update(graph.get_closure(
+                    self.available_mods[mod_name].depend))
+            return dependencies
 
     def build_conflicts(self, mod_list):
         """
@@ -162,29 +317,67 @@ class ModManager(object):
         """
         Sort modules according to their depth in the dependency tree.
 
+        The depth of a module is the length of the longest chain of
+        dependencies leading to it from modules in mod_list that are not
+        required by others in mod_list. It is evaluated with Kahn's algorithm
+        in O(V+E) time, where V and E are the numbers of modules in mod_list
+        and dependencies among them. Modules with the same depth are sorted by
+        name so that the order is deterministic. ModuleError is raised if
+        cyclic dependencies are detected. The results are memoized in the
+        orders of the dependency graph.
+
         :param mod_list: list of modules to sort
         :return: sorted list with depth in decreasing order
-        """
-        # Build the dependency tree
-        # It is assumed that the modules have been checked for cyclic
-        # dependencies. Otherwise the loop will be INFINITE.
-        depend_tree = [[mod_name, 0] for mod_name in mod_list]
-        depth = 0
-        status_updated = True
-        while status_updated:
-            status_updated = False
-            nodes_to_check = [node for node in depend_tree if node[1] == depth]
-            for parent in nodes_to_check:
-                for child in depend_tree:
-                    if child[0] in self.available_mods[parent[0]].depend:
-                        child[1] += 1
-                        status_updated = True
-            depth += 1
+        :raises ModuleError: if there are cyclic dependencies
+        """
+        graph = self.get_graph()
+        mod_set = frozenset(mod_list)
+        order = graph.orders.get(mod_set)
+        if order is not None:
+            return list(order)
+
+        # Build the dependency tree restricted to mod_list
+        children = dict()
+        num_parents = dict([(mod_name, 0) for mod_name in mod_set])
+        for mod_name in mod_set:
+            children[mod_name] = [depend_item for depend_item
+                                  in set(self.available_mods[mod_name].depend)
+                                  if depend_item in mod_set]
+            for depend_item in children[mod_name]:
+                num_parents[depend_item] += 1
+
+        # Evaluate the depths starting from the roots
+        depth = dict([(mod_name, 0) for mod_name in mod_set])
+        nodes_to_check = sorted([mod_name for mod_name in mod_set
+                                 if num_parents[mod_name] == 0])
+        num_checked = 0
+        while num_checked < len(nodes_to_check):
+            parent = nodes_to_check[num_checked]
+            num_checked += 1
+            for child in children[parent]:
+                depth[child] = max(depth[child], depth[parent] + 1)
+                num_parents[child] -= 1
+                if num_parents[child] == 0:
+                    nodes_to_check.append(child)
+
+        # Modules never checked are in or behind cycles, each of them having
+        # at least one parent never checked.
+        if num_checked != len(mod_set):
+            mods_remain = set([mod_name for mod_name in mod_set
+                               if num_parents[mod_name] != 0])
+            parents = dict([(mod_name, []) for mod_name in mods_remain])
+            for mod_name in mods_remain:
+                for depend_item in children[mod_name]:
+                    parents[depend_item].append(mod_name)
+            cycle = find_cycle(mods_remain, parents)
+            cycle.reverse()
+            raise ModuleError(["cyclic dependencies detected: %s"
+                               % " -> ".join(cycle)])
 
         # Sort the nodes according to their depth in dependency tree
-        sorted_tree = sorted(depend_tree, key=lambda x: x[1], reverse=True)
-        sorted_mods = [node[0] for node in sorted_tree]
-        return sorted_mods
+        order = sorted(mod_set, key=lambda x: (-depth[x], x))
+        graph.orders[mod_set] = tuple(order)
+        return order
 
     def auto_adjust_load(self, mods_to_unload, mods_to_load, mods_loaded):
         """
@@ -204,6 +397,7 @@ class ModManager(object):
         """
         # Get the list of loaded modules that have to be checked for
         # usability.
+        graph = self.get_graph()
         mods_loaded = set(mods_loaded)
         mods_loaded_copy = mods_loaded.copy()
         mods_loaded_copy = mods_loaded_copy.difference(mods_to_unload)
@@ -213,10 +407,10 @@ class ModManager(object):
         # Check for unusable modules.
         mods_check_copy = mods_check.copy()
         for loaded_mod in mods_check:
-            dependencies = self.build_dependencies([loaded_mod])
-            conflicts = self.build_conflicts(dependencies)
-            if (len(dependencies.intersection(mods_to_unload)) != 0 or
-                len(conflicts.intersection(mods_to_load)) != 0):
+            dependencies = graph.get_mod_closure(loaded_mod)
+            conflicts = graph.get_mod_conflicts(loaded_mod)
+            if (not dependencies.isdisjoint(mods_to_unload) or
+                not conflicts.isdisjoint(mods_to_load)):
                 mods_to_unload.append(loaded_mod)
                 mods_check_copy.remove(loaded_mod)
         mods_check = mods_check_copy
@@ -224,11 +418,11 @@ class ModManager(object):
         # Check for modules that have to be reloaded.
         mods_to_reload = []
         for loaded_mod in mods_check:
-            dependencies = self.build_dependencies([loaded_mod])
-            conflicts = self.build_conflicts(dependencies)
-            if (len(dependencies.intersection(mods_to_load)) != 0 or
-                len(dependencies.intersection(mods_to_reload)) != 0 or
-                len(conflicts.intersection(mods_to_unload)) != 0):
+            dependencies = graph.get_mod_closure(loaded_mod)
+            conflicts = graph.get_mod_conflicts(loaded_mod)
+            if (not dependencies.isdisjoint(mods_to_load) or
+                not dependencies.isdisjoint(mods_to_reload) or
+                not conflicts.isdisjoint(mods_to_unload)):
                 mods_to_reload.append(loaded_mod)
         mods_to_unload.extend(mods_to_reload)
         mods_to_load.extend(mods_to_reload)
@@ -255,28 +449,22 @@ class ModManager(object):
         :return: adjusted mods_to_unload and mods_to_load
         """
         # Get the loaded modules to be checked for usability.
+        graph = self.get_graph()
         mods_loaded = set(mods_loaded)
         mods_check = mods_loaded.difference(mods_to_unload)
 
         # Check for modules in mods_to_unload that are still required by
         # modules in mods_check.
-        mods_in_use = set()
-        for mod_name in mods_to_unload:
-            in_use = False
-            for loaded_mod in mods_check:
-                if mod_name in self.build_dependencies([loaded_mod]):
-                    in_use = True
-            if in_use:
-                mods_in_use.add(mod_name)
+        mods_in_use = graph.get_closure(mods_check)
         mods_to_unload = list(set(mods_to_unload).difference(mods_in_use))
 
         # Check for unusable modules.
         mods_check_copy = mods_check.copy()
         for loaded_mod in mods_check:
-            dependencies = self.build_dependencies([loaded_mod])
-            conflicts = self.build_conflicts(dependencies)
-            if (len(dependencies.intersection(mods_to_unload)) != 0 or
-                len(conflicts.intersection(mods_to_load)) != 0):
+            dependencies = graph.get_mod_closure(loaded_mod)
+            conflicts = graph.get_mod_conflicts(loaded_mod)
+            if (not dependencies.isdisjoint(mods_to_unload) or
+                not conflicts.isdisjoint(mods_to_load)):
                 mods_to_unload.append(loaded_mod)
                 mods_check_copy.remove(loaded_mod)
         mods_check = mods_check_copy
@@ -284,11 +472,11 @@ class ModManager(object):
         # Check for modules that have to be reloaded.
         mods_to_reload = []
         for loaded_mod in mods_check:
-            dependencies = self.build_dependencies([loaded_mod])
-            conflicts = self.build_conflicts(dependencies)
-            if (len(dependencies.intersection(mods_to_load)) != 0 or
-                len(dependencies.intersection(mods_to_reload)) != 0 or
-                len(conflicts.intersection(mods_to_unload)) != 0):
+            dependencies = graph.get_mod_closure(loaded_mod)
+            conflicts = graph.get_mod_conflicts(loaded_mod)
+            if (not dependencies.isdisjoint(mods_to_load) or
+                not dependencies.isdisjoint(mods_to_reload) or
+                not conflicts.isdisjoint(mods_to_unload)):
                 mods_to_reload.append(loaded_mod)
         mods_to_unload.extend(mods_to_reload)
         mods_to_load.extend(mods_to_reload)
@@ -302,7 +490,10 @@ class ModManager(object):
         :return: None
         """
         mod_names = sorted(self.available_mods.keys(), key=str.lower)
-        print_table("Available Modules", mod_names, number_items=False)
+        if self.shell == "json":
+            print_json({"available": mod_names})
+        else:
+            print_table("Available Modules", mod_names, number_items=False)
 
     def print_mods_status(self, loaded_only=False):
         """
@@ -311,27 +502,31 @@ class ModManager(object):
         :param loaded_only: boolean, whether to list loaded modules only
         :return: None
         """
-        mods_loaded = []
-        mods_broken = []
-        mods_unloaded = []
-
-        for mod_name, module in self.available_mods.items():
-            mod_status = module.check_status()
-            if mod_status == 1:
-                mods_loaded.append(mod_name)
-            elif mod_status == 0:
-                mods_broken.append(mod_name)
-            else:
-                mods_unloaded.append(mod_name)
+        mods_loaded, mods_broken = self.get_mods_status(EnvSnapshot())
+        mods_active = set(mods_loaded).union(mods_broken)
+        mods_unloaded = [mod_name for mod_name in self.available_mods.keys()
+                         if mod_name not in mods_active]
         mods_loaded = sorted(mods_loaded, key=str.lower)
         mods_broken = sorted(mods_broken, key=str.lower)
         mods_unloaded = sorted(mods_unloaded, key=str.lower)
 
-        print_table("Loaded Modules", mods_loaded)
+        if self.shell == "json":
+            report = {"loaded": mods_loaded, "broken": mods_broken}
+            if not loaded_only:
+                report["unloaded"] = mods_unloaded
+            print_json(report)
+            return
+        columns = get_terminal_size()[1]
+        report = [format_table("Loaded Modules", mods_loaded,
+                               columns=columns)]
         if len(mods_broken) != 0:
-            print_table("Broken Modules", mods_broken)
+            report.append(format_table("Broken Modules", mods_broken,
+                                       columns=columns))
         if not loaded_only:
-            print_table("Unloaded Modules", mods_unloaded)
+            report.append(format_table("Unloaded Modules", mods_unloaded,
+                                       columns=columns))
+        sys.stderr.write("".join(report))
+        sys.stderr.flush()
 
     def print_mods_info(self, mod_list):
         """
@@ -340,33 +535,61 @@ class ModManager(object):
         :param mod_list: list of module names
         :return: None
         """
-        num_row, num_column = get_terminal_size()
+        if self.shell == "json":
+            print_json({"modules": [self.get_mod_info(mod_name)
+                                    for mod_name in mod_list]})
+            return
+        num_column = get_terminal_size()[1]
+        report = []
         for mod_name in mod_list:
             module = self.available_mods[mod_name]
-            print_table("Module", [mod_name], number_items=False)
+            report.append(format_table("Module", [mod_name],
+                                       number_items=False,
+                                       columns=num_column))
 
             # Print module.environ
-            print_banner("Environ", num_column)
+            report.append(format_banner("Environ", num_column))
             max_length = max([len(env[1]) for env in module.environ])
-            fmt = "%-8s %-" + str(max_length) + "s %s"
+            fmt = "%-8s %-" + str(max_length) + "s %s\n"
             for env in module.environ:
-                print_stderr(fmt % (env[0], env[1], env[2]))
+                report.append(fmt % (env[0], env[1], env[2]))
 
             # Print dependencies, conflicting modules and commands
-            print_table("Dependencies", module.depend, number_items=False)
-            print_table("Conflicting modules", module.conflict,
-                        number_items=False)
-            print_table("Commands", module.command, number_items=False)
+            for table_head, table_body in (
+                    ("Dependencies", module.depend),
+                    ("Conflicting modules", module.conflict),
+                    ("Commands", module.command)):
+                report.append(format_table(table_head, table_body,
+                                           number_items=False,
+                                           columns=num_column))
 
             # Print aliases
-            print_banner("Aliases", num_column)
+            report.append(format_banner("Aliases", num_column))
             if len(module.alias) != 0:
-                fmt = "alias %s=\"%s\""
+                fmt = "alias %s=\"%s\"\n"
                 for alias in module.alias:
-                    print_stderr(fmt % (alias[0], alias[1]))
-                print_stderr("")
+                    report.append(fmt % (alias[0], alias[1]))
+                report.append("\n")
             else:
-                print_stderr("None\n")
+                report.append("None\n\n")
+        sys.stderr.write("".join(report))
+        sys.stderr.flush()
+
+    def get_mod_info(self, mod_name):
+        """
+        Get the configurations of a module for JSON output.
+
+        :param mod_name: string, name of the module
+        :return: dict with keys "name", "class", "environ", "depend",
+                 "conflict", "command" and "alias"
+        """
+        module = self.available_mods[mod_name]
+        return {"name": mod_name, "class": type(module).__name__,
+                "environ": [list(env) for env in module.environ],
+                "depend": list(module.depend),
+                "conflict": list(module.conflict),
+                "command": list(module.command),
+                "alias": [list(alias) for alias in module.alias]}
 
     def diagnose_mods(self, mod_list):
         """
@@ -376,56 +599,63 @@ class ModManager(object):
         :param mod_list: list of strings, names of modules to check
         :return: None
         """
-        num_row, num_column = get_terminal_size()
+        num_column = get_terminal_size()[1]
+        env_snapshot = EnvSnapshot()
+        report = []
         for mod_name in mod_list:
             module = self.available_mods[mod_name]
-            print_table("Module", [mod_name], number_items=False)
+            report.append(format_table("Module", [mod_name],
+                                       number_items=False,
+                                       columns=num_column))
 
             # Check module.environ
-            print_banner("Environ", num_column)
+            report.append(format_banner("Environ", num_column))
             environ = module.environ
             status = True
             for environ_item in environ:
                 operation, env_name, pattern = environ_item[0], \
                                                environ_item[1], environ_item[2]
                 if (operation == "reset"
-                    and not (env_name in os.environ.keys()
-                             and os.environ[env_name] == pattern)):
-                    print_stderr("WARNING: %s not set" % env_name)
+                    and env_snapshot.get(env_name) != pattern):
+                    report.append("WARNING: %s not set\n" % env_name)
                     status = False
                 elif (operation in ("append", "prepend")
-                      and not (env_name in os.environ.keys()
-                               and pattern in os.environ[env_name].split(":"))):
-                    print_stderr("WARNING: %s not set" % env_name)
+                      and not env_snapshot.has_pattern(env_name, pattern)):
+                    report.append("WARNING: %s not set\n" % env_name)
                     status = False
             if status:
-                print_stderr("OK")
-            print_stderr("")
+                report.append("OK\n")
+            report.append("\n")
 
             # Check dependencies
-            print_banner("Dependencies", num_column)
+            report.append(format_banner("Dependencies", num_column))
             dependencies = self.build_dependencies([mod_name],
                                                     include_roots=False)
             status = True
             for depend_item in dependencies:
-                if self.available_mods[depend_item].check_status() != 1:
-                    print_stderr("WARNING: %s not loaded" % depend_item)
+                depend_mod = self.available_mods[depend_item]
+                if depend_mod.check_status(env_snapshot) != 1:
+                    report.append("WARNING: %s not loaded\n" % depend_item)
                     status = False
             if status:
-                print_stderr("OK")
-            print_stderr("")
+                report.append("OK\n")
+            report.append("\n")
 
             # Check conflicts
-            print_banner("Conflicting modules", num_column)
+            report.append(format_banner("Conflicting modules", num_column))
             conflicts = self.build_conflicts([mod_name])
             status = True
             for conflict_item in conflicts:
-                if self.available_mods[conflict_item].check_status() != -1:
-                    print_stderr("WARNING: %s not unloaded" % conflict_item)
+                conflict_mod = self.available_mods[conflict_item]
+                if conflict_mod.check_status(env_snapshot) != -1:
+                    report.append("WARNING: %s not unloaded\n"
+                                  % conflict_item)
                     status = False
             if status:
-                print_stderr("OK")
-            print_stderr("")
+                report.append("OK\n")
+            report.append("\n")
+        sys.stderr.write("".join(report))
+        sys.stderr.flush()
 
     def search_mods(self, pattern_list):
         """
@@ -434,136 +664,283 @@ class ModManager(object):
         :param pattern_list: list of strings, pattern to be matched against
         :return: None
         """
+        name_index = self.get_name_index()
+        columns = get_terminal_size()[1]
         for pattern in pattern_list:
-            try:
-                mods_found = [mod_name for mod_name in self.available_mods.keys()
-                              if re.search(pattern, mod_name, re.IGNORECASE)
-                              is not None]
-                print_table("Modules matching %s" % pattern, mods_found,
-                            number_items=False)
-            except re.error:
-                print_stderr("Invalid regular expression %s" % pattern)
+            # Plain strings are looked up in the index of module names, while
+            # regular expressions have to be matched against each name.
+            if re.search(r"[\\.^$*+?{}\[\]|()]", pattern) is None:
+                mods_found = name_index.search(pattern)
+            else:
+                try:
+                    regex = re.compile(pattern, re.IGNORECASE)
+                except re.error:
+                    print_stderr("Invalid regular expression %s" % pattern)
+                    continue
+                mods_found = [mod_name for mod_name in name_index.names
+                              if regex.search(mod_name) is not None]
+            print_table("Modules matching %s" % pattern, mods_found,
+                        number_items=False, columns=columns)
+
+    def apply_mods(self, sandbox, mods_to_unload, mods_to_load):
+        """
+        Collect the settings of modules to unload and to load into sandbox.
+
+        :param sandbox: instance of SandBox
+        :param mods_to_unload: list of names of modules to unload
+        :param mods_to_load: list of names of modules to load
+        :return: None
+        """
+        for mod_name in self.sort_mods(mods_to_unload):
+            self.available_mods[mod_name].unload(sandbox)
+        for mod_name in self.sort_mods(mods_to_load):
+            self.available_mods[mod_name].load(sandbox)
+        self.record_fingerprints(sandbox, mods_to_unload, mods_to_load)
 
-    def load_mods(self, mod_list, force_no_auto=False):
+    def record_fingerprints(self, sandbox, mods_to_unload, mods_to_load):
         """
-        Load a list of modules.
+        Update the fingerprints of modules recorded in FINGERPRINT_VAR after
+        unloading and loading them.
 
-        :param mod_list: list of the names of modules
-        :param force_no_auto: boolean, whether to force to disable auto mode
+        :param sandbox: instance of SandBox
+        :param mods_to_unload: list of names of modules unloaded
+        :param mods_to_load: list of names of modules loaded
         :return: None
         """
+        env_path = sandbox.get_env(FINGERPRINT_VAR)
+        if env_path is not None:
+            mods_changed = set(mods_to_unload).union(mods_to_load)
+            for pattern in list(env_path):
+                if pattern.rpartition("=")[0] in mods_changed:
+                    sandbox.remove_env(FINGERPRINT_VAR, pattern)
+        for mod_name in sorted(mods_to_load):
+            fingerprint = self.available_mods[mod_name].get_fingerprint()
+            sandbox.prepend_env(FINGERPRINT_VAR,
+                                "%s=%s" % (mod_name, fingerprint))
+
+    def get_mods_changed(self, env_snapshot, mods_loaded, mods_broken):
+        """
+        Get the modules to reload, i.e. the broken modules, the loaded modules
+        whose fingerprints differ from those recorded in FINGERPRINT_VAR, and
+        the loaded modules depending on them.
+
+        :param env_snapshot: instance of EnvSnapshot
+        :param mods_loaded: list of names of loaded modules
+        :param mods_broken: list of names of broken modules
+        :return: list of names of modules
+        """
+        fingerprints = dict([pattern.rpartition("=")[::2] for pattern
+                             in env_snapshot.get_patterns(FINGERPRINT_VAR)])
+        mods_changed = set(mods_broken)
+        for mod_name in mods_loaded:
+            fingerprint = self.available_mods[mod_name].get_fingerprint()
+            if fingerprints.get(mod_name) != fingerprint:
+                mods_changed.add(mod_name)
+        if len(mods_changed) == 0:
+            return []
+        graph = self.get_graph()
+        return [mod_name for mod_name in mods_loaded + mods_broken
+                if not graph.get_mod_closure(mod_name).isdisjoint(mods_changed)]
+
+    def repair_mods(self, sandbox, env_snapshot):
+        """
+        Reload broken modules into sandbox to simplify the logic flow and to
+        avoid potential bugs.
+
+        :param sandbox: instance of SandBox
+        :param env_snapshot: instance of EnvSnapshot
+        :return: list of names of loaded and broken modules
+        """
+        mods_loaded, mods_broken = self.get_mods_status(env_snapshot)
+        if len(mods_broken) != 0:
+            self.apply_mods(sandbox, mods_broken, mods_broken)
+            mods_loaded.extend(mods_broken)
+        return mods_loaded
+
+    def resolve_load(self, mod_list, force_no_auto=False, environ=None):
+        """
+        Collect the changes to the environment for loading a list of modules
+        without printing anything to stdout.
+
+        :param mod_list: list of the names of modules
+        :param force_no_auto: boolean, whether to force to disable auto mode
+        :param environ: mapping of environmental variables to start from,
+                        defaults to os.environ
+        :return: instance of SandBox holding the changes
+        :raises ModuleError: if the modules are claimed to be both
+                             dependencies and conflicting modules
+        """
+        env_snapshot = EnvSnapshot(environ)
+        sandbox = SandBox(environ)
         if force_no_auto:
-            mods_to_load = set([mod_name for mod_name in mod_list
-                        if self.available_mods[mod_name].check_status() != 1])
-            mods_to_unload = set()
+            mods_to_load = [mod_name for mod_name in mod_list
+                            if self.available_mods[mod_name].check_status(
+                                env_snapshot) != 1]
+            mods_to_unload = []
         else:
             # Check if there are paradoxes
             dependencies = self.build_dependencies(mod_list)
-            conflicts = self.build_conflicts(dependencies)
+            conflicts = self.get_graph().get_conflicts(mod_list)
             mods_paradox = dependencies.intersection(conflicts)
             if len(mods_paradox) != 0:
-                for mod_name in mods_paradox:
-                    print_stderr("ERROR: module %s is claimed to be both "
-                                 "dependency and conflicting module" % mod_name)
-                sys.exit(-1)
-
-            # Reload broken modules to simplify the logic flow and to avoid
-            # potential bugs
-            mods_unloaded = []
-            mods_broken = []
-            mods_loaded = []
-            for mod_name, module in self.available_mods.items():
-                status = module.check_status()
-                if status == -1:
-                    mods_unloaded.append(mod_name)
-                elif status == 0:
-                    mods_broken.append(mod_name)
-                else:
-                    mods_loaded.append(mod_name)
-            if len(mods_broken) != 0:
-                self.unload_mods(mods_broken, force_no_auto=True)
-                self.load_mods(mods_broken, force_no_auto=True)
-                mods_loaded.extend(mods_broken)
+                raise ModuleError(["module %s is claimed to be both "
+                                   "dependency and conflicting module"
+                                   % mod_name
+                                   for mod_name in sorted(mods_paradox)])
+
+            mods_loaded = self.repair_mods(sandbox, env_snapshot)
+            mods_active = set(mods_loaded)
 
             # Get the lists of modules to unload and to load
             mods_to_unload = [mod_name for mod_name in conflicts
-                              if mod_name not in mods_unloaded]
+                              if mod_name in mods_active]
             mods_to_load = [mod_name for mod_name in dependencies
-                            if mod_name not in mods_loaded]
+                            if mod_name not in mods_active]
             mods_to_unload, mods_to_load = self.auto_adjust_load(mods_to_unload,
                                                       mods_to_load, mods_loaded)
+        self.apply_mods(sandbox, mods_to_unload, mods_to_load)
+        return sandbox
 
-        # Collect settings from each module and echo
-        mods_to_unload = self.sort_mods(mods_to_unload)
-        mods_to_load = self.sort_mods(mods_to_load)
-        sandbox = SandBox()
-        for mod_name in mods_to_unload:
-            self.available_mods[mod_name].unload(sandbox)
-        for mod_name in mods_to_load:
-            self.available_mods[mod_name].load(sandbox)
-        sandbox.echo_commands()
-
-    def unload_mods(self, mod_list, force_no_auto=False):
+    def resolve_unload(self, mod_list, force_no_auto=False, environ=None):
         """
-        Unload specified list of modules with their dependencies that are not.
+        Collect the changes to the environment for unloading a list of modules
+        without printing anything to stdout.
 
         :param mod_list: list of the names of modules
         :param force_no_auto: boolean, whether to force to disable auto mode
-        :return: None
+        :param environ: mapping of environmental variables to start from,
+                        defaults to os.environ
+        :return: instance of SandBox holding the changes
         """
+        env_snapshot = EnvSnapshot(environ)
+        sandbox = SandBox(environ)
         if force_no_auto:
-            mods_to_unload = set([mod_name for mod_name in mod_list
-                        if self.available_mods[mod_name].check_status() != -1])
-            mods_to_load = set()
+            mods_to_unload = [mod_name for mod_name in mod_list
+                              if self.available_mods[mod_name].check_status(
+                                  env_snapshot) != -1]
+            mods_to_load = []
         else:
-            # Reload broken modules to simplify the logic flow and to avoid
-            # potential bugs
-            mods_unloaded = []
-            mods_broken = []
-            mods_loaded = []
-            for mod_name, module in self.available_mods.items():
-                status = module.check_status()
-                if status == -1:
-                    mods_unloaded.append(mod_name)
-                elif status == 0:
-                    mods_broken.append(mod_name)
-                else:
-                    mods_loaded.append(mod_name)
-            if len(mods_broken) != 0:
-                self.unload_mods(mods_broken, force_no_auto=True)
-                self.load_mods(mods_broken, force_no_auto=True)
-                mods_loaded.extend(mods_broken)
+            mods_loaded = self.repair_mods(sandbox, env_snapshot)
+            mods_active = set(mods_loaded)
 
             # Get the list of modules to unload and to load
             dependencies = self.build_dependencies(mod_list)
             mods_to_unload = [mod_name for mod_name in dependencies
-                              if mod_name not in mods_unloaded]
+                              if mod_name in mods_active]
             mods_to_load = []
             mods_to_unload, mods_to_load = self.auto_adjust_unload(
                                       mods_to_unload, mods_to_load, mods_loaded)
+        self.apply_mods(sandbox, mods_to_unload, mods_to_load)
+        return sandbox
+
+    def resolve_reload(self, environ=None, full=None):
+        """
+        Collect the changes to the environment for reloading loaded and
+        broken modules without printing anything to stdout.
+
+        Only the modules whose definitions have changed since they were
+        loaded, according to their fingerprints, are reloaded together with
+        the broken modules and the modules depending on them, unless full is
+        True.
+
+        :param environ: mapping of environmental variables to start from,
+                        defaults to os.environ
+        :param full: boolean, whether to reload all the loaded modules,
+                     defaults to whether PM_FULL_RELOAD is set in environ
+        :return: instance of SandBox holding the changes
+        """
+        if full is None:
+            if environ is None:
+                environ = os.environ
+            full = bool(environ.get("PM_FULL_RELOAD"))
+        env_snapshot = EnvSnapshot(environ)
+        mods_loaded, mods_broken = self.get_mods_status(env_snapshot)
+        if full:
+            mods_to_load = mods_loaded + mods_broken
+        else:
+            mods_to_load = self.get_mods_changed(env_snapshot, mods_loaded,
+                                                 mods_broken)
+        sandbox = SandBox(environ)
+        self.apply_mods(sandbox, mods_to_load, mods_to_load)
+        return sandbox
 
-        # Collect settings from each module and echo
-        mods_to_unload = self.sort_mods(mods_to_unload)
-        mods_to_load = self.sort_mods(mods_to_load)
-        sandbox = SandBox()
-        for mod_name in mods_to_unload:
-            self.available_mods[mod_name].unload(sandbox)
-        for mod_name in mods_to_load:
-            self.available_mods[mod_name].load(sandbox)
-        sandbox.echo_commands()
+    def load_environ(self, mod_list, environ=None, force_no_auto=False):
+        """
+        Load a list of modules into a mapping of environmental variables in
+        place, e.g. for preparing the environment of a subprocess. Aliases and
+        commands of the modules are not applied.
+
+        :param mod_list: list of the names of modules
+        :param environ: mutable mapping of environmental variables, defaults
+                        to os.environ
+        :param force_no_auto: boolean, whether to force to disable auto mode
+        :return: dict of the variables changed and their new values
+        :raises ModuleError: if the modules cannot be loaded, in which case
+                             environ is left unchanged
+        """
+        if environ is None:
+            environ = os.environ
+        sandbox = self.resolve_load(mod_list, force_no_auto, environ)
+        return sandbox.apply_changes(environ)
+
+    def unload_environ(self, mod_list, environ=None, force_no_auto=False):
+        """
+        Unload a list of modules from a mapping of environmental variables in
+        place. Aliases and commands of the modules are not applied.
+
+        :param mod_list: list of the names of modules
+        :param environ: mutable mapping of environmental variables, defaults
+                        to os.environ
+        :param force_no_auto: boolean, whether to force to disable auto mode
+        :return: dict of the variables changed and their new values
+        """
+        if environ is None:
+            environ = os.environ
+        sandbox = self.resolve_unload(mod_list, force_no_auto, environ)
+        return sandbox.apply_changes(environ)
+
+    def reload_environ(self, environ=None, full=None):
+        """
+        Reload loaded and broken modules in a mapping of environmental
+        variables in place, see resolve_reload. Aliases and commands of the
+        modules are not applied.
+
+        :param environ: mutable mapping of environmental variables, defaults
+                        to os.environ
+        :param full: boolean, whether to reload all the loaded modules
+        :return: dict of the variables changed and their new values
+        """
+        if environ is None:
+            environ = os.environ
+        return self.resolve_reload(environ, full).apply_changes(environ)
+
+    def load_mods(self, mod_list, force_no_auto=False):
+        """
+        Load a list of modules.
 
-    def reload(self):
+        :param mod_list: list of the names of modules
+        :param force_no_auto: boolean, whether to force to disable auto mode
+        :return: None
+        """
+        sandbox = self.resolve_load(mod_list, force_no_auto)
+        sandbox.echo_commands(self.shell)
+
+    def unload_mods(self, mod_list, force_no_auto=False):
+        """
+        Unload specified list of modules with their dependencies that are not.
+
+        :param mod_list: list of the names of modules
+        :param force_no_auto: boolean, whether to force to disable auto mode
+        :return: None
         """
-        Reload all loaded and broken modules.
+        sandbox = self.resolve_unload(mod_list, force_no_auto)
+        sandbox.echo_commands(self.shell)
 
+    def reload(self, full=None):
+        """
+        Reload loaded and broken modules, see resolve_reload.
+
+        :param full: boolean, whether to reload all the loaded modules
         :return: None
         """
-        mods_to_load = [mod_name for mod_name in self.available_mods.keys()
-                        if self.available_mods[mod_name].check_status() != -1]
-        mods_to_load = self.sort_mods(mods_to_load)
-        sandbox = SandBox()
-        for mod_name in mods_to_load:
-            self.available_mods[mod_name].unload(sandbox)
-        for mod_name in mods_to_load:
-            self.available_mods[mod_name].load(sandbox)
-        sandbox.echo_commands()
+        self.resolve_reload(full=full).echo_commands(self.shell)
@@ -1,6 +1,56 @@
 import sys
 import os
+import json
+import hashlib
+import inspect
 from pmod.utilities import print_stderr
+from pmod.environ import EnvSnapshot
+
+try:
+    intern = sys.intern
+except AttributeError:
+    pass
+
+
+# Supported operations on environmental variables. Operations of environ
+# items are replaced by these objects when the module is frozen, so that all
+# the modules share the same strings.
+OPERATIONS = ("append", "prepend", "reset")
+OPERATION_NAMES = dict([(operation, operation) for operation in OPERATIONS])
+
+# Environmental variable recording the fingerprints of loaded modules as
+# "name=fingerprint" patterns, see Module.get_fingerprint.
+FINGERPRINT_VAR = "PM_LOADED_FINGERPRINTS"
+
+# Stamps of the source files of the classes of modules, see get_class_stamps
+CLASS_STAMPS = dict()
+
+
+def get_class_stamps(mod_class):
+    """
+    Get the modification times and sizes of the source files defining a class
+    of modules and its base classes derived from Module, so that the
+    fingerprints change whenever their methods are edited. The stamps are
+    taken once for each class object, i.e. each import of the class.
+
+    :param mod_class: class object, Module or its derived class
+    :return: list of [file name, mtime, size], empty for the Module class
+    """
+    stamps = CLASS_STAMPS.get(mod_class)
+    if stamps is None:
+        stamps = []
+        for cls in mod_class.__mro__:
+            if cls is Module:
+                break
+            try:
+                source_file = inspect.getsourcefile(cls)
+                stat = os.stat(source_file)
+                stamps.append([source_file, stat.st_mtime, stat.st_size])
+            except (TypeError, IOError, OSError):
+                # e.g. classes defined interactively
+                stamps.append([None, None, None])
+        CLASS_STAMPS[mod_class] = stamps
+    return stamps
 
 
 class Module(object):
@@ -24,7 +74,17 @@ class Module(object):
 
     self.alias contains the aliases to be set. Each element in alias is a tuple
     with two elements (alias name, alias string).
+
+    The five attributes are lists during construction, so that the
+    constructors of derived classes can extend them. When the module is added
+    to the module manager they are frozen into tuples by the freeze method,
+    with the names of modules and environmental variables interned. Instances
+    keep their attributes in slots instead of a dictionary. Derived classes
+    may declare "__slots__ = ()" to drop the dictionary as well.
     """
+    __slots__ = ("mod_name", "environ", "depend", "conflict", "command",
+                 "alias")
+
     def __init__(self, mod_name, **kwargs):
         """
         :param mod_name: string, name of the module
@@ -53,17 +113,18 @@ class Module(object):
         :param alias: list of tuples, alias settings
         :return: None
         """
+        if isinstance(self.environ, tuple):
+            self.thaw()
+
         # Add pre-defined items to environ
         if preset == "mod":
+            lib_dir = destination + "/lib"
+            inc_dir = destination + "/include"
             self.environ.append(("prepend", "PATH", destination + "/bin"))
-            self.environ.append(("prepend", "LIBRARY_PATH",
-                                 destination + "/lib"))
-            self.environ.append(("prepend", "LD_LIBRARY_PATH",
-                                 destination + "/lib"))
-            self.environ.append(("prepend", "C_INCLUDE_PATH",
-                                 destination + "/include"))
-            self.environ.append(("prepend", "CPLUS_INCLUDE_PATH",
-                                 destination + "/include"))
+            self.environ.append(("prepend", "LIBRARY_PATH", lib_dir))
+            self.environ.append(("prepend", "LD_LIBRARY_PATH", lib_dir))
+            self.environ.append(("prepend", "C_INCLUDE_PATH", inc_dir))
+            self.environ.append(("prepend", "CPLUS_INCLUDE_PATH", inc_dir))
         elif preset == "path":
             self.environ.append(("prepend", "PATH", destination))
         elif preset == "lib":
@@ -93,6 +154,59 @@ class Module(object):
             self.alias.extend(alias)
         self.check_environ()
 
+    def freeze(self):
+        """
+        Convert the lists of this module into tuples and intern the names of
+        modules and environmental variables, so that modules share the same
+        strings. This method is called by the module manager when the module
+        is added.
+
+        :return: None
+        """
+        self.mod_name = intern(self.mod_name)
+        self.environ = tuple([(OPERATION_NAMES.get(operation, operation),
+                               intern(env_name), pattern)
+                              for operation, env_name, pattern
+                              in self.environ])
+        self.depend = tuple([intern(mod_name) for mod_name in self.depend])
+        self.conflict = tuple([intern(mod_name)
+                               for mod_name in self.conflict])
+        self.command = tuple(self.command)
+        self.alias = tuple([tuple(alias) for alias in self.alias])
+
+    def thaw(self):
+        """
+        Convert the tuples of a frozen module back into lists, so that new
+        settings can be added.
+
+        :return: None
+        """
+        self.environ = list(self.environ)
+        self.depend = list(self.depend)
+        self.conflict = list(self.conflict)
+        self.command = list(self.command)
+        self.alias = list(self.alias)
+
+    def get_fingerprint(self):
+        """
+        Get the fingerprint of the definition of this module, which changes
+        whenever the class, the source files of custom classes, see
+        get_class_stamps, or any of the five lists of the module changes.
+        The fingerprints of loaded modules are recorded in FINGERPRINT_VAR, so
+        that reloading skips the modules that have not changed.
+
+        :return: string of 8 hexadecimal digits
+        """
+        mod_class = type(self)
+        definition = ["%s.%s" % (mod_class.__module__, mod_class.__name__),
+                      self.environ, self.depend, self.conflict, self.command,
+                      self.alias]
+        # Fingerprints of modules of the Module class are kept unchanged
+        class_stamps = get_class_stamps(mod_class)
+        if len(class_stamps) != 0:
+            definition.append(class_stamps)
+        return hashlib.md5(json.dumps(definition).encode()).hexdigest()[:8]
+
     def check_environ(self):
         """
         Check if there are undefined operations in self.environ
@@ -100,29 +214,30 @@ class Module(object):
         :return: None
         """
         for environ_item in self.environ:
-            if environ_item[0] not in ("append", "prepend", "reset"):
+            if environ_item[0] not in OPERATIONS:
                 print_stderr("ERROR: module %s has undefined operation %s"
                              % (self.mod_name, environ_item[0]))
                 sys.exit(-1)
 
-    def check_status(self):
+    def check_status(self, env_snapshot=None):
         """
         Check the status of this module.
 
+        :param env_snapshot: instance of the EnvSnapshot class, a snapshot of
+                             os.environ is taken if not given. Pass the same
+                             snapshot when checking many modules so that the
+                             environmental variables are split only once.
         :return: 1 for "loaded", 0 for "broken", -1 for "unloaded"
         """
+        if env_snapshot is None:
+            env_snapshot = EnvSnapshot()
         num_key_total = len(self.environ)
         num_key_set = 0
         for environ_item in self.environ:
             operation, env_name, pattern = environ_item[0], environ_item[1],\
                                            environ_item[2]
-            if (operation == "reset"
-                and env_name in os.environ.keys()
-                and pattern in os.environ[env_name].split(":")):
-                num_key_set += 1
-            elif (operation in ("append", "prepend")
-                  and env_name in os.environ.keys()
-                  and pattern in os.environ[env_name].split(":")):
+            if (operation in ("append", "prepend", "reset")
+                and env_snapshot.has_pattern(env_name, pattern)):
                 num_key_set += 1
         if num_key_set == num_key_total:
             return 1
@@ -0,0 +1,180 @@
+import re
+from bisect import bisect_left
+from pmod.utilities import VersionKey
+
+
+class PrefixIndex(object):
+    """
+    Class that finds the names of modules beginning with given prefix, for
+    completing module names in the shell.
+
+    The names are kept in a sorted array, so that a query takes O(log N + K)
+    time, where N is the number of names and K is the number of matches. The
+    index is small and saved separately in the cache file, so that it can be
+    loaded without restoring the module manager. See ModCache for details.
+
+    self.keys is the sorted list of lower-cased names.
+
+    self.names is the list of names in the same order as self.keys.
+    """
+    def __init__(self, mod_names):
+        """
+        :param mod_names: list of the names of modules
+        """
+        items = sorted([(mod_name.lower(), mod_name) for mod_name in mod_names])
+        self.keys = [item[0] for item in items]
+        self.names = [item[1] for item in items]
+
+    def complete(self, prefix):
+        """
+        Find the modules whose names begin with given prefix, with case
+        ignored.
+
+        :param prefix: string, prefix of module names
+        :return: list of names of modules, sorted case-insensitively
+        """
+        prefix = prefix.lower()
+        i_start = bisect_left(self.keys, prefix)
+        i_end = i_start
+        while i_end < len(self.keys) and self.keys[i_end].startswith(prefix):
+            i_end += 1
+        return self.names[i_start:i_end]
+
+
+class NameIndex(object):
+    """
+    Class that indexes the names of modules for resolving the names given by
+    the user.
+
+    self.names is the sorted list of names of all modules.
+
+    self.exact maps each lower-cased name to the list of names of modules that
+    match it case-insensitively.
+
+    self.versions maps each lower-cased base name to the list of names of its
+    versions, sorted by version in increasing order. The base name of a module
+    is its name with the version number removed, e.g. "openmpi" for
+    "openmpi/3.1.3-intel". Names with several possible version numbers, e.g.
+    "foo-1/2.0", are indexed under each of the base names.
+
+    self.version_keys maps each lower-cased base name to the list of parsed
+    versions, i.e. instances of VersionKey, in the same order as
+    self.versions.
+
+    self.grams maps each trigram of the lower-cased names to the set of
+    indices of names in self.names containing it, for finding suggestions.
+
+    self.prefixes is an instance of PrefixIndex for completing names.
+    """
+    def __init__(self, mod_names):
+        """
+        :param mod_names: list of the names of modules
+        """
+        self.names = sorted(mod_names)
+        self.exact = dict()
+        self.grams = dict()
+        versions = dict()
+        for i, mod_name in enumerate(self.names):
+            name_lower = mod_name.lower()
+            self.exact.setdefault(name_lower, []).append(mod_name)
+            for match in re.finditer(r"[-/]+(?=[0-9\.])", name_lower):
+                base_name = name_lower[:match.start()]
+                version_key = VersionKey(mod_name[match.end():])
+                versions.setdefault(base_name, []).append((version_key,
+                                                           mod_name))
+            for j in range(len(name_lower) - 2):
+                self.grams.setdefault(name_lower[j:j+3], set()).add(i)
+        self.versions = dict()
+        self.version_keys = dict()
+        for base_name, items in versions.items():
+            items.sort()
+            self.version_keys[base_name] = [item[0] for item in items]
+            self.versions[base_name] = [item[1] for item in items]
+        self.prefixes = PrefixIndex(self.names)
+
+    def select_versions(self, base_name, min_version=None, max_version=None):
+        """
+        Get the versions of a module within given range.
+
+        :param base_name: string, name of the module without version number,
+                          case-insensitive
+        :param min_version: string, lower bound of version, inclusive, e.g.
+                            "3" for versions no older than 3.0
+        :param max_version: string, upper bound of version, exclusive
+        :return: list of names of modules, sorted by version in increasing
+                 order
+        """
+        base_name = base_name.lower()
+        versions = self.versions.get(base_name, [])
+        version_keys = self.version_keys.get(base_name, [])
+        i_start, i_end = 0, len(versions)
+        if min_version is not None:
+            i_start = bisect_left(version_keys, VersionKey(min_version))
+        if max_version is not None:
+            i_end = bisect_left(version_keys, VersionKey(max_version))
+        return versions[i_start:i_end]
+
+    def get_latest(self, base_name, min_version=None, max_version=None):
+        """
+        Get the latest version of a module within given range.
+
+        :param base_name: string, name of the module without version number,
+                          case-insensitive
+        :param min_version: string, lower bound of version, inclusive
+        :param max_version: string, upper bound of version, exclusive
+        :return: string, name of the latest version, or None if not found
+        """
+        if min_version is None and max_version is None:
+            versions = self.versions.get(base_name.lower())
+        else:
+            versions = self.select_versions(base_name, min_version,
+                                            max_version)
+        if not versions:
+            return None
+        return versions[-1]
+
+    def get_exact(self, mod_name):
+        """
+        Get the modules whose names match the given name exactly, with case
+        ignored.
+
+        :param mod_name: string, name of the module
+        :return: list of names of modules
+        """
+        return self.exact.get(mod_name.lower(), [])
+
+    def complete(self, prefix):
+        """
+        Find the modules whose names begin with given prefix, with case
+        ignored.
+
+        :param prefix: string, prefix of module names
+        :return: list of names of modules
+        """
+        return self.prefixes.complete(prefix)
+
+    def search(self, pattern):
+        """
+        Find the modules whose names contain given pattern, with case ignored.
+
+        Patterns with no less than three characters are looked up in the
+        trigram index, so that only the names sharing all the trigrams of the
+        pattern are compared.
+
+        :param pattern: string, pattern to search for
+        :return: list of names of modules, sorted
+        """
+        pattern = pattern.lower()
+        if len(pattern) < 3:
+            return [mod_name for mod_name in self.names
+                    if pattern in mod_name.lower()]
+        gram_sets = []
+        for j in range(len(pattern) - 2):
+            gram_set = self.grams.get(pattern[j:j+3])
+            if gram_set is None:
+                return []
+            gram_sets.append(gram_set)
+        gram_sets.sort(key=len)
+        candidates = gram_sets[0].intersection(*gram_sets[1:])
+        return [self.names[i] for i in sorted(candidates)
+                if pattern in self.names[i].lower()]
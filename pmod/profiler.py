@@ -0,0 +1,312 @@
+import sys
+import os
+import time
+import json
+
+
+# Time when pmod was imported, for telling the startup of the interpreter
+# from the import of pmod itself. This module should be imported before the
+# other modules of pmod.
+IMPORT_TIME = time.time()
+
+# Timers of wall time and CPU time, with the best resolution available
+wall_clock = getattr(time, "perf_counter", time.time)
+cpu_clock = getattr(time, "process_time", None) or time.clock
+
+# Methods timed while profiling, as (module name, class name, method name,
+# phase name). Methods are wrapped only when profiling is enabled, so they
+# cost nothing otherwise.
+TIMED_METHODS = (
+    ("pmod.cache", "ModCache", "load", "cache_load"),
+    ("pmod.cache", "ModCache", "dump", "cache_dump"),
+    ("pmod.modmanager", "ModManager", "check_sanity", "check_sanity"),
+    ("pmod.modmanager", "ModManager", "verify_mod_names", "verify_mod_names"),
+    ("pmod.modmanager", "ModManager", "get_graph", "get_graph"),
+    ("pmod.modmanager", "ModManager", "get_status_index",
+     "get_status_index"),
+    ("pmod.modmanager", "ModManager", "get_mods_status", "get_mods_status"),
+    ("pmod.modmanager", "ModManager", "auto_adjust_load", "auto_adjust_load"),
+    ("pmod.modmanager", "ModManager", "auto_adjust_unload",
+     "auto_adjust_unload"),
+    ("pmod.modmanager", "ModManager", "build_dependencies",
+     "build_dependencies"),
+    ("pmod.modmanager", "ModManager", "build_conflicts", "build_conflicts"),
+    ("pmod.modmanager", "ModManager", "sort_mods", "sort_mods"),
+    ("pmod.modmanager", "ModManager", "apply_mods", "apply_mods"),
+    ("pmod.module", "Module", "check_status", "check_status"),
+    ("pmod.sandbox", "SandBox", "__init__", "sandbox_init"),
+    ("pmod.sandbox", "SandBox", "get_changes", "get_changes"),
+    ("pmod.sandbox", "SandBox", "echo_commands", "output"),
+)
+
+
+def get_process_age():
+    """
+    Get the time elapsed since current process was started, from the proc
+    file system of Linux.
+
+    :return: float, time in seconds, or None if not available
+    """
+    try:
+        with open("/proc/self/stat", "r") as stat_file:
+            # The name of the program may contain spaces, so the fields are
+            # counted from the closing parenthesis.
+            fields = stat_file.read().rpartition(")")[2].split()
+        with open("/proc/uptime", "r") as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+        ticks = os.sysconf("SC_CLK_TCK")
+    except (IOError, OSError, ValueError, AttributeError):
+        return None
+    return uptime - float(fields[19]) / ticks
+
+
+class PhaseRecord(object):
+    """
+    Class that accumulates the time spent in a phase.
+
+    self.calls is the number of times the phase has been entered.
+
+    self.wall and self.cpu are the accumulated wall time and CPU time in
+    seconds. Recursive calls are counted, but timed only once at the
+    outermost level.
+
+    self.depth is the current level of nesting of the phase.
+
+    self.first is the wall clock when the phase was first entered, for
+    ordering the phases in the trace.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.depth = 0
+        self.first = None
+
+
+class Phase(object):
+    """
+    Context manager that times a block of code as a phase.
+    """
+    def __init__(self, record):
+        """
+        :param record: instance of PhaseRecord
+        """
+        self.record = record
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def __enter__(self):
+        record = self.record
+        record.calls += 1
+        record.depth += 1
+        if record.depth == 1:
+            self.wall, self.cpu = wall_clock(), cpu_clock()
+            if record.first is None:
+                record.first = self.wall
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record = self.record
+        record.depth -= 1
+        if record.depth == 0:
+            record.wall += wall_clock() - self.wall
+            record.cpu += cpu_clock() - self.cpu
+        return False
+
+
+class NullPhase(object):
+    """
+    Context manager that does nothing, used when profiling is disabled.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+
+class Profiler(object):
+    """
+    Class that records the wall time, CPU time and number of calls of the
+    phases of a 'module' command, and writes them as a JSON trace.
+
+    Profiling is enabled by setting PM_PROFILE, or by the --profile option of
+    modcmd.py. The trace is written to stderr if the target is "1" or
+    "stderr", otherwise appended to the file named by the target as one line
+    of JSON. Optionally, set PM_PROFILE_CPROFILE to a file name to dump the
+    statistics of cProfile, and PM_PROFILE_MEMORY to a non-empty value to
+    record the memory allocated with tracemalloc, or to a file name to also
+    dump the snapshot of tracemalloc. Nothing is ever written to stdout, which
+    is evaluated by the shell.
+
+    Phases are recorded by wrapping the methods in TIMED_METHODS, and by the
+    blocks of code timed with the phase method.
+
+    self.target is where to write the trace, None if profiling is disabled.
+
+    self.records maps the names of phases to instances of PhaseRecord.
+
+    self.wrapped lists the (class, method name, original method) tuples of
+    the wrapped methods, to be restored when profiling stops.
+
+    self.start_wall and self.start_cpu are the clocks when profiling started.
+
+    self.cprofile is the instance of cProfile.Profile, or None.
+
+    self.cprofile_file is the file to dump the statistics of cProfile.
+
+    self.memory_file is the value of PM_PROFILE_MEMORY.
+    """
+    def __init__(self):
+        self.target = None
+        self.records = dict()
+        self.wrapped = []
+        self.start_wall = 0.0
+        self.start_cpu = 0.0
+        self.cprofile = None
+        self.cprofile_file = None
+        self.memory_file = None
+
+    def get_record(self, name):
+        """
+        Get the record of a phase, creating it if necessary.
+
+        :param name: string, name of the phase
+        :return: instance of PhaseRecord
+        """
+        record = self.records.get(name)
+        if record is None:
+            record = self.records[name] = PhaseRecord()
+        return record
+
+    def phase(self, name):
+        """
+        Get the context manager timing a block of code as a phase.
+
+        :param name: string, name of the phase
+        :return: instance of Phase, or NullPhase if profiling is disabled
+        """
+        if self.target is None:
+            return NULL_PHASE
+        return Phase(self.get_record(name))
+
+    def wrap(self, cls, method_name, name):
+        """
+        Replace a method of a class with a wrapper that times each call as a
+        phase.
+
+        :param cls: class object
+        :param method_name: string, name of the method
+        :param name: string, name of the phase
+        :return: None
+        """
+        method = cls.__dict__[method_name]
+        record = self.get_record(name)
+
+        def wrapper(*args, **kwargs):
+            with Phase(record):
+                return method(*args, **kwargs)
+        wrapper.__name__ = method.__name__
+        wrapper.__doc__ = method.__doc__
+        setattr(cls, method_name, wrapper)
+        self.wrapped.append((cls, method_name, method))
+
+    def start(self, target=None):
+        """
+        Start profiling, discarding previous records.
+
+        :param target: string, where to write the trace, see the class
+                       documentation, defaults to PM_PROFILE
+        :return: None
+        """
+        if target is None:
+            target = os.environ.get("PM_PROFILE")
+        if not target:
+            return
+        self.__init__()
+        self.target = target
+        for module_name, class_name, method_name, name in TIMED_METHODS:
+            module = __import__(module_name, fromlist=[class_name])
+            self.wrap(getattr(module, class_name), method_name, name)
+        self.memory_file = os.environ.get("PM_PROFILE_MEMORY")
+        if self.memory_file:
+            try:
+                import tracemalloc
+                tracemalloc.start()
+            except ImportError:
+                self.memory_file = None
+        self.cprofile_file = os.environ.get("PM_PROFILE_CPROFILE")
+        if self.cprofile_file:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        self.start_wall, self.start_cpu = wall_clock(), cpu_clock()
+
+    def get_trace(self):
+        """
+        Get the trace of current records.
+
+        :return: dict with keys "argv", "pid", "startup", "total" and
+                 "phases", where "startup" is the time in seconds from the
+                 start of the interpreter to the import of pmod or None,
+                 "total" is the wall time and CPU time since profiling
+                 started, and "phases" is a list of dicts with keys "name",
+                 "calls", "wall" and "cpu", in the order of first occurrence
+        """
+        process_age = get_process_age()
+        startup = None
+        if process_age is not None:
+            startup = process_age - (time.time() - IMPORT_TIME)
+        trace = {"argv": sys.argv, "pid": os.getpid(), "startup": startup,
+                 "total": {"wall": wall_clock() - self.start_wall,
+                           "cpu": cpu_clock() - self.start_cpu},
+                 "phases": []}
+        records = [(record.first, name, record)
+                   for name, record in self.records.items()
+                   if record.first is not None]
+        for first, name, record in sorted(records):
+            trace["phases"].append({"name": name, "calls": record.calls,
+                                    "wall": record.wall, "cpu": record.cpu})
+        return trace
+
+    def stop(self):
+        """
+        Stop profiling, restore the wrapped methods and write the trace.
+
+        :return: None
+        """
+        if self.target is None:
+            return
+        trace = self.get_trace()
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.cprofile_file)
+            trace["cprofile"] = self.cprofile_file
+        if self.memory_file:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            trace["memory"] = {"current": current, "peak": peak}
+            if self.memory_file not in ("1", "stderr"):
+                tracemalloc.take_snapshot().dump(self.memory_file)
+                trace["memory"]["snapshot"] = self.memory_file
+            tracemalloc.stop()
+        for cls, method_name, method in reversed(self.wrapped):
+            setattr(cls, method_name, method)
+        line = json.dumps(trace, sort_keys=True)
+        if self.target in ("1", "stderr"):
+            sys.stderr.write("%s\n" % line)
+            sys.stderr.flush()
+        else:
+            try:
+                with open(self.target, "a") as out_file:
+                    out_file.write("%s\n" % line)
+            except (IOError, OSError):
+                sys.stderr.write("Cannot write profile to %s\n" % self.target)
+        self.__init__()
+
+
+# The profiler shared by all the modules of pmod
+profiler = Profiler()
@@ -1,5 +1,104 @@
 import os
-from pmod.utilities import print_stdout
+from pmod.utilities import print_stdout, print_stderr
+from pmod.shells import get_emitter
+
+
+def unique(items):
+    """
+    Remove duplicate items from a list, keeping the order of their first
+    occurrences.
+
+    :param items: list of hashable items
+    :return: list of unique items
+    """
+    items_seen = set()
+    items_unique = []
+    for item in items:
+        if item not in items_seen:
+            items_seen.add(item)
+            items_unique.append(item)
+    return items_unique
+
+
+class EnvPath(object):
+    """
+    Class that holds the patterns of a colon-separated environmental variable
+    as an ordered set, with O(1) membership check, prepending, appending and
+    removal.
+
+    Each pattern is labelled with a sequence number, which decreases on
+    prepending and increases on appending, so that the order of patterns is
+    the order of their sequence numbers. Duplicate patterns, e.g. those
+    inherited from os.environ, are kept as in a list.
+
+    self.patterns maps sequence numbers to patterns.
+
+    self.seqs maps each pattern to the list of its sequence numbers.
+
+    self.head and self.tail are the smallest and largest sequence numbers ever
+    assigned.
+    """
+    def __init__(self, patterns=()):
+        """
+        :param patterns: list of patterns to initialize the path
+        """
+        self.patterns = dict()
+        self.seqs = dict()
+        self.head = 0
+        self.tail = -1
+        for pattern in patterns:
+            self.append(pattern)
+
+    def __contains__(self, pattern):
+        return pattern in self.seqs
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __iter__(self):
+        for seq in sorted(self.patterns.keys()):
+            yield self.patterns[seq]
+
+    def add_pattern(self, seq, pattern):
+        """
+        Label a pattern with a sequence number.
+
+        :param seq: integer, sequence number
+        :param pattern: string, pattern to add
+        :return: None
+        """
+        self.patterns[seq] = pattern
+        self.seqs.setdefault(pattern, []).append(seq)
+
+    def append(self, pattern):
+        """
+        Add pattern to the end of the path.
+
+        :param pattern: string, pattern to add
+        :return: None
+        """
+        self.tail += 1
+        self.add_pattern(self.tail, pattern)
+
+    def prepend(self, pattern):
+        """
+        Add pattern to the beginning of the path.
+
+        :param pattern: string, pattern to add
+        :return: None
+        """
+        self.head -= 1
+        self.add_pattern(self.head, pattern)
+
+    def remove(self, pattern):
+        """
+        Remove all the occurrences of pattern from the path.
+
+        :param pattern: string, pattern to remove
+        :return: None
+        """
+        for seq in self.seqs.pop(pattern, []):
+            del self.patterns[seq]
 
 
 class SandBox(object):
@@ -7,23 +106,56 @@ class SandBox(object):
     Class that records the settings of each module and outputs shell commands
     to stdout.
 
-    self.environ is a copy of os.environ, but has all the elements split by ":".
+    self.source is the environment the sandbox starts from, os.environ by
+    default. It is never modified.
+
+    self.environ holds the variables touched by the modules, with the elements
+    split by ":" and stored as instances of EnvPath. A variable is copied from
+    self.source and split on first access via get_env, so that constructing a
+    sandbox does not depend on the size of the environment.
 
     self.env_name_changed records the environmental variables modifed by the
-    modules to load or unload.
+    modules to load or unload, in the order of modification.
 
     self.command, self.alias and self.unalias records the command and alias of
     each module.
+
+    self.show_savings indicates whether to report the number of commands
+    skipped by echo_commands to stderr.
     """
-    def __init__(self):
+    def __init__(self, source=None, show_savings=None):
+        """
+        :param source: dict of environmental variables, defaults to os.environ
+        :param show_savings: boolean, whether to report the commands skipped
+                             by echo_commands, defaults to True if
+                             PM_SHOW_SAVINGS is set to a non-empty value
+        """
+        if source is None:
+            source = os.environ
+        if show_savings is None:
+            show_savings = bool(os.environ.get("PM_SHOW_SAVINGS"))
+        self.source = source
+        self.show_savings = show_savings
         self.environ = dict()
-        for env_name, env_value in os.environ.items():
-            self.environ[env_name] = env_value.split(":")
-        self.env_name_changed = []
+        self.env_name_changed = EnvPath()
         self.command = []
         self.alias = []
         self.unalias = []
 
+    def get_env(self, env_name):
+        """
+        Get the patterns of environmental variable, copying it from
+        self.source if not touched before.
+
+        :param env_name: string, name of the environmental variable
+        :return: instance of EnvPath, or None if the variable is not set
+        """
+        env_path = self.environ.get(env_name)
+        if env_path is None and env_name in self.source:
+            env_path = EnvPath(self.source[env_name].split(":"))
+            self.environ[env_name] = env_path
+        return env_path
+
     def has_pattern(self, env_name, pattern):
         """
         Check if pattern is already included in self.environ[env_name].
@@ -32,10 +164,11 @@ class SandBox(object):
         :param pattern: string, pattern to check
         :return: True if pattern already included, False otherwise.
         """
-        if env_name not in self.environ.keys():
+        env_path = self.get_env(env_name)
+        if env_path is None:
             return False
         else:
-            return pattern in self.environ[env_name]
+            return pattern in env_path
 
     def reset_env(self, env_name, pattern):
         """
@@ -45,7 +178,7 @@ class SandBox(object):
         :param pattern: string, new value of environmental variable
         :return: None
         """
-        self.environ[env_name] = [pattern]
+        self.environ[env_name] = EnvPath([pattern])
         if env_name not in self.env_name_changed:
             self.env_name_changed.append(env_name)
 
@@ -59,10 +192,11 @@ class SandBox(object):
         :return: None
         """
         if not self.has_pattern(env_name, pattern):
-            if env_name not in self.environ.keys():
-                self.environ[env_name] = [pattern]
+            env_path = self.get_env(env_name)
+            if env_path is None:
+                self.environ[env_name] = EnvPath([pattern])
             else:
-                self.environ[env_name].append(pattern)
+                env_path.append(pattern)
             if env_name not in self.env_name_changed:
                 self.env_name_changed.append(env_name)
 
@@ -76,10 +210,11 @@ class SandBox(object):
         :return: None
         """
         if not self.has_pattern(env_name, pattern):
-            if env_name not in self.environ.keys():
-                self.environ[env_name] = [pattern]
+            env_path = self.get_env(env_name)
+            if env_path is None:
+                self.environ[env_name] = EnvPath([pattern])
             else:
-                self.environ[env_name].insert(0, pattern)
+                env_path.prepend(pattern)
             if env_name not in self.env_name_changed:
                 self.env_name_changed.append(env_name)
 
@@ -93,8 +228,7 @@ class SandBox(object):
         :return: None
         """
         if self.has_pattern(env_name, pattern):
-            while pattern in self.environ[env_name]:
-                self.environ[env_name].remove(pattern)
+            self.environ[env_name].remove(pattern)
             if env_name not in self.env_name_changed:
                 self.env_name_changed.append(env_name)
 
@@ -125,26 +259,82 @@ class SandBox(object):
         """
         self.command.extend(command)
 
+    def get_changes(self, minimal=True):
+        """
+        Get the changes to be applied to the shell.
+
+        If minimal is True, the following changes are skipped:
+        1. variables whose final values are identical to those in self.source,
+           e.g. after reloading modules;
+        2. unaliases followed by aliases of the same names, as the aliases
+           override them anyway. The aliases themselves are always kept, as
+           aliases are not inherited by subshells and the environment cannot
+           tell whether they are still set;
+        3. duplicate unaliases, aliases and commands, of which only the first
+           occurrences are kept.
+
+        :param minimal: boolean, whether to skip redundant changes
+        :return: tuple of (env_vars, unalias, alias, command), where env_vars
+                 is a list of (env_name, env_string) tuples, unalias is a list
+                 of alias names, alias is a list of (name, value) tuples and
+                 command is a list of commands
+        """
+        env_vars = []
+        for env_name in self.env_name_changed:
+            env_string = ":".join(self.environ[env_name]).rstrip(":")
+            if not minimal or self.source.get(env_name) != env_string:
+                env_vars.append((env_name, env_string))
+        unalias = [alias[0] for alias in self.unalias]
+        alias = [(alias[0], alias[1]) for alias in self.alias]
+        command = list(self.command)
+        if minimal:
+            alias_names = set([item[0] for item in alias])
+            unalias = unique([name for name in unalias
+                              if name not in alias_names])
+            alias = unique(alias)
+            command = unique(command)
+        return env_vars, unalias, alias, command
+
+    def get_delta(self):
+        """
+        Get the environmental variables to change and their new values.
+
+        :return: dict of variable names and values
+        """
+        return dict(self.get_changes()[0])
+
+    def apply_changes(self, environ=None):
+        """
+        Apply the changes of environmental variables to a mapping. Aliases and
+        commands are ignored as they can only be handled by the shell.
+
+        :param environ: mutable mapping of environmental variables, defaults
+                        to os.environ
+        :return: dict of the variables changed and their new values
+        """
+        if environ is None:
+            environ = os.environ
+        delta = self.get_delta()
+        environ.update(delta)
+        return delta
+
     def echo_commands(self, shell="bash"):
         """
         Print shell commands to stdout to be evaluated by shell.
 
-        :param shell: string, type of the shell that evaluates the output.
+        :param shell: string, type of the shell that evaluates the output, see
+                      pmod.shells.EMITTERS for supported shells
         :return: None
         """
-        for env_name in self.env_name_changed:
-            env_value = self.environ[env_name]
-            env_string = "".join(["%s:" % pattern for pattern in env_value])
-            while env_string != "" and env_string[-1] == ":":
-                env_string = env_string[:-1]
-            if shell == "bash":
-                print_stdout("export %s=%s;" % (env_name, env_string))
-            else:
-                raise NotImplementedError("Shell type %s not supported" % shell)
-        if shell == "bash":
-            for alias in self.unalias:
-                print_stdout("unalias %s;" % alias[0])
-            for alias in self.alias:
-                print_stdout("alias %s=\"%s\";" % (alias[0], alias[1]))
-        for command in self.command:
-            print_stdout("%s;" % command)
\ No newline at end of file
+        emitter = get_emitter(shell)
+        changes = self.get_changes()
+        output = emitter.format_changes(changes)
+        if output != "":
+            print_stdout(output)
+        if self.show_savings:
+            env_vars, unalias, alias, command = changes
+            num_total = sum([len(items) for items in
+                             self.get_changes(minimal=False)])
+            num_echoed = len(env_vars) + len(unalias) + len(alias) + len(command)
+            print_stderr("%d of %d shell commands skipped" %
+                         (num_total - num_echoed, num_total))
\ No newline at end of file
@@ -0,0 +1,250 @@
+import re
+import json
+from pmod.utilities import print_stderr
+
+
+# Characters that need no quoting in POSIX shells
+SAFE_PATTERN = re.compile(r"^[A-Za-z0-9_@%+=:,./-]*$")
+
+# Values without whitespace, quotes or other special characters are emitted
+# unquoted, while others are enclosed in double quotes. References to
+# variables, e.g. $HOME, are thus expanded by the shell in either case.
+WORD_PATTERN = re.compile(r"^[^\s'\"`;&|<>()*?\[\]{}#!]*$")
+
+
+def quote_posix(value):
+    """
+    Quote a string for POSIX-compatible shells, i.e. sh, bash and zsh, to be
+    taken literally, e.g. the words of a command line built by pmod.
+
+    :param value: string to quote
+    :return: string, the value itself if safe, otherwise the value enclosed
+             in single quotes
+    """
+    if SAFE_PATTERN.match(value) is not None:
+        return value
+    return "'%s'" % value.replace("'", "'\\''")
+
+
+def quote_value_posix(value):
+    """
+    Quote the value of a variable for POSIX-compatible shells, keeping the
+    references to variables expanded as in unquoted values.
+
+    :param value: string to quote
+    :return: string, the value itself if it is a plain word, otherwise the
+             value enclosed in double quotes
+    """
+    if WORD_PATTERN.match(value) is not None:
+        return value
+    return '"%s"' % value.replace('"', '\\"')
+
+
+def quote_value_tcsh(value):
+    """
+    Quote the value of a variable for csh and tcsh, where double quotes
+    cannot be escaped within double quotes, and history substitution is
+    performed even within quotes.
+
+    :param value: string to quote
+    :return: string, quoted value
+    """
+    if WORD_PATTERN.match(value) is not None:
+        return value
+    return '"%s"' % value.replace('"', '"\\""').replace("!", "\\!")
+
+
+def quote_value_fish(value):
+    """
+    Quote the value of a variable for fish, where an empty word is dropped.
+
+    :param value: string to quote
+    :return: string, quoted value
+    """
+    if value != "" and WORD_PATTERN.match(value) is not None:
+        return value
+    return '"%s"' % value.replace('"', '\\"')
+
+
+class Emitter(object):
+    """
+    Base class of the emitters that translate the changes collected by
+    SandBox into code to be evaluated by the shell.
+
+    Derived classes should implement set_env, unalias and alias. Commands of
+    modules are emitted verbatim. As they are written for POSIX shells, e.g.
+    "source vars.sh", emitters of other shells set posix to False, and the
+    commands are skipped with warnings.
+    """
+    posix = True
+
+    def set_env(self, env_name, env_string):
+        """
+        Get the code to set an environmental variable.
+
+        :param env_name: string, name of the environmental variable
+        :param env_string: string, value of the environmental variable
+        :return: string, shell code
+        """
+        raise NotImplementedError
+
+    def unalias(self, name):
+        """
+        Get the code to remove an alias.
+
+        :param name: string, name of the alias
+        :return: string, shell code
+        """
+        raise NotImplementedError
+
+    def alias(self, name, value):
+        """
+        Get the code to set an alias.
+
+        :param name: string, name of the alias
+        :param value: string, command of the alias
+        :return: string, shell code
+        """
+        raise NotImplementedError
+
+    def command(self, command):
+        """
+        Get the code to run a command.
+
+        :param command: string, the command
+        :return: string, shell code
+        """
+        return "%s;" % command
+
+    def format_changes(self, changes):
+        """
+        Translate the changes into shell code.
+
+        :param changes: tuple returned by SandBox.get_changes
+        :return: string, shell code with one statement per line, or an empty
+                 string if there is nothing to change
+        """
+        env_vars, unalias, alias, command = changes
+        lines = [self.set_env(env_name, env_string)
+                 for env_name, env_string in env_vars]
+        lines.extend([self.unalias(name) for name in unalias])
+        lines.extend([self.alias(name, value) for name, value in alias])
+        if self.posix:
+            lines.extend([self.command(command_item)
+                          for command_item in command])
+        else:
+            for command_item in command:
+                print_stderr("WARNING: command '%s' skipped as it cannot be "
+                             "run by this shell, set PM_CAPTURE_COMMANDS to "
+                             "capture its changes" % command_item)
+        return "\n".join(lines)
+
+
+class BashEmitter(Emitter):
+    """
+    Emitter for bash and zsh. Aliases are enclosed in double quotes verbatim,
+    so that they may refer to variables or escape characters by themselves.
+    """
+    def set_env(self, env_name, env_string):
+        return "export %s=%s;" % (env_name, quote_value_posix(env_string))
+
+    def unalias(self, name):
+        return "unalias %s;" % name
+
+    def alias(self, name, value):
+        return "alias %s=\"%s\";" % (name, value)
+
+
+class ShEmitter(BashEmitter):
+    """
+    Emitter for POSIX sh, where assigning and exporting in one statement is
+    not supported by older implementations.
+    """
+    def set_env(self, env_name, env_string):
+        return "%s=%s; export %s;" % (env_name,
+                                      quote_value_posix(env_string), env_name)
+
+
+class TcshEmitter(Emitter):
+    """
+    Emitter for csh and tcsh.
+    """
+    posix = False
+
+    def set_env(self, env_name, env_string):
+        return "setenv %s %s;" % (env_name, quote_value_tcsh(env_string))
+
+    def unalias(self, name):
+        return "unalias %s;" % name
+
+    def alias(self, name, value):
+        return "alias %s %s;" % (name, quote_value_tcsh(value))
+
+
+class FishEmitter(Emitter):
+    """
+    Emitter for fish, where variables ending with PATH are lists and are set
+    element-wise.
+    """
+    posix = False
+
+    def set_env(self, env_name, env_string):
+        if env_name.endswith("PATH") and env_string != "":
+            patterns = env_string.split(":")
+        else:
+            patterns = [env_string]
+        return "set -gx %s %s;" % (env_name,
+                                   " ".join([quote_value_fish(pattern)
+                                             for pattern in patterns]))
+
+    def unalias(self, name):
+        return "functions -e %s;" % name
+
+    def alias(self, name, value):
+        return "alias %s %s;" % (name, quote_value_fish(value))
+
+
+class JsonEmitter(Emitter):
+    """
+    Emitter for launchers that apply the changes directly without evaluating
+    shell code. The output is a JSON object, see get_dict for the layout.
+    """
+    def get_dict(self, changes):
+        """
+        Convert the changes into a dictionary.
+
+        :param changes: tuple returned by SandBox.get_changes
+        :return: dict with keys "environ", "unalias", "alias" and "command",
+                 where "environ" and "alias" map names to values, while
+                 "unalias" and "command" are lists
+        """
+        env_vars, unalias, alias, command = changes
+        return {"environ": dict(env_vars), "unalias": list(unalias),
+                "alias": dict(alias), "command": list(command)}
+
+    def format_changes(self, changes):
+        return json.dumps(self.get_dict(changes), sort_keys=True)
+
+
+EMITTERS = {
+    "bash": BashEmitter,
+    "zsh": BashEmitter,
+    "sh": ShEmitter,
+    "csh": TcshEmitter,
+    "tcsh": TcshEmitter,
+    "fish": FishEmitter,
+    "json": JsonEmitter,
+}
+
+
+def get_emitter(shell):
+    """
+    Get the emitter for a shell.
+
+    :param shell: string, type of the shell, should be one of the keys of
+                  EMITTERS
+    :return: instance of a subclass of Emitter
+    """
+    if shell not in EMITTERS:
+        raise NotImplementedError("Shell type %s not supported" % shell)
+    return EMITTERS[shell]()
@@ -1,7 +1,7 @@
 import sys
 import os
 import re
-from operator import itemgetter
+import json
 
 
 def print_stdout(command):
@@ -27,6 +27,17 @@ def print_stderr(message):
     sys.stderr.flush()
 
 
+def print_json(obj):
+    """
+    Print an object to stdout in JSON format, for tools consuming the output
+    of pmod.
+
+    :param obj: object that can be serialized by json
+    :return: None
+    """
+    print_stdout(json.dumps(obj, sort_keys=True))
+
+
 def split_list(raw_list, num_group, algorithm="remainder"):
     """
     Split given list into different groups.
@@ -45,122 +56,186 @@ def split_list(raw_list, num_group, algorithm="remainder"):
     assert algorithm in ("remainder", "range")
     num_element = len(raw_list)
     if algorithm == "remainder":
-        list_split = [[raw_list[i] for i in range(num_element)
-                      if i % num_group == k] for k in range(num_group)]
+        list_split = [list(raw_list[k::num_group]) for k in range(num_group)]
     else:
-        # Get the numbers of items for each group
-        num_item = [num_element // num_group for i in range(num_group)]
-        for i in range(num_element % num_group):
-            num_item[i] += 1
-        # Divide the list according to num_item
+        # The first (num_element % num_group) groups have one more item
+        num_item, num_extra = divmod(num_element, num_group)
         list_split = []
+        j0 = 0
         for i in range(num_group):
-            j0 = sum(num_item[:i])
-            j1 = j0 + num_item[i]
-            list_split.append([raw_list[j] for j in range(j0, j1)])
+            j1 = j0 + num_item + (1 if i < num_extra else 0)
+            list_split.append(list(raw_list[j0:j1]))
+            j0 = j1
     return list_split
 
 
-def get_terminal_size():
+def get_terminal_size(default=(24, 80)):
     """
-    Get the current size of the terminal in characters. We do not use
-    os.get_terminal_size() as it is available only in Python 3.
+    Get the current size of the terminal in characters.
 
+    The size is taken from LINES and COLUMNS if set, otherwise queried from
+    the terminal with query_terminal_size. We do not use
+    os.get_terminal_size() as it is available only in Python 3. Each report
+    should call this function once and pass the width around.
+
+    :param default: (integer, integer), size to return if there is no
+                    terminal, e.g. when the output is redirected
     :return: (integer, integer), size of the terminal
     """
-    rows, columns = os.popen('stty size', 'r').read().split()
-    return int(rows), int(columns)
-
+    try:
+        env_rows = int(os.environ.get("LINES", 0))
+        env_columns = int(os.environ.get("COLUMNS", 0))
+    except ValueError:
+        env_rows, env_columns = 0, 0
+    rows, columns = default
+    if env_rows <= 0 or env_columns <= 0:
+        rows, columns = query_terminal_size(default)
+    if env_rows > 0:
+        rows = env_rows
+    if env_columns > 0:
+        columns = env_columns
+    return rows, columns
+
+
+def query_terminal_size(default):
+    """
+    Query the size of the terminal attached to stderr, stdin or stdout with
+    an ioctl call.
 
-def print_banner(banner, columns):
+    :param default: (integer, integer), size to return if there is no
+                    terminal
+    :return: (integer, integer), size of the terminal
     """
-    Print a banner like --------------- FOO ------------------ to stderr.
+    try:
+        import fcntl
+        import termios
+        import struct
+    except ImportError:
+        return default
+    for fd in (2, 0, 1):
+        try:
+            size = fcntl.ioctl(fd, termios.TIOCGWINSZ,
+                               struct.pack("HHHH", 0, 0, 0, 0))
+        except (IOError, OSError):
+            continue
+        rows, columns = struct.unpack("HHHH", size)[:2]
+        if rows > 0 and columns > 0:
+            return rows, columns
+    return default
+
+
+def format_banner(banner, columns):
+    """
+    Format a banner like --------------- FOO ------------------.
 
     The number '2' in this piece of code counts for the two spaces wrapping the
     central text.
 
     :param banner: the central text in the banner
     :param columns: total width of the banner
-    :return: None
+    :return: string, the banner with a trailing newline
     """
     if len(banner) + 2 > columns:
-        print_stderr(banner)
-    else:
-        num_marks_total = columns - len(banner) - 2
-        num_marks_left = num_marks_total // 2 
-        num_marks_right = num_marks_total - num_marks_left
-        banner_with_marks = ""
-        mark = "-"
-        for i in range(num_marks_left):
-            banner_with_marks += mark
-        banner_with_marks += " %s " % banner
-        for i in range(num_marks_right):
-            banner_with_marks += mark
-        print_stderr(banner_with_marks)
+        return "%s\n" % banner
+    num_marks_total = columns - len(banner) - 2
+    num_marks_left = num_marks_total // 2
+    num_marks_right = num_marks_total - num_marks_left
+    return "%s %s %s\n" % ("-" * num_marks_left, banner,
+                            "-" * num_marks_right)
 
 
-def print_table(table_head, table_body, number_items=True):
+def print_banner(banner, columns):
     """
-    Print a table to stderr.
+    Print a banner like --------------- FOO ------------------ to stderr.
 
-    :param table_head: string, head of the table
-    :param table_body: list of strings
-    :param number_items: boolean, whether to number the items in table_body
+    :param banner: the central text in the banner
+    :param columns: total width of the banner
     :return: None
     """
-    rows, columns = get_terminal_size()
+    sys.stderr.write(format_banner(banner, columns))
+    sys.stderr.flush()
 
-    # Print table head
-    print_stderr("")
-    print_banner(table_head, columns)
 
-    # Print table body
+def format_table(table_head, table_body, number_items=True, columns=80):
+    """
+    Format a table with the items arranged in columns, in the order from top
+    to bottom and then from left to right.
+
+    :param table_head: string, head of the table
+    :param table_body: list of strings
+    :param number_items: boolean, whether to number the items in table_body
+    :param columns: integer, width of the terminal
+    :return: string, the table preceded by an empty line
+    """
+    lines = ["\n", format_banner(table_head, columns)]
     if len(table_body) == 0:
-        print_stderr("None\n")
+        lines.append("None\n\n")
+        return "".join(lines)
+
+    # Get the maximum length of string with reserved spaces.
+    # DO NOT CHANGE THE NUMBER of RESERVED SPACES.
+    max_length = max([len(string) for string in table_body])
+    if not number_items:
+        max_length += 2
+        fmt = "%-" + str(max_length) + "s"
     else:
-        # Get the maximum length of string with reserved spaces.
-        # DO NOT CHANGE THE NUMBER of RESERVED SPACES.
-        max_length = max([len(string) for string in table_body])
+        max_length += 6
+        fmt = "%4d) %-" + str(max_length-6) + "s"
+
+    # Determine the number of columns and rows of the table. Items too long
+    # for the terminal take one column each.
+    num_table_column = max(columns // max_length, 1)
+    num_table_row = len(table_body) // num_table_column
+    if len(table_body) % num_table_column > 0:
+        num_table_row += 1
+
+    # Break table_body into rows. Item j of row i is the (j * num_table_row
+    # + i)-th item of table_body.
+    table_rows = split_list(table_body, num_table_row)
+    for i, row in enumerate(table_rows):
         if not number_items:
-            max_length += 2
+            lines.extend([fmt % string for string in row])
         else:
-            max_length += 6
+            lines.extend([fmt % (j * num_table_row + i + 1, string)
+                          for j, string in enumerate(row)])
+        lines.append("\n")
+    lines.append("\n")
+    return "".join(lines)
 
-        # Determine the number of columns and rows of the table
-        num_table_column = columns // max_length
-        num_table_row = len(table_body) // num_table_column
-        if len(table_body) % num_table_column > 0:
-            num_table_row += 1
 
-        # Break table_body into rows and print
-        table_rows = split_list(table_body, num_table_row)
-        if not number_items:
-            for row in table_rows:
-                for string in row:
-                    fmt =  "%-" + str(max_length) + "s"
-                    sys.stderr.write(fmt % string)
-                sys.stderr.write("\n")
-            sys.stderr.write("\n")
-            sys.stderr.flush()
-        else:
-            # Determine the dimension of the transposed table, for numbering
-            # the items
-            table_dim_trans = []
-            for i in range(num_table_column):
-                if i < len(table_rows[-1]):
-                    table_dim_trans.append(num_table_row)
-                else:
-                    table_dim_trans.append(num_table_row - 1)
-
-            # Print the table with numbered items
-            for i, row in enumerate(table_rows):
-                for j, string in enumerate(row):
-                    fmt = "%4d) %-" + str(max_length-6) + "s"
-                    item_number = sum(table_dim_trans[:j]) + i + 1
-                    sys.stderr.write(fmt % (item_number, string))
-                sys.stderr.write("\n")
-            sys.stderr.write("\n")
-            sys.stderr.flush()
+def print_table(table_head, table_body, number_items=True, columns=None):
+    """
+    Print a table to stderr in one write.
+
+    :param table_head: string, head of the table
+    :param table_body: list of strings
+    :param number_items: boolean, whether to number the items in table_body
+    :param columns: integer, width of the terminal, queried if not given
+    :return: None
+    """
+    if columns is None:
+        columns = get_terminal_size()[1]
+    sys.stderr.write(format_table(table_head, table_body, number_items,
+                                  columns))
+    sys.stderr.flush()
+
+
+def format_list(list_head, list_body, number_items=True):
+    """
+    Format a list in one line.
+
+    :param list_head: string, head of the list
+    :param list_body: list of strings
+    :param number_items: boolean, whether to number the items
+    :return: string, the list with a trailing newline
+    """
+    if len(list_body) == 0:
+        items = ["None"]
+    elif number_items:
+        items = ["%4d) %s" % (i+1, item) for i, item in enumerate(list_body)]
+    else:
+        items = [" %s" % item for item in list_body]
+    return "%s: %s\n" % (list_head, "".join(items))
 
 
 def print_list(list_head, list_body, number_items=True):
@@ -172,20 +247,88 @@ def print_list(list_head, list_body, number_items=True):
     :param number_items: boolean, whether to number the items
     :return:
     """
-    sys.stderr.write("%s: " % list_head)
-    if len(list_body) == 0:
-        sys.stderr.write("None")
-    else:
-        if number_items:
-            for i, item in enumerate(list_body):
-                sys.stderr.write("%4d) %s" % (i+1, item))
-        else:
-            for i, item in enumerate(list_body):
-                sys.stderr.write(" %s" % item)
-    sys.stderr.write("\n")
+    sys.stderr.write(format_list(list_head, list_body, number_items))
     sys.stderr.flush()
 
 
+class VersionKey(object):
+    """
+    Class that represents a parsed version string for comparison.
+
+    The first group of digits and periods in the version string, e.g. "3.1.3"
+    in "3.1.3-intel", is parsed into a tuple of integers. The trailing zeros
+    are dropped so that "1.0" equals "1.0.0". Versions are compared by these
+    numbers first, and then by the suffix after them, e.g. "-intel". An empty
+    suffix comes before any other suffixes. Version strings without digits
+    come before all the others.
+
+    self.version is the original version string.
+
+    self.numbers is the tuple of version numbers without trailing zeros.
+
+    self.suffix is the string after the version numbers.
+    """
+    def __init__(self, version):
+        """
+        :param version: string, the version string, e.g. "3.1.3-intel"
+        """
+        self.version = version
+        match = re.search(r"[0-9\.]+", version)
+        if match is None or match.group().strip(".") == "":
+            self.numbers = ()
+            self.suffix = version
+        else:
+            numbers = [int(i) for i in match.group().split(".") if i != ""]
+            while len(numbers) > 0 and numbers[-1] == 0:
+                numbers.pop()
+            self.numbers = tuple(numbers)
+            self.suffix = version[match.end():]
+
+    @classmethod
+    def from_mod_name(cls, mod_name):
+        """
+        Create the version key from the name of a module, e.g.
+        "openmpi/3.1.3-intel". The version string is the part after the first
+        "/" or "-" that is followed by a digit or a period. If there is no
+        such part, the whole name is taken as the version string.
+
+        :param mod_name: string, name of the module
+        :return: instance of VersionKey
+        """
+        match = re.search(r"[-/]+(?=[0-9\.])", mod_name)
+        if match is None:
+            return cls(mod_name)
+        else:
+            return cls(mod_name[match.end():])
+
+    def get_key(self):
+        return self.numbers, self.suffix
+
+    def __eq__(self, other):
+        return self.get_key() == other.get_key()
+
+    def __ne__(self, other):
+        return self.get_key() != other.get_key()
+
+    def __lt__(self, other):
+        return self.get_key() < other.get_key()
+
+    def __le__(self, other):
+        return self.get_key() <= other.get_key()
+
+    def __gt__(self, other):
+        return self.get_key() > other.get_key()
+
+    def __ge__(self, other):
+        return self.get_key() >= other.get_key()
+
+    def __hash__(self):
+        return hash(self.get_key())
+
+    def __repr__(self):
+        return "VersionKey(%r)" % self.version
+
+
 def get_latest_version(versions):
     """
     Get the latest version for given software.
@@ -194,28 +337,27 @@ def get_latest_version(versions):
                      [a-zA-Z0-9]+[-/]+[0-9\.]+.?
     :return: string, the latest version of this software
     """
-    # Extract and normalize version numbers from software names
-    ver_str = [re.search(r"[0-9\.]+", ver).group().split(".")
-               for ver in versions]
-    ver_num = [[int(i) for i in ver if i != ""] for ver in ver_str]
-    num_digit = max([len(ver) for ver in ver_num])
-    for ver in ver_num:
-        while len(ver) < num_digit:
-            ver.append(0)
-
-    # Sort version numbers
-    ver_num = sorted(ver_num, key=itemgetter(slice(0, num_digit, 1)))
-
-    # Get the software name corresponding to the latest version
-    latest_version = sorted(versions)[-1]
-    for ver_check in versions:
-        ver_str_check = re.search(r"[0-9\.]+", ver_check).group().split(".")
-        ver_num_check = [int(i) for i in ver_str_check if i != ""]
-        while len(ver_num_check) < num_digit:
-            ver_num_check.append(0)
-        difference = [abs(ver_num_check[i] - ver_num[-1][i])
-                      for i in range(num_digit)]
-        if sum(difference) == 0:
-            latest_version = ver_check
-            break
-    return latest_version
\ No newline at end of file
+    return max(versions, key=VersionKey.from_mod_name)
+
+
+def get_class_path(cls):
+    """
+    Get the path to import a class from.
+
+    :param cls: class object
+    :return: string, in the form of "module:class"
+    """
+    return "%s:%s" % (cls.__module__, cls.__name__)
+
+
+def import_class(class_path):
+    """
+    Import a class from the path returned by get_class_path.
+
+    :param class_path: string, path of the class
+    :return: class object
+    """
+    module_name, class_name = class_path.split(":")
+    # Names read from JSON are unicode in Python 2, which __import__ rejects
+    module = __import__(str(module_name), fromlist=[str(class_name)])
+    return getattr(module, class_name)
@@ -0,0 +1,52 @@
+import os
+import unittest
+from pmod.batch import BatchResolver
+from pmod.cli import parse_args, run_command
+from pmod.modmanager import ModManager, ModuleError
+
+
+def make_mod_manager():
+    mod_manager = ModManager()
+    mod_manager.create_mod("gcc/8.3.0", preset="mod",
+                           destination="/opt/gcc/8.3.0")
+    mod_manager.create_mod("openmpi/4.0.1", preset="mod",
+                           destination="/opt/openmpi/4.0.1",
+                           depend=["gcc/8.3.0"])
+    mod_manager.create_mod("mpich/3.3", preset="mod",
+                           destination="/opt/mpich/3.3",
+                           depend=["gcc/8.3.0"], conflict=["openmpi/4.0.1"])
+    mod_manager.check_sanity()
+    return mod_manager
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.resolver = BatchResolver(make_mod_manager(), environ={})
+
+    def test_resolve(self):
+        result = self.resolver.resolve(["openmpi"])
+        self.assertEqual(result["modules"], ["openmpi/4.0.1"])
+        self.assertEqual(result["environ"]["PM_LOADED_MODULES"],
+                         "openmpi/4.0.1:gcc/8.3.0")
+        self.assertNotIn("error", result)
+
+    def test_errors(self):
+        result = self.resolver.resolve(["openmpi", "nonexist", "foo/1.0"])
+        self.assertEqual(result["error"], "undefined modules nonexist, foo/1.0")
+        result = self.resolver.resolve(["openmpi", "mpich"])
+        self.assertIn("error", result)
+        self.assertNotIn("environ", result)
+
+    def test_eval_wrapper(self):
+        saved_environ = dict(os.environ)
+        os.environ["PM_EVAL"] = "1"
+        try:
+            self.assertRaises(ModuleError, run_command, make_mod_manager(),
+                              parse_args(["batch", "-"]))
+        finally:
+            os.environ.clear()
+            os.environ.update(saved_environ)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from pmod.cache import ModCache
+from pmod.modmanager import ModManager
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, "cache")
+        # Any module not defining the classes of the module manager serves as
+        # the setup module, whose stamp is recorded
+        self.cache = ModCache("pmod.utilities", cache_dir=self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def make_mod_manager(self):
+        mod_manager = ModManager()
+        mod_manager.create_mod("gcc/8.3.0", preset="mod",
+                               destination="/opt/gcc/8.3.0")
+        mod_manager.create_mod("openmpi/4.0.1", preset="mod",
+                               destination="/opt/openmpi/4.0.1",
+                               depend=["gcc/8.3.0"])
+        mod_manager.check_sanity()
+        return mod_manager
+
+    def test_round_trip(self):
+        self.cache.dump(self.make_mod_manager())
+        mod_manager = ModCache("pmod.utilities",
+                               cache_dir=self.cache_dir).load()
+        self.assertEqual(sorted(mod_manager.available_mods.keys()),
+                         ["gcc/8.3.0", "openmpi/4.0.1"])
+        self.assertEqual(mod_manager.available_mods["openmpi/4.0.1"].depend,
+                         ("gcc/8.3.0",))
+
+    def test_unpicklable(self):
+        mod_manager = self.make_mod_manager()
+        mod_manager.lock = threading.Lock()
+        # Failures are ignored without leaving temporary files behind
+        self.cache.dump(mod_manager)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        self.assertIsNone(ModCache("pmod.utilities",
+                                   cache_dir=self.cache_dir).load())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pmod.capture import get_environ_items, CommandCapture
+from pmod.sandbox import SandBox
+
+
+# Script that sets LD_LIBRARY_PATH differently depending on whether it is set
+GUARDED_SCRIPT = """
+if [ -z "$LD_LIBRARY_PATH" ]; then
+    export LD_LIBRARY_PATH=/opt/intel/lib
+else
+    export LD_LIBRARY_PATH=/opt/intel/lib:$LD_LIBRARY_PATH
+fi
+export INTEL_LICENSE_FILE=/opt/intel/licenses
+"""
+
+
+class TestCapture(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_unset_path_list(self):
+        items = get_environ_items({}, {"LD_LIBRARY_PATH": "/opt/intel/lib",
+                                       "MANPATH": "/opt/intel/man",
+                                       "MKLROOT": "/opt/intel/mkl"})
+        self.assertEqual(items, [("prepend", "LD_LIBRARY_PATH",
+                                  "/opt/intel/lib"),
+                                 ("prepend", "MANPATH", "/opt/intel/man"),
+                                 ("reset", "MKLROOT", "/opt/intel/mkl")])
+
+    def test_guarded_script(self):
+        script = os.path.join(self.temp_dir, "vars.sh")
+        with open(script, "w") as out_file:
+            out_file.write(GUARDED_SCRIPT)
+        items = CommandCapture().capture(script, [])
+        self.assertIn(("prepend", "LD_LIBRARY_PATH", "/opt/intel/lib"), items)
+        self.assertIn(("reset", "INTEL_LICENSE_FILE", "/opt/intel/licenses"),
+                      items)
+
+        # Loading and unloading keep the value set by the user
+        environ = {"LD_LIBRARY_PATH": "/home/u/lib:/usr/lib64"}
+        sandbox = SandBox(environ)
+        for operation, env_name, pattern in items:
+            getattr(sandbox, operation + "_env")(env_name, pattern)
+        sandbox.apply_changes(environ)
+        self.assertEqual(environ["LD_LIBRARY_PATH"],
+                         "/opt/intel/lib:/home/u/lib:/usr/lib64")
+        sandbox = SandBox(environ)
+        for operation, env_name, pattern in items:
+            if operation == "prepend":
+                sandbox.remove_env(env_name, pattern)
+        sandbox.apply_changes(environ)
+        self.assertEqual(environ["LD_LIBRARY_PATH"], "/home/u/lib:/usr/lib64")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+from pmod import daemon
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        os.chmod(self.temp_dir, 0o700)
+        self.socket_file = os.path.join(self.temp_dir, "server.sock")
+        self.saved_environ = dict(os.environ)
+        os.environ["PM_SOCKET"] = self.socket_file
+        self.saved_timeout = daemon.CLIENT_TIMEOUT
+        daemon.CLIENT_TIMEOUT = 0.2
+
+    def tearDown(self):
+        daemon.CLIENT_TIMEOUT = self.saved_timeout
+        os.environ.clear()
+        os.environ.update(self.saved_environ)
+        shutil.rmtree(self.temp_dir)
+
+    def test_no_server(self):
+        self.assertIsNone(daemon.run_client(["list"]))
+
+    def test_hung_server(self):
+        # The server accepts the connection but never replies
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(self.socket_file)
+            server.listen(1)
+            start = time.time()
+            self.assertIsNone(daemon.run_client(["list"]))
+            self.assertLess(time.time() - start, 5)
+        finally:
+            server.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from pmod.fragments import load_mods_lazily
+
+
+SETUP = """from pmod.fragments import load_fragments
+
+
+mod_manager = load_fragments(__name__.rpartition(".")[0] + ".fragments")
+"""
+
+FRAGMENTS = {
+    "gcc": """def setup(m):
+    m.create_mod("gcc/8.3.0", preset="mod", destination="/opt/gcc/8.3.0")
+""",
+    "openmpi": """def setup(m):
+    m.create_mod("openmpi/4.0.1", preset="mod",
+                 destination="/opt/openmpi/4.0.1", depend=["gcc/8.3.0"])
+""",
+    "vasp": """def setup(m):
+    m.create_mod("vasp/5.4.4", preset="path", destination="/opt/vasp/bin",
+                 depend=["openmpi/4.0.1"])
+"""}
+
+
+class TestFragments(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.package_dir = os.path.join(self.temp_dir, "pmtest_fragments")
+        os.makedirs(os.path.join(self.package_dir, "fragments"))
+        for file_name, content in (("__init__.py", ""), ("setup.py", SETUP),
+                                   ("fragments/__init__.py", "")):
+            self.write(file_name, content)
+        for fragment, content in FRAGMENTS.items():
+            self.write("fragments/%s.py" % fragment, content)
+        self.cache_dir = os.path.join(self.temp_dir, "cache")
+        self.saved_environ = dict(os.environ)
+        os.environ["PM_CACHE_DIR"] = self.cache_dir
+        os.environ.pop("PM_NO_CACHE", None)
+        os.environ.pop("PM_CAPTURE_COMMANDS", None)
+        sys.path.insert(0, self.temp_dir)
+
+    def tearDown(self):
+        sys.path.remove(self.temp_dir)
+        for module_name in list(sys.modules.keys()):
+            if module_name.startswith("pmtest_fragments"):
+                del sys.modules[module_name]
+        os.environ.clear()
+        os.environ.update(self.saved_environ)
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, file_name, content):
+        with open(os.path.join(self.package_dir, file_name), "w") as out_file:
+            out_file.write(content)
+
+    def load(self, mod_names, environ=None):
+        mod_manager = load_mods_lazily(mod_names, "pmtest_fragments.setup",
+                                       environ or {})
+        return sorted(mod_manager.available_mods.keys())
+
+    def test_partial(self):
+        # The first call loads all the fragments and writes the manifest to
+        # the cache directory
+        self.assertEqual(len(self.load(["gcc"])), 3)
+        self.assertFalse(os.path.exists(os.path.join(
+            self.package_dir, "fragments", "manifest.json")))
+        self.assertEqual(self.load(["gcc"]), ["gcc/8.3.0"])
+        self.assertEqual(self.load(["openmpi"]),
+                         ["gcc/8.3.0", "openmpi/4.0.1"])
+
+    def test_modified_setup(self):
+        self.load(["gcc"])
+        self.write("setup.py", SETUP + "mod_manager.create_mod(\"cmake\")\n")
+        self.assertEqual(len(self.load(["gcc"])), 4)
+        self.assertEqual(self.load(["gcc"]), ["gcc/8.3.0"])
+
+    def test_broken_module(self):
+        self.load(["gcc"])
+        # vasp is still in PATH, but not in PM_LOADED_MODULES
+        environ = {"PATH": "/opt/vasp/bin:/usr/bin", "PM_LOADED_MODULES": ""}
+        self.assertEqual(self.load(["gcc"], environ),
+                         ["gcc/8.3.0", "openmpi/4.0.1", "vasp/5.4.4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from pmod.graph import DependGraph, find_cycle
+from pmod.modmanager import ModManager
+
+
+def make_mod_manager():
+    # a -> b -> c -> b is a cycle, d depends on a, e conflicts with c
+    mod_manager = ModManager()
+    for mod_name, depend, conflict in (("a", ["b"], []), ("b", ["c"], []),
+                                       ("c", ["b"], []), ("d", ["a"], []),
+                                       ("e", [], ["c"]), ("f", ["x"], [])):
+        mod_manager.create_mod(mod_name, depend=depend, conflict=conflict)
+    return mod_manager
+
+
+class TestDependGraph(unittest.TestCase):
+    def test_closure(self):
+        graph = DependGraph(make_mod_manager().available_mods)
+        self.assertEqual(graph.get_mod_closure("d"),
+                         frozenset(["a", "b", "c", "d"]))
+        # Modules in a cycle share the same closure
+        self.assertIs(graph.get_mod_closure("b"), graph.get_mod_closure("c"))
+        self.assertEqual(graph.get_mod_conflicts("e"), frozenset(["c"]))
+        self.assertEqual(graph.get_closure(["e", "f"]),
+                         set(["e", "f", "x"]))
+        self.assertEqual(graph.get_conflicts(["d", "e"]), set(["c"]))
+
+    def test_components(self):
+        graph = DependGraph(make_mod_manager().available_mods)
+        # Each component comes after the components it depends on
+        position = dict()
+        for i, component in enumerate(graph.components):
+            for mod_name in component:
+                position[mod_name] = i
+        self.assertEqual(position["b"], position["c"])
+        self.assertLess(position["b"], position["a"])
+        self.assertLess(position["a"], position["d"])
+
+    def test_invalidation(self):
+        mod_manager = make_mod_manager()
+        graph = mod_manager.get_graph()
+        self.assertIs(mod_manager.get_graph(), graph)
+        self.assertEqual(graph.get_mod_closure("e"), frozenset(["e"]))
+        mod_manager.create_mod("e", depend=["f"])
+        self.assertIsNot(mod_manager.get_graph(), graph)
+        self.assertEqual(mod_manager.get_graph().get_mod_closure("e"),
+                         frozenset(["e", "f", "x"]))
+
+    def test_find_cycle(self):
+        successors = {"a": ["b"], "b": ["c", "a"], "c": ["b"]}
+        self.assertEqual(find_cycle(set(["a", "b", "c"]), successors),
+                         ["a", "b", "a"])
+        self.assertEqual(find_cycle(set(["b", "c"]), successors),
+                         ["b", "c", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+from pmod.modmanager import ModManager, ModuleError
+
+
+def make_mod_manager(vasp_environ=None):
+    mod_manager = ModManager()
+    mod_manager.create_mod("gcc/8.3.0", preset="path",
+                           destination="/opt/gcc/bin")
+    mod_manager.create_mod("fftw/3.3.8", preset="path",
+                           destination="/opt/fftw/bin", depend=["gcc/8.3.0"])
+    mod_manager.create_mod("openmpi/4.0.1", preset="path",
+                           destination="/opt/openmpi/bin",
+                           depend=["gcc/8.3.0"])
+    mod_manager.create_mod("mpich/3.3", preset="path",
+                           destination="/opt/mpich/bin", depend=["gcc/8.3.0"],
+                           conflict=["openmpi/4.0.1"])
+    mod_manager.create_mod("vasp/5.4.4", preset="path",
+                           destination="/opt/vasp/bin", environ=vasp_environ,
+                           depend=["openmpi/4.0.1", "fftw/3.3.8"])
+    mod_manager.check_sanity()
+    return mod_manager
+
+
+def get_path(environ):
+    return environ["PATH"].split(":")
+
+
+class TestModManager(unittest.TestCase):
+    def setUp(self):
+        self.mod_manager = make_mod_manager()
+        self.environ = {"PATH": "/usr/bin"}
+
+    def test_sort(self):
+        # Dependencies come before the modules requiring them, and modules
+        # with the same depth are sorted by name
+        self.assertEqual(self.mod_manager.sort_mods(
+            ["vasp/5.4.4", "openmpi/4.0.1", "gcc/8.3.0", "fftw/3.3.8",
+             "mpich/3.3"]),
+            ["gcc/8.3.0", "fftw/3.3.8", "openmpi/4.0.1", "mpich/3.3",
+             "vasp/5.4.4"])
+        # Modules not in the list are ignored
+        self.assertEqual(self.mod_manager.sort_mods(["vasp/5.4.4",
+                                                     "gcc/8.3.0"]),
+                         ["gcc/8.3.0", "vasp/5.4.4"])
+
+    def test_cycle(self):
+        mod_manager = ModManager()
+        for mod_name, depend in (("a", ["b"]), ("b", ["c"]), ("c", ["a"]),
+                                 ("d", ["a"])):
+            mod_manager.create_mod(mod_name, depend=depend)
+        try:
+            mod_manager.sort_mods(["a", "b", "c", "d"])
+        except ModuleError as error:
+            self.assertEqual(error.messages, ["cyclic dependencies detected: "
+                                              "a -> b -> c -> a"])
+        else:
+            self.fail("ModuleError not raised")
+
+    def test_load(self):
+        mod_list = self.mod_manager.verify_mod_names(["VASP"])
+        self.mod_manager.load_environ(mod_list, self.environ)
+        self.assertEqual(get_path(self.environ),
+                         ["/opt/vasp/bin", "/opt/openmpi/bin",
+                          "/opt/fftw/bin", "/opt/gcc/bin", "/usr/bin"])
+        # Loading mpich unloads openmpi and vasp requiring it
+        self.mod_manager.load_environ(["mpich/3.3"], self.environ)
+        self.assertEqual(get_path(self.environ),
+                         ["/opt/mpich/bin", "/opt/fftw/bin", "/opt/gcc/bin",
+                          "/usr/bin"])
+
+    def test_load_no_auto(self):
+        self.mod_manager.load_environ(["vasp/5.4.4"], self.environ,
+                                      force_no_auto=True)
+        self.assertEqual(get_path(self.environ), ["/opt/vasp/bin", "/usr/bin"])
+
+    def test_paradox(self):
+        self.mod_manager.create_mod("vasp/5.4.4", conflict=["gcc/8.3.0"])
+        self.assertRaises(ModuleError, self.mod_manager.load_environ,
+                          ["vasp/5.4.4"], self.environ)
+        self.assertEqual(self.environ, {"PATH": "/usr/bin"})
+
+    def test_unload(self):
+        self.mod_manager.load_environ(["openmpi/4.0.1", "fftw/3.3.8"],
+                                      self.environ)
+        # gcc is still required by openmpi
+        self.mod_manager.unload_environ(["fftw/3.3.8"], self.environ)
+        self.assertEqual(get_path(self.environ),
+                         ["/opt/openmpi/bin", "/opt/gcc/bin", "/usr/bin"])
+        self.mod_manager.unload_environ(["openmpi/4.0.1"], self.environ)
+        self.assertEqual(get_path(self.environ), ["/usr/bin"])
+
+    def test_unload_required(self):
+        # Modules required by other loaded modules are kept
+        self.mod_manager.load_environ(["vasp/5.4.4"], self.environ)
+        self.assertEqual(self.mod_manager.unload_environ(["fftw/3.3.8"],
+                                                         self.environ), {})
+        self.mod_manager.unload_environ(["vasp/5.4.4"], self.environ)
+        self.assertEqual(get_path(self.environ), ["/usr/bin"])
+        # Unless auto mode is disabled
+        self.mod_manager.load_environ(["vasp/5.4.4"], self.environ)
+        self.mod_manager.unload_environ(["fftw/3.3.8"], self.environ,
+                                        force_no_auto=True)
+        self.assertEqual(get_path(self.environ),
+                         ["/opt/vasp/bin", "/opt/openmpi/bin", "/opt/gcc/bin",
+                          "/usr/bin"])
+
+    def test_reload(self):
+        self.mod_manager.load_environ(["vasp/5.4.4"], self.environ)
+        self.assertEqual(self.mod_manager.reload_environ(self.environ), {})
+        # Only the modules whose definitions changed are reloaded
+        mod_manager = make_mod_manager([("reset", "VASP_HOME", "/opt/vasp")])
+        self.assertEqual(sorted(mod_manager.reload_environ(self.environ)),
+                         ["PM_LOADED_FINGERPRINTS", "VASP_HOME"])
+        self.assertEqual(get_path(self.environ),
+                         ["/opt/vasp/bin", "/opt/openmpi/bin",
+                          "/opt/fftw/bin", "/opt/gcc/bin", "/usr/bin"])
+        self.assertEqual(mod_manager.reload_environ(self.environ), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from pmod.module import Module
+
+
+CUSTOM_CLASS = """from pmod.module import Module
+
+
+class CustomModule(Module):
+    def load(self, sandbox):
+        Module.load(self, sandbox)
+"""
+
+
+class TestModule(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        sys.path.insert(0, self.temp_dir)
+
+    def tearDown(self):
+        sys.path.remove(self.temp_dir)
+        sys.modules.pop("pmtest_custom", None)
+        shutil.rmtree(self.temp_dir)
+
+    def import_class(self, source):
+        with open(os.path.join(self.temp_dir, "pmtest_custom.py"),
+                  "w") as out_file:
+            out_file.write(source)
+        sys.modules.pop("pmtest_custom", None)
+        return __import__("pmtest_custom").CustomModule
+
+    def test_fingerprint(self):
+        module = Module("gcc/8.3.0", depend=["binutils"])
+        fingerprint = module.get_fingerprint()
+        self.assertEqual(Module("gcc/8.3.0", depend=["binutils"])
+                         .get_fingerprint(), fingerprint)
+        self.assertNotEqual(Module("gcc/8.3.0", depend=["binutils/2.32"])
+                            .get_fingerprint(), fingerprint)
+
+    def test_custom_class(self):
+        # Editing the methods of a custom class changes the fingerprints
+        old_class = self.import_class(CUSTOM_CLASS)
+        fingerprint = old_class("gcc/8.3.0").get_fingerprint()
+        self.assertNotEqual(fingerprint, Module("gcc/8.3.0").get_fingerprint())
+        new_class = self.import_class(CUSTOM_CLASS + "        # edited\n")
+        self.assertNotEqual(new_class("gcc/8.3.0").get_fingerprint(),
+                            fingerprint)
+
+
+if __name__ == "__main__":
+    unittest.main()
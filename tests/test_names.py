@@ -0,0 +1,56 @@
+import unittest
+from pmod.names import NameIndex
+from pmod.utilities import VersionKey
+
+
+MOD_NAMES = ["gcc/4.8.5", "gcc/10.2.0", "gcc/8.3.0", "GCC/9.1.0",
+             "openmpi/3.1.3-intel", "openmpi/3.1.3", "openmpi/4.0.1",
+             "cmake", "vasp-5/5.4.4"]
+
+
+class TestVersionKey(unittest.TestCase):
+    def test_compare(self):
+        versions = ["10.2", "1.0.0", "9", "1", "1.0-intel", "latest", "1.2"]
+        self.assertEqual([key.version for key in
+                          sorted([VersionKey(v) for v in versions])],
+                         ["latest", "1.0.0", "1", "1.0-intel", "1.2", "9",
+                          "10.2"])
+        self.assertEqual(VersionKey("1.0"), VersionKey("1.0.0"))
+        self.assertEqual(VersionKey.from_mod_name("openmpi/3.1.3-intel")
+                         .numbers, (3, 1, 3))
+
+
+class TestNameIndex(unittest.TestCase):
+    def setUp(self):
+        self.name_index = NameIndex(MOD_NAMES)
+
+    def test_latest(self):
+        # Versions are compared numerically, with case ignored
+        self.assertEqual(self.name_index.get_latest("gcc"), "gcc/10.2.0")
+        self.assertEqual(self.name_index.get_latest("GCC", max_version="10"),
+                         "GCC/9.1.0")
+        self.assertEqual(self.name_index.get_latest("openmpi",
+                                                    max_version="4"),
+                         "openmpi/3.1.3-intel")
+        self.assertEqual(self.name_index.get_latest("vasp"), "vasp-5/5.4.4")
+        self.assertEqual(self.name_index.get_latest("vasp-5"), "vasp-5/5.4.4")
+        self.assertIsNone(self.name_index.get_latest("cmake"))
+        self.assertIsNone(self.name_index.get_latest("gcc", min_version="11"))
+
+    def test_versions(self):
+        self.assertEqual(self.name_index.select_versions("gcc", "8", "10"),
+                         ["gcc/8.3.0", "GCC/9.1.0"])
+
+    def test_names(self):
+        self.assertEqual(self.name_index.get_exact("CMake"), ["cmake"])
+        self.assertEqual(self.name_index.get_exact("gcc"), [])
+        self.assertEqual(self.name_index.complete("GC"),
+                         ["gcc/10.2.0", "gcc/4.8.5", "gcc/8.3.0",
+                          "GCC/9.1.0"])
+        self.assertEqual(self.name_index.search("mpi/3"),
+                         ["openmpi/3.1.3", "openmpi/3.1.3-intel"])
+        self.assertEqual(self.name_index.search("ma"), ["cmake"])
+
+
+if __name__ == "__main__":
+    unittest.main()
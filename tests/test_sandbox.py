@@ -0,0 +1,59 @@
+import unittest
+from pmod.sandbox import EnvPath, SandBox
+
+
+class TestEnvPath(unittest.TestCase):
+    def test_order(self):
+        env_path = EnvPath(["/usr/bin", "/bin"])
+        env_path.prepend("/opt/a/bin")
+        env_path.append("/opt/b/bin")
+        env_path.prepend("/opt/c/bin")
+        self.assertEqual(list(env_path), ["/opt/c/bin", "/opt/a/bin",
+                                          "/usr/bin", "/bin", "/opt/b/bin"])
+        env_path.remove("/usr/bin")
+        env_path.remove("/nonexist")
+        self.assertEqual(list(env_path), ["/opt/c/bin", "/opt/a/bin", "/bin",
+                                          "/opt/b/bin"])
+        self.assertEqual(len(env_path), 4)
+
+    def test_duplicates(self):
+        # Duplicates inherited from the environment are kept in place, and
+        # removed altogether
+        env_path = EnvPath(["/usr/bin", "/opt/a/bin", "/usr/bin"])
+        self.assertEqual(list(env_path), ["/usr/bin", "/opt/a/bin",
+                                          "/usr/bin"])
+        env_path.remove("/usr/bin")
+        self.assertEqual(list(env_path), ["/opt/a/bin"])
+        self.assertNotIn("/usr/bin", env_path)
+
+
+class TestSandBox(unittest.TestCase):
+    def test_env(self):
+        sandbox = SandBox({"PATH": "/usr/bin:/usr/bin"})
+        sandbox.prepend_env("PATH", "/opt/a/bin")
+        sandbox.prepend_env("PATH", "/usr/bin")
+        sandbox.append_env("MANPATH", "/opt/a/man")
+        self.assertEqual(sandbox.get_delta(),
+                         {"PATH": "/opt/a/bin:/usr/bin:/usr/bin",
+                          "MANPATH": "/opt/a/man"})
+
+    def test_minimal_changes(self):
+        sandbox = SandBox({"PATH": "/opt/a/bin:/usr/bin"})
+        # Reloading a module leaves the variable unchanged
+        sandbox.remove_env("PATH", "/opt/a/bin")
+        sandbox.prepend_env("PATH", "/opt/a/bin")
+        sandbox.add_unalias([("ll", "ls -l")])
+        sandbox.add_alias([("ll", "ls -l")])
+        sandbox.add_unalias([("la", "ls -a"), ("la", "ls -a")])
+        sandbox.add_command(["source a.sh", "source b.sh", "source a.sh"])
+        self.assertEqual(sandbox.get_changes(),
+                         ([], ["la"], [("ll", "ls -l")],
+                          ["source a.sh", "source b.sh"]))
+        self.assertEqual(sandbox.get_changes(minimal=False),
+                         ([("PATH", "/opt/a/bin:/usr/bin")],
+                          ["ll", "la", "la"], [("ll", "ls -l")],
+                          ["source a.sh", "source b.sh", "source a.sh"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
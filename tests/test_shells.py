@@ -0,0 +1,61 @@
+import os
+import subprocess
+import unittest
+from pmod.shells import get_emitter
+
+
+# Values of variables, and the values expected after evaluation with HOME set
+# to /home/u
+VALUES = (
+    ("/opt/intel/bin:/usr/bin", "/opt/intel/bin:/usr/bin"),
+    ("$HOME/bin", "/home/u/bin"),
+    ("${HOME}/my apps", "/home/u/my apps"),
+    ("say \"hi\"; then", "say \"hi\"; then"),
+    ("", ""),
+)
+
+
+def evaluate(shell, code, env_name):
+    """
+    Evaluate shell code and get the value of a variable.
+    """
+    environ = {"HOME": "/home/u", "PATH": os.environ.get("PATH", "")}
+    script = "%s\nprintf '%%s' \"$%s\"" % (code, env_name)
+    return subprocess.check_output([shell, "-c", script],
+                                   env=environ).decode()
+
+
+class TestShells(unittest.TestCase):
+    def test_posix_values(self):
+        for shell in ("bash", "sh"):
+            emitter = get_emitter(shell)
+            for value, expected in VALUES:
+                code = emitter.format_changes(([("PM_TEST", value)], [], [],
+                                               []))
+                self.assertEqual(evaluate(shell, code, "PM_TEST"), expected)
+
+    def test_plain_values(self):
+        # Plain words are emitted unquoted, as they have always been
+        for shell, code in (("bash", "export PM_PATH=$HOME/bin:/usr/bin;"),
+                            ("tcsh", "setenv PM_PATH $HOME/bin:/usr/bin;"),
+                            ("fish", "set -gx PM_PATH $HOME/bin /usr/bin;")):
+            self.assertEqual(get_emitter(shell).format_changes(
+                ([("PM_PATH", "$HOME/bin:/usr/bin")], [], [], [])), code)
+        self.assertEqual(get_emitter("tcsh").set_env("PM_TEST", "a \"b\"!"),
+                         "setenv PM_TEST \"a \"\\\"\"b\"\\\"\"\\!\";")
+
+    def test_bash_alias(self):
+        code = get_emitter("bash").alias("ll", "ls -l $HOME")
+        self.assertEqual(code, "alias ll=\"ls -l $HOME\";")
+
+    def test_commands(self):
+        changes = ([], [], [], ["source /opt/intel/bin/vars.sh"])
+        self.assertEqual(get_emitter("bash").format_changes(changes),
+                         "source /opt/intel/bin/vars.sh;")
+        # Commands for POSIX shells are skipped for tcsh and fish
+        for shell in ("tcsh", "fish"):
+            self.assertEqual(get_emitter(shell).format_changes(changes), "")
+
+
+if __name__ == "__main__":
+    unittest.main()